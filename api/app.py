@@ -10,6 +10,8 @@ app = Bottle()
 # NOTES
 app.route('/notes', 'GET', NoteResource.get_notes_resource)
 app.route('/notes', 'POST', NoteResource.create_notes_resource)
+app.route('/notes/batch', 'POST', NoteResource.create_notes_batch_resource)
+app.route('/notes/search', 'GET', NoteResource.search_notes_resource)
 
 # USERS
 app.route('/users', 'POST', UserResource.create_users_resource)
@@ -25,5 +27,7 @@ app.error_handler = {
     401: handle_http_errors,
     404: handle_http_errors,
     405: handle_http_errors,
+    429: handle_http_errors,
     500: handle_http_errors,
+    503: handle_http_errors,
 }
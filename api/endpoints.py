@@ -1,55 +1,324 @@
-from json import dumps as json_dumps
-from typing import Optional
+from typing import Iterator, Optional, Tuple
 
 from bottle import request
 from marshmallow import ValidationError
-from peewee import IntegrityError
+from peewee import IntegrityError, ModelSelect
 
-from api.models import Note, User
-from api.serializers import NoteSerializer, UserSerializer
+from api.models import (Note, NoteSearch, NoteVersion, User,
+                        get_note_writer, get_search_indexer)
+from api.serializers import (NoteListQuerySerializer, NotePageSerializer,
+                             NoteSearchPageSerializer,
+                             NoteSearchQuerySerializer, NoteSerializer,
+                             UserSerializer)
 from auth.serializers import JWTLoginSerializer
+from database import close_db, note_shards
+from settings import NOTES_BATCH, NOTES_GROUP_COMMIT, STREAMING
 from utils.jwt_auth import jwt_auth_required
-from utils.exceptions import JSONResponseBadRequest
-from utils.request import get_user_from_request
-from utils.response import JSONResponse, JSONResponseCreated
+from utils.exceptions import JSONResponseBadRequest, JSONResponseServerBusy
+from utils.group_commit import GroupCommitBusy
+from utils.hashers import PasswordHasherBusy
+from utils.json_codec import (ITEM_SEPARATOR, JSON_BACKEND, KEY_SEPARATOR,
+                              dumps as json_dumps)
+from utils.metrics import phase_timer
+from utils.pagination import encode_cursor
+from utils.request import (get_json_from_request, get_user_from_request,
+                           request_etag_matches)
+from utils.response import (JSONResponse, JSONResponseCreated,
+                            ResponseNotModified, make_etag)
+from utils.response_cache import response_cache
+from utils.serializers import RowDumper, StrLoader
 
 
 # NOTES RESOURCE
 
 class NoteResource:
     SerializerClass = NoteSerializer
+    PageSerializerClass = NotePageSerializer
+    QuerySerializerClass = NoteListQuerySerializer
+    SearchPageSerializerClass = NoteSearchPageSerializer
+    SearchQuerySerializerClass = NoteSearchQuerySerializer
+    dumper = RowDumper(NoteSerializer(), Note)
+    # by requested fields, the same tuple in the schema order
+    # for the same fields, so one dumper by subset at most
+    dumpers = {None: dumper}
+    # always selected, for the next page cursor
+    CURSOR_FIELDS = ('creation_date', 'id')
+    # the note lists of the batch route
+    loader = StrLoader(NoteSerializer())
 
     @classmethod
     @jwt_auth_required
     def get_notes_resource(cls) -> JSONResponse:
-        """Get note list for endpoint.
+        """Get note list page for endpoint.
+
+        The response has an ETag, built from the user's note list version,
+        when the client sends it back in "If-None-Match" and the notes
+        didn't change, a 304 is returned without querying them.
+        Else the page is served from the response cache if it's there,
+        the streamed pages aren't cached.
+
+        Query params:
+            limit (int): Max number of notes.
+            cursor (str): Cursor returned as "next_cursor"
+                          by the previous page.
+            stream (bool): Stream the note list page.
+            fields (str): Comma-separated note fields, only these
+                          are read and returned, e.g. "id,name".
 
         Returns:
-            JSONResponse: Note list.
+            JSONResponse: Note list page and next page cursor.
         """
-        serializer = cls.SerializerClass()
+        query_serializer = cls.QuerySerializerClass()
+        try:
+            params = query_serializer.load(request.query)
+        except ValidationError as error:
+            data = json_dumps(error.messages)
+            return JSONResponseBadRequest(body=data)
         user = get_user_from_request()
-        note_list = cls.list_notes(cls, user)
-        data = serializer.dumps(note_list, many=True)
-        return JSONResponse(body=data)
 
-    def list_notes(self, user: Optional[User] = None) -> list:
-        """Get note list from database.
+        # the version is read before the notes, a note created meanwhile
+        # is in the body but changes the ETag of the next request
+        version = NoteVersion.get_version(user.id)
+        query_string = request.query_string
+        headers = {
+            'ETag': cls.get_notes_etag(cls, user, version, query_string),
+            'Cache-Control': 'private, no-cache',
+        }
+        if request_etag_matches(headers['ETag']):
+            return ResponseNotModified(headers=headers)
+        if params.pop('stream'):
+            data = cls.stream_notes(cls, user, **params)
+            return JSONResponse(body=data, headers=headers)
+        cache_key = f'{version}:{query_string}'
+        data = response_cache.get(user.id, cache_key)
+        if data is None:
+            serializer = cls.PageSerializerClass()
+            note_list, next_cursor = cls.list_notes(cls, user, **params)
+            page = {'results': note_list, 'next_cursor': next_cursor}
+
+            # the notes are already dumped, keep the schema keys order
+            page = {name: page[name] for name in serializer.dump_fields}
+            with phase_timer('encoding'):
+                data = json_dumps(page)
+            response_cache.set(user.id, cache_key, data)
+        return JSONResponse(body=data, headers=headers)
+
+    def get_notes_etag(self, user: User, version: int,
+                       query_string: str) -> str:
+        """Get the ETag of the user's note list page.
+
+        Args:
+            user (User): User instance.
+            version (int): User's note list version.
+            query_string (str): Page query params.
+
+        Returns:
+            str: Strong ETag.
+        """
+        return make_etag(user.id, version, query_string, JSON_BACKEND)
+
+    def get_dumper(self, field_names: Optional[tuple] = None) -> RowDumper:
+        """Get the dumper of the requested fields, built once.
+
+        Args:
+            field_names (tuple, None): Serializer fields, in its order.
+                                       Defaults to None (all).
+
+        Returns:
+            RowDumper: Note rows dumper, the cursor fields are
+                       selected even if not requested.
+        """
+        dumper = self.dumpers.get(field_names)
+        if dumper is None:
+            serializer = self.SerializerClass(only=field_names)
+            dumper = RowDumper(serializer, Note,
+                               extra_fields=self.CURSOR_FIELDS)
+            self.dumpers[field_names] = dumper
+        return dumper
+
+    def get_notes_query(self, user: Optional[User] = None,
+                        cursor: Optional[tuple] = None,
+                        limit: Optional[int] = None,
+                        field_names: Optional[tuple] = None) -> ModelSelect:
+        """Get note list page query, as rows of the serializer fields.
+        Only the columns of the requested fields are read, e.g. without
+        "text" the page is read from the covering index alone.
 
         Args:
             user (User, None): User instance. Defaults to None.
+            cursor (tuple, None): Keyset (creation_date, id)
+                                  of the last note already seen.
+                                  Defaults to None.
+            limit (int, None): Max number of notes. Defaults to None.
+            field_names (tuple, None): Serializer fields.
+                                       Defaults to None (all).
 
         Returns:
-            list: Note list.
+            ModelSelect: Note rows query.
         """
+        dumper = self.get_dumper(self, field_names)
         if user:
-            note_query = Note.get_user_notes(user)
+            note_query = Note.get_user_notes(user, cursor=cursor,
+                                             limit=limit)
         else:
-            note_query = Note.select_available()
-        note_list = list()
-        if len(note_query):
+            note_query = Note.paginate_keyset(Note.select_available(),
+                                              cursor=cursor, limit=limit)
+        return note_query.select(*dumper.columns).tuples()
+
+    def get_next_cursor(self, row: tuple, dumper: RowDumper) -> str:
+        """Get the cursor after the row.
+
+        Args:
+            row (tuple): Note row.
+            dumper (RowDumper): Dumper of the row.
+
+        Returns:
+            str: Next page cursor.
+        """
+        creation_date = row[dumper.index('creation_date')]
+        note_id = row[dumper.index('id')]
+        return encode_cursor(creation_date, note_id)
+
+    def list_notes(self, user: Optional[User] = None,
+                   cursor: Optional[tuple] = None,
+                   limit: Optional[int] = None,
+                   field_names: Optional[tuple] = None
+                   ) -> Tuple[list, Optional[str]]:
+        """Get note list page from database, already dumped.
+
+        One extra note is fetched to know if there is a next page,
+        so no COUNT query is needed.
+
+        Args:
+            user (User, None): User instance. Defaults to None.
+            cursor (tuple, None): Keyset (creation_date, id)
+                                  of the last note already seen.
+                                  Defaults to None.
+            limit (int, None): Max number of notes. Defaults to None.
+            field_names (tuple, None): Serializer fields.
+                                       Defaults to None (all).
+
+        Returns:
+            Tuple[list, Optional[str]]: Note list and next page cursor.
+        """
+        dumper = self.get_dumper(self, field_names)
+        page_size = limit + 1 if limit else None
+        note_query = self.get_notes_query(self, user, cursor=cursor,
+                                          limit=page_size,
+                                          field_names=field_names)
+        with phase_timer('db'):
+            row_list = list(note_query)
+        next_cursor = None
+        if limit and len(row_list) > limit:
+            row_list = row_list[:limit]
+            next_cursor = self.get_next_cursor(self, row_list[-1], dumper)
+        with phase_timer('serialization'):
+            note_list = [dumper(row) for row in row_list]
+        return note_list, next_cursor
+
+    def stream_notes(self, user: Optional[User] = None,
+                     cursor: Optional[tuple] = None,
+                     limit: Optional[int] = None,
+                     field_names: Optional[tuple] = None) -> Iterator[bytes]:
+        """Stream note list page from database.
+
+        The rows are iterated without caching them and each note is
+        serialized on its own, so the memory stays flat and the client
+        receives bytes before the query finishes.
+        The body is the same JSON document as the non streamed page.
+
+        Args:
+            user (User, None): User instance. Defaults to None.
+            cursor (tuple, None): Keyset (creation_date, id)
+                                  of the last note already seen.
+                                  Defaults to None.
+            limit (int, None): Max number of notes. Defaults to None.
+            field_names (tuple, None): Serializer fields.
+                                       Defaults to None (all).
+
+        Yields:
+            Iterator[bytes]: JSON fragments.
+        """
+        CHUNK_SIZE = STREAMING.get('CHUNK_SIZE')
+        dumper = self.get_dumper(self, field_names)
+        page_size = limit + 1 if limit else None
+        note_query = self.get_notes_query(self, user, cursor=cursor,
+                                          limit=page_size,
+                                          field_names=field_names)
+
+        # the body is consumed after the "after_request" hooks,
+        # so the connection is closed here
+        try:
+            chunk = [b'{"results"' + KEY_SEPARATOR + b'[']
+            chunk_size = 0
+            count = 0
+            last_row = None
+            next_cursor = None
+            for row in note_query.iterator():
+                if limit and count == limit:
+                    next_cursor = self.get_next_cursor(self, last_row,
+                                                       dumper)
+                    break
+                data = json_dumps(dumper(row))
+                if count:
+                    chunk.append(ITEM_SEPARATOR)
+                chunk.append(data)
+                chunk_size += len(data)
+                count += 1
+                last_row = row
+                if chunk_size >= CHUNK_SIZE:
+                    yield b''.join(chunk)
+                    chunk = []
+                    chunk_size = 0
+        finally:
+            close_db()
+        data = json_dumps(next_cursor)
+        chunk.append(b']' + ITEM_SEPARATOR + b'"next_cursor"' + KEY_SEPARATOR
+                     + data + b'}')
+        yield b''.join(chunk)
+
+    @classmethod
+    @jwt_auth_required
+    def search_notes_resource(cls) -> JSONResponse:
+        """Search notes for endpoint.
+
+        Query params:
+            q (str): Words to search, a trailing "*" matches a prefix.
+            limit (int): Max number of notes.
+            offset (int): Number of notes to skip.
+
+        Returns:
+            JSONResponse: Note list page, best matches first,
+                          and next page offset.
+        """
+        query_serializer = cls.SearchQuerySerializerClass()
+        try:
+            params = query_serializer.load(request.query)
+        except ValidationError as error:
+            data = json_dumps(error.messages)
+            return JSONResponseBadRequest(body=data)
+        user = get_user_from_request()
+        limit, offset = params['limit'], params['offset']
+
+        # one extra note to know if there is a next page
+        note_query = Note.search_user_notes(user, params['q'], offset=offset,
+                                            limit=limit + 1)
+        with phase_timer('db'):
+            # left by a previous process, indexed in the background
+            if NoteSearch.has_pending(note_shards.get_database(user.id)):
+                get_search_indexer(user.id).request()
             note_list = list(note_query)
-        return note_list
+        next_offset = None
+        if len(note_list) > limit:
+            note_list = note_list[:limit]
+            next_offset = offset + limit
+        serializer = cls.SearchPageSerializerClass()
+        page = {'results': note_list, 'next_offset': next_offset}
+        with phase_timer('serialization'):
+            page = serializer.dump(page)
+        with phase_timer('encoding'):
+            data = json_dumps(page)
+        return JSONResponse(body=data)
 
     @classmethod
     @jwt_auth_required
@@ -61,16 +330,53 @@ class NoteResource:
         """
         serializer = cls.SerializerClass()
         try:
-            result = serializer.load(request.json)
+            result = serializer.load(get_json_from_request())
             user = get_user_from_request()
             result['user'] = user
-            note = Note.create(**result)
-            data = serializer.dumps(note)
+            if NOTES_GROUP_COMMIT.get('ENABLED'):
+                note_writer = get_note_writer(user.id)
+                note = note_writer.submit(Note(**result))
+            else:
+                note = Note.create(**result)
+            with phase_timer('serialization'):
+                data = serializer.dumps(note)
         except ValidationError as error:
             data = json_dumps(error.messages)
             return JSONResponseBadRequest(body=data)
+        except GroupCommitBusy as error:
+            return JSONResponseServerBusy()
         return JSONResponse(body=data)
 
+    @classmethod
+    @jwt_auth_required
+    def create_notes_batch_resource(cls) -> JSONResponse:
+        """Create a list of notes for the endpoint,
+        the valid ones are created even if others aren't.
+
+        Returns:
+            JSONResponse: New note IDs and errors by list index.
+        """
+        MAX_SIZE = NOTES_BATCH.get('MAX_SIZE')
+        note_list = get_json_from_request(NOTES_BATCH.get('MAX_BODY_SIZE'))
+        if isinstance(note_list, list) and len(note_list) > MAX_SIZE:
+            message = f'Max number of notes is {MAX_SIZE}.'
+            data = json_dumps({'detail': [message, ]})
+            return JSONResponseBadRequest(body=data)
+        errors = dict()
+        try:
+            result = cls.loader.load(note_list)
+        except ValidationError as error:
+            errors = error.messages
+            result = [note for index, note in enumerate(error.valid_data)
+                      if index not in errors]
+        if not result:
+            data = json_dumps(errors)
+            return JSONResponseBadRequest(body=data)
+        user = get_user_from_request()
+        note_ids = Note.bulk_create_user_notes(user, result)
+        data = json_dumps({'ids': note_ids, 'errors': errors})
+        return JSONResponseCreated(body=data)
+
 
 # USERS RESOURCE
 
@@ -87,7 +393,7 @@ class UserResource:
         serializer = cls.SerializerClass()
         jwt_login_serializer = JWTLoginSerializer()
         try:
-            result = serializer.load(request.json)
+            result = serializer.load(get_json_from_request())
             user = User.create(**result)
 
             # inject the user into the context,
@@ -102,4 +408,6 @@ class UserResource:
             data = {'detail': ['User already exists.', ]}
             data = json_dumps(data)
             return JSONResponseBadRequest(body=data)
+        except PasswordHasherBusy as error:
+            return JSONResponseServerBusy()
         return JSONResponseCreated(body=data)
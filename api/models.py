@@ -1,13 +1,35 @@
-from typing import List, Optional
+from datetime import datetime
+from functools import partial
+from typing import List, Optional, Tuple
 
-from bcrypt import checkpw, gensalt, hashpw
-from peewee import CharField, ForeignKeyField, Model, ModelSelect, TextField
+from peewee import (SQL, CharField, Database, ForeignKeyField, IntegerField,
+                    Model, ModelSelect, TextField, Tuple as SQLTuple, fn)
+from playhouse.signals import post_delete, post_save
+from playhouse.sqlite_ext import (AutoIncrementField, FTS5Model, RowIDField,
+                                  SearchField)
 
-from database import db_instance
+from database import db_instance, note_shards
+from settings import DATABASE, NOTES_GROUP_COMMIT, USER_CACHE
+from utils.background import BackgroundTask
+from utils.cache import LRUCache
+from utils.compaction import compactor
+from utils.group_commit import GroupCommitWriter
+from utils.hashers import PasswordHasherBusy, password_hasher
 from utils.models import BaseModel
+from utils.response_cache import response_cache
+from utils.sharding import IdAllocator
+
+
+# Users identity map: ('username', username) or ('id', id) -> User
+user_cache = LRUCache(
+    maxsize=USER_CACHE.get('MAX_SIZE'),
+    ttl=USER_CACHE.get('TTL').total_seconds(),
+)
 
 
 class User(BaseModel):
+    # never reused, e.g. by the archived users
+    id = AutoIncrementField()
     username = CharField(45, unique=True)
     password = CharField(128)
 
@@ -23,34 +45,44 @@ class User(BaseModel):
 
         Args:
             raw_password (str): User password
+
+        Raises:
+            PasswordHasherBusy: If the hasher queue is full.
         """
-        hashed_password = hashpw(raw_password.encode('utf-8'),
-                                 gensalt(rounds=12))
-        raw_hashed_password = hashed_password.decode('utf-8')
-        self.password = raw_hashed_password
+        self.password = password_hasher.hash(raw_password)
 
     def check_password(self, raw_password: str) -> bool:
-        """Check user password with hash.
+        """Check user password with hash,
+        and hash it again if the configured rounds changed.
 
         Args:
             raw_password (str): User password.
 
+        Raises:
+            PasswordHasherBusy: If the hasher queue is full.
+
         Returns:
             bool: If is successful.
         """
-        try:
-            is_correct = checkpw(raw_password.encode('utf-8'),
-                                 self.password.encode('utf-8'))
-        except ValueError as error:
-            is_correct = False
+        is_correct = password_hasher.check(raw_password, self.password)
+        if is_correct and password_hasher.needs_rehash(self.password):
+            try:
+                self.set_password(raw_password)
+                self.save(only=[User.password])
+            except PasswordHasherBusy as error:
+                # try again on the next login
+                pass
         return is_correct
 
     @classmethod
-    def get_user(cls, username: str) -> Model:
+    def get_user(cls, username: str, cached: bool = True) -> Model:
         """Get user from database.
 
         Args:
             username (str): Username.
+            cached (bool): Check first in the identity map, its users can be
+                           as old as the USER_CACHE TTL. Defaults to True,
+                           the login reads the user again.
 
         Raises:
             JSONResponseNotFound: If user doesn't exist.
@@ -58,42 +90,512 @@ class User(BaseModel):
         Returns:
             UserModel: User instance.
         """
+        # check first in cache, else in DB
+        if cached:
+            user = user_cache.get(('username', username))
+            if user and user.username == username and user.available:
+                return user
         try:
             user_list = cls.select_available()
             user = user_list.where(cls.username == username).get()
         except cls.DoesNotExist as error:
             user = None
+            user_cache.delete(('username', username))
+        else:
+            cls.cache_user(user)
+        return user
+
+    @classmethod
+    def get_user_by_id(cls, pk: int) -> Optional[Model]:
+        """Get user from database by primary key.
+
+        Args:
+            pk (int): User ID.
+
+        Returns:
+            UserModel: User instance or None.
+        """
+        # check first in cache, else in DB
+        user = user_cache.get(('id', pk))
+        if user and user.available:
+            return user
+        try:
+            user = cls.select_available().where(cls.id == pk).get()
+        except cls.DoesNotExist as error:
+            user = None
+        else:
+            cls.cache_user(user)
         return user
 
+    @classmethod
+    def cache_user(cls, user: Model) -> None:
+        """Add the user to the identity map.
+
+        Args:
+            user (User): User instance.
+        """
+        user_cache.set(('username', user.username), user)
+        user_cache.set(('id', user.id), user)
+
+    @classmethod
+    def evict_user(cls, user: Model) -> None:
+        """Remove the user from the identity map.
+        A stale username entry is dropped by "get_user" on lookup.
+
+        Args:
+            user (User): User instance.
+        """
+        user_cache.delete(('username', user.username))
+        user_cache.delete(('id', user.id))
+
+    @classmethod
+    def preload_cache(cls) -> int:
+        """Load the available users into the identity map.
+
+        Returns:
+            int: Number of loaded users.
+        """
+        user_list = cls.select_available().order_by(cls.id.desc())
+        user_list = user_list.limit(user_cache.maxsize)
+        count = 0
+        for user in user_list:
+            cls.cache_user(user)
+            count += 1
+        return count
+
     def __str__(self) -> str:
         return self.username
 
 
-# Create User model.
-db_instance.create_tables([User, ])
+@post_save(sender=User)
+def update_user_cache(sender: type, instance: User, created: bool) -> None:
+    """Keep the identity map in sync with the saved user."""
+    User.evict_user(instance)
+    if instance.available:
+        User.cache_user(instance)
+    else:
+        response_cache.invalidate(instance.id)
+
+
+@post_delete(sender=User)
+def evict_deleted_user(sender: type, instance: User) -> None:
+    """Remove the deleted user from the identity map."""
+    User.evict_user(instance)
+    response_cache.invalidate(instance.id)
 
 
 class Note(BaseModel):
+    """User's note, in the shard of the user, "note_shards".
+    The queries of a user's notes are bound to the user's shard.
+    """
     name = CharField(60)
     text = TextField()
     user = ForeignKeyField(User, backref='notes')
 
+    def save(self, force_insert: bool = False,
+             only: Optional[List[str]] = None) -> None:
+        """Modify the default behavior for saving in the user's shard,
+        with an ID unique across the shards, and bumping the user's
+        note list version in the same transaction."""
+        if self.id is None:
+            self.id, = note_id_sequence.get_ids(1)
+            force_insert = True
+        with note_shards.bind(self.user_id), self._meta.database.atomic():
+            result = super().save(force_insert=force_insert, only=only)
+            NoteVersion.bump(self.user_id)
+        return result
+
+    def delete_instance(self, *args, **kwargs) -> int:
+        """Modify the default behavior for deleting in the user's shard,
+        and bumping the user's note list version in the same
+        transaction."""
+        with note_shards.bind(self.user_id), self._meta.database.atomic():
+            result = super().delete_instance(*args, **kwargs)
+            NoteVersion.bump(self.user_id)
+        return result
+
     @classmethod
-    def get_user_notes(cls, user: User) -> ModelSelect:
+    def get_user_notes(cls, user: User,
+                       cursor: Optional[Tuple[datetime, int]] = None,
+                       limit: Optional[int] = None) -> ModelSelect:
         """Get the user's note list.
 
         Args:
             user (User): User instance.
+            cursor (Tuple[datetime, int], None): Keyset (creation_date, id)
+                                                 of the last note already
+                                                 seen. Defaults to None.
+            limit (int, None): Max number of notes. Defaults to None.
 
         Returns:
-            ModelSelect: User's note list.
+            ModelSelect: User's note list, bound to the user's shard.
         """
         user_notes = cls.select_available().where(cls.user == user.id)
+        user_notes = user_notes.bind(note_shards.get_database(user.id))
+        return cls.paginate_keyset(user_notes, cursor=cursor, limit=limit)
+
+    @classmethod
+    def paginate_keyset(cls, query: ModelSelect,
+                        cursor: Optional[Tuple[datetime, int]] = None,
+                        limit: Optional[int] = None) -> ModelSelect:
+        """Order the query by (creation_date, id) and seek after the cursor,
+        so every page costs the same no matter how deep it is.
+
+        Args:
+            query (ModelSelect): Note query.
+            cursor (Tuple[datetime, int], None): Keyset (creation_date, id)
+                                                 of the last note already
+                                                 seen. Defaults to None.
+            limit (int, None): Max number of notes. Defaults to None.
+
+        Returns:
+            ModelSelect: Note query page.
+        """
+        if cursor:
+            # row values comparison, so the index is seeked
+            keyset = SQLTuple(cls.creation_date, cls.id)
+            query = query.where(keyset > SQLTuple(*cursor))
+        query = query.order_by(cls.creation_date, cls.id)
+        if limit:
+            query = query.limit(limit)
+        return query
+
+    @classmethod
+    def search_user_notes(cls, user: User, terms: str,
+                          offset: int = 0,
+                          limit: Optional[int] = None) -> ModelSelect:
+        """Search the user's notes, the best matches first.
+
+        Args:
+            user (User): User instance.
+            terms (str): Words to search, all of them must match,
+                         a trailing "*" matches a prefix.
+            offset (int): Number of notes to skip. Defaults to 0.
+            limit (int, None): Max number of notes. Defaults to None.
+
+        Returns:
+            ModelSelect: User's notes, with the "snippet" of the match,
+                         bound to the user's shard.
+        """
+        snippet = fn.snippet(SQL('"note_search"'), -1, '<mark>', '</mark>',
+                             '…', 16)
+        user_notes = (
+            cls.select(cls, snippet.alias('snippet'))
+            .join(NoteSearch, on=(NoteSearch.rowid == cls.id))
+            .where(NoteSearch.match(NoteSearch.build_query(terms)),
+                   cls.user == user.id, cls.available == True)
+            .order_by(NoteSearch.rank(), cls.id)
+            .offset(offset)
+            .bind(note_shards.get_database(user.id))
+        )
+        if limit:
+            user_notes = user_notes.limit(limit)
         return user_notes
 
+    @classmethod
+    def bulk_create_user_notes(cls, user: User,
+                               note_list: List[dict]) -> List[int]:
+        """Create the user's notes in a single transaction, with one
+        prepared INSERT, their full-text index is deferred to the
+        shard's search indexer, after the commit.
+
+        Args:
+            user (User): User instance.
+            note_list (List[dict]): Note fields.
+
+        Returns:
+            List[int]: New note IDs, in the same order.
+        """
+        note_ids = note_id_sequence.get_ids(len(note_list))
+        database = note_shards.get_database(user.id)
+        with note_shards.bind_database(database), database.atomic():
+            # indexed for the search at once later, not by row
+            NoteSearch.defer_index(database, note_ids)
+            cls.insert_rows(database, (
+                dict(note, id=note_id, user=user.id)
+                for note, note_id in zip(note_list, note_ids)
+            ))
+            NoteVersion.bump(user.id)
+        get_search_indexer(user.id).request()
+        return note_ids
+
+    @classmethod
+    def insert_notes(cls, note_list: List[Model]) -> List[Model]:
+        """Insert the notes of users of the same shard, with one
+        prepared INSERT, in the caller's transaction, e.g. a group commit.
+
+        Args:
+            note_list (List[Note]): Unsaved notes.
+
+        Returns:
+            List[Note]: The same notes, with their IDs.
+        """
+        note_ids = note_id_sequence.get_ids(len(note_list))
+        database = note_shards.get_database(note_list[0].user_id)
+        with note_shards.bind_database(database):
+            cls.insert_rows(database, (
+                dict(note.__data__, id=note_id)
+                for note, note_id in zip(note_list, note_ids)
+            ))
+            for user_id in sorted({note.user_id for note in note_list}):
+                NoteVersion.bump(user_id)
+
+        # only when all of them are inserted, so a failed batch can be
+        # inserted again
+        for note, note_id in zip(note_list, note_ids):
+            note.id = note_id
+        return note_list
+
     def __str__(self) -> str:
         return self.name
 
+    class Meta:
+        database = note_shards
+
+
+class NoteSearch(FTS5Model):
+    """Full-text index of the available notes, by shard,
+    kept in sync by the triggers of the Note table.
+    """
+    rowid = RowIDField()
+    name = SearchField()
+    text = SearchField()
+
+    @staticmethod
+    def build_query(terms: str) -> str:
+        """Build the FTS5 query of the words, quoted so the
+        FTS5 syntax can't be injected.
+
+        Args:
+            terms (str): Words to search, a trailing "*" matches a prefix.
+
+        Returns:
+            str: FTS5 query.
+        """
+        tokens = list()
+        for term in terms.split():
+            is_prefix = len(term) > 1 and term.endswith('*')
+            if is_prefix:
+                term = term[:-1]
+            token = '"{}"'.format(term.replace('"', '""'))
+            tokens.append(token + '*' if is_prefix else token)
+        return ' '.join(tokens)
+
+    @classmethod
+    def defer_index(cls, database: Database, note_ids: List[int]) -> None:
+        """Mark the notes as not indexed yet, before inserting them,
+        so the FTS triggers skip them. In the caller's transaction.
+
+        Args:
+            database (Database): Shard of the notes.
+            note_ids (List[int]): Note IDs.
+        """
+        database.cursor().executemany(
+            'INSERT INTO "note_search_pending" ("id") VALUES (?)',
+            [(note_id, ) for note_id in note_ids])
+
+    @classmethod
+    def has_pending(cls, database: Database) -> bool:
+        """Check, without writing, if notes of the shard aren't indexed.
+
+        Args:
+            database (Database): Shard of the notes.
+
+        Returns:
+            bool: True if there are pending notes.
+        """
+        query = 'SELECT 1 FROM "note_search_pending" LIMIT 1'
+        return database.execute_sql(query).fetchone() is not None
+
+    @classmethod
+    def index_pending(cls, database: Database) -> int:
+        """Index the notes of the shard not indexed yet, at once,
+        run by the shard's search indexer.
+
+        Args:
+            database (Database): Shard of the notes.
+
+        Returns:
+            int: Number of notes that were pending, the deleted ones too.
+        """
+        if not cls.has_pending(database):
+            return 0
+        with database.atomic('IMMEDIATE'):
+            database.execute_sql(
+                'INSERT INTO "note_search" ("rowid", "name", "text") '
+                'SELECT "note"."id", "note"."name", "note"."text" '
+                'FROM "note_search_pending" '
+                'JOIN "note" ON "note"."id" = "note_search_pending"."id" '
+                'WHERE "note"."available"'
+            )
+            cursor = database.execute_sql('DELETE FROM "note_search_pending"')
+        return cursor.rowcount
+
+    @classmethod
+    def rebuild_index(cls) -> int:
+        """Index again all the available notes, shard by shard.
+
+        Returns:
+            int: Number of indexed notes.
+        """
+        count = 0
+        for database in note_shards:
+            with database.atomic():
+                cls._fts_cmd('delete-all')
+                database.execute_sql('DELETE FROM "note_search_pending"')
+                query = cls.insert_from(
+                    Note.select(Note.id, Note.name, Note.text)
+                    .where(Note.available == True),
+                    [cls.rowid, cls.name, cls.text],
+                )
+                count += database.execute(query).rowcount
+            cls.optimize()
+        return count
+
+    class Meta:
+        database = note_shards
+        table_name = 'note_search'
+        options = {
+            'content': 'note',
+            'content_rowid': 'id',
+            'tokenize': 'unicode61 remove_diacritics 2',
+        }
+
+
+class NoteVersion(Model):
+    """Version of each user's note list, bumped on every note change,
+    in the user's shard. Bulk "Note.update()" queries must bump it
+    themselves.
+
+    The cached responses are keyed by version too, so a response cached
+    by a worker that read the version before a commit is never used.
+    """
+    user_id = IntegerField(primary_key=True)
+    version = IntegerField(default=0)
+
+    @classmethod
+    def get_version(cls, user_id: int) -> int:
+        """Get the user's note list version.
+
+        Args:
+            user_id (int): User ID.
+
+        Returns:
+            int: Version, 0 if the notes never changed.
+        """
+        version = (cls.select(cls.version).where(cls.user_id == user_id)
+                   .bind(note_shards.get_database(user_id)).scalar())
+        return version or 0
+
+    @classmethod
+    def bump(cls, user_id: int) -> None:
+        """Increment the user's note list version,
+        and remove the user's cached responses.
+
+        Args:
+            user_id (int): User ID.
+        """
+        query = cls.insert(user_id=user_id, version=1).on_conflict(
+            conflict_target=[cls.user_id],
+            update={cls.version: cls.version + 1},
+        )
+        query.execute(note_shards.get_database(user_id))
+        response_cache.invalidate(user_id)
+
+    class Meta:
+        database = note_shards
+        table_name = 'note_version'
+
+
+# Soft-deleted rows moved to the archive tables by "manage.py compact",
+# the notes first, then the users with all their notes
+compactor.register(Note)
+compactor.register(User, dependents=(Note.user, ))
+
+
+# Note IDs, unique across the shards
+note_id_sequence = IdAllocator(db_instance, Note,
+                               DATABASE.get('ID_BLOCK_SIZE'), note_shards)
+
+
+# Concurrent note creations committed together, "NOTES_GROUP_COMMIT",
+# a writer by shard
+note_writers = [
+    GroupCommitWriter(
+        database,
+        Note.insert_notes,
+        window=NOTES_GROUP_COMMIT.get('WINDOW'),
+        max_batch=NOTES_GROUP_COMMIT.get('MAX_BATCH'),
+        queue_size=NOTES_GROUP_COMMIT.get('QUEUE_SIZE'),
+        timeout=NOTES_GROUP_COMMIT.get('TIMEOUT'),
+    )
+    for database in note_shards.databases
+]
+
+
+# Full-text index of the notes created by batch, a thread by shard
+search_indexers = [
+    BackgroundTask(database, partial(NoteSearch.index_pending, database),
+                   name='search-indexer')
+    for database in note_shards.databases
+]
+
+
+def get_search_indexer(user_id: int) -> BackgroundTask:
+    """Get the search indexer of the user's shard.
+
+    Args:
+        user_id (int): User ID.
+
+    Returns:
+        BackgroundTask: Shard indexer.
+    """
+    return search_indexers[note_shards.get_index(user_id)]
+
+
+def get_note_writer(user_id: int) -> GroupCommitWriter:
+    """Get the group commit writer of the user's shard.
+
+    Args:
+        user_id (int): User ID.
+
+    Returns:
+        GroupCommitWriter: Shard writer.
+    """
+    return note_writers[note_shards.get_index(user_id)]
+
+
+def note_writers_stats() -> dict:
+    """Group commit counters of all the shards.
+
+    Returns:
+        dict: Committed batches and items, and waiting items.
+    """
+    stats = dict()
+    for writer in note_writers:
+        for name, value in writer.stats().items():
+            stats[name] = stats.get(name, 0) + value
+    return stats
+
+
+def search_indexers_stats() -> dict:
+    """Search indexer counters of all the shards.
+
+    Returns:
+        dict: Successful runs, failed runs and pending requests.
+    """
+    stats = dict()
+    for indexer in search_indexers:
+        for name, value in indexer.stats().items():
+            stats[name] = stats.get(name, 0) + value
+    return stats
+
 
-# Create Note model.
-db_instance.create_tables([Note, ])
+def close_background_tasks() -> None:
+    """Write the queued notes and index the pending ones, then stop
+    their threads, e.g. before closing the database connections.
+    """
+    for writer in note_writers:
+        writer.close()
+    for indexer in search_indexers:
+        indexer.close()
@@ -1,5 +1,10 @@
-from marshmallow import EXCLUDE, Schema
-from marshmallow.fields import DateTime, Int, Str
+from marshmallow import EXCLUDE, Schema, ValidationError, validates_schema
+from marshmallow.fields import Bool, DateTime, Field, Int, Nested, Str
+from marshmallow.validate import Length, Range
+
+from settings import PAGINATION, STREAMING
+from utils import json_codec
+from utils.pagination import decode_cursor
 
 
 class NoteSerializer(Schema):
@@ -8,6 +13,130 @@ class NoteSerializer(Schema):
     text = Str(required=True)
     creation_date = DateTime(dump_only=True)
 
+    class Meta:
+        # "only" keeps the schema order, else it's a set
+        ordered = True
+        unknown = EXCLUDE
+        render_module = json_codec
+
+
+class NotePageSerializer(Schema):
+    results = Nested(NoteSerializer, many=True)
+    next_cursor = Str(allow_none=True)
+
+    class Meta:
+        # the streamed pages are written in this order
+        ordered = True
+        render_module = json_codec
+
+
+class Cursor(Field):
+    """Opaque keyset cursor, loaded as (creation_date, id)."""
+
+    def _deserialize(self, value, attr, data, **kwargs) -> tuple:
+        try:
+            return decode_cursor(str(value))
+        except ValueError as error:
+            raise ValidationError('Invalid cursor.') from error
+
+
+class FieldNames(Field):
+    """Comma-separated field names of a schema, loaded as a tuple
+    in the schema order, so the same fields give the same tuple.
+    """
+
+    def __init__(self, schema_class: type, **kwargs) -> None:
+        """
+        Args:
+            schema_class (type): Schema of the fields, only the dumped
+                                 ones are allowed.
+        """
+        super().__init__(**kwargs)
+        self.field_names = tuple(
+            name for name, field in schema_class._declared_fields.items()
+            if not field.load_only
+        )
+
+    def _deserialize(self, value, attr, data, **kwargs) -> tuple:
+        names = {name.strip() for name in str(value).split(',')}
+        names.discard('')
+        if not names:
+            raise ValidationError('Must have field names.')
+        unknown_names = names.difference(self.field_names)
+        if unknown_names:
+            raise ValidationError(
+                f'Unknown fields: {", ".join(sorted(unknown_names))}.')
+        return tuple(name for name in self.field_names if name in names)
+
+
+class NoteListQuerySerializer(Schema):
+    limit = Int(missing=PAGINATION.get('DEFAULT_LIMIT'),
+                validate=Range(min=1))
+    cursor = Cursor(missing=None)
+    stream = Bool(missing=False)
+    # "fields" is the attribute of the schema fields
+    field_names = FieldNames(NoteSerializer, data_key='fields', missing=None)
+
+    @validates_schema
+    def validate_limit(self, data: dict, **kwargs) -> None:
+        """Check the limit, streamed lists allow bigger pages.
+
+        Args:
+            data (dict): From request.
+
+        Raises:
+            ValidationError: If limit is greater than allowed.
+        """
+        limit = data.get('limit')
+        if data.get('stream'):
+            max_limit = STREAMING.get('MAX_LIMIT')
+        else:
+            max_limit = PAGINATION.get('MAX_LIMIT')
+        if limit and limit > max_limit:
+            message = f'Must be less than or equal to {max_limit}.'
+            raise ValidationError(message, field_name='limit')
+
+    class Meta:
+        unknown = EXCLUDE
+
+
+class NoteSearchResultSerializer(NoteSerializer):
+    snippet = Str(dump_only=True)
+
+    class Meta(NoteSerializer.Meta):
+        ordered = True
+
+
+class NoteSearchPageSerializer(Schema):
+    results = Nested(NoteSearchResultSerializer, many=True)
+    next_offset = Int(allow_none=True)
+
+    class Meta:
+        ordered = True
+        render_module = json_codec
+
+
+class NoteSearchQuerySerializer(Schema):
+    q = Str(required=True, validate=Length(min=1, max=256))
+    limit = Int(missing=PAGINATION.get('DEFAULT_LIMIT'),
+                validate=Range(min=1, max=PAGINATION.get('MAX_LIMIT')))
+    offset = Int(missing=0, validate=Range(min=0))
+
+    @validates_schema
+    def validate_terms(self, data: dict, **kwargs) -> None:
+        """Check that there are words to search.
+
+        Args:
+            data (dict): From request.
+
+        Raises:
+            ValidationError: If "q" has only blanks.
+        """
+        terms = data.get('q')
+        if terms is not None and not terms.split():
+            raise ValidationError('Must have words to search.',
+                                  field_name='q')
+
     class Meta:
         unknown = EXCLUDE
 
@@ -18,3 +147,4 @@ class UserSerializer(Schema):
 
     class Meta:
         unknown = EXCLUDE
+        render_module = json_codec
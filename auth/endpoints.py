@@ -1,10 +1,10 @@
-from json import dumps as json_dumps
-
-from bottle import request
 from marshmallow import ValidationError
 
 from auth.serializers import JWTLoginSerializer
-from utils.exceptions import JSONResponseBadRequest
+from utils.exceptions import JSONResponseBadRequest, JSONResponseServerBusy
+from utils.hashers import PasswordHasherBusy
+from utils.json_codec import dumps as json_dumps
+from utils.request import get_json_from_request
 from utils.response import JSONResponse
 
 
@@ -20,9 +20,11 @@ class JWTAuthenticationResource:
         """
         serializer = cls.SerializerClass()
         try:
-            result = serializer.load(request.json)
+            result = serializer.load(get_json_from_request())
             data = json_dumps(result)
         except ValidationError as error:
             data = json_dumps(error.messages)
             return JSONResponseBadRequest(body=data)
+        except PasswordHasherBusy as error:
+            return JSONResponseServerBusy()
         return JSONResponse(body=result)
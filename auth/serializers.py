@@ -2,6 +2,7 @@ from marshmallow import EXCLUDE, Schema, post_load, ValidationError
 from marshmallow.fields import Str
 
 from api.models import User
+from utils import json_codec
 from utils.jwt_auth import generate_jwtoken
 
 
@@ -25,10 +26,11 @@ class JWTLoginSerializer(Schema):
         username = data.get('username')
         password = data.get('password')
 
-        # check first in context, else in DB
+        # check first in context, else in DB, never in the identity map,
+        # the password or the user may have changed since it was cached
         user = self.context.get('user', None)
         if not user:
-            user = User.get_user(username)
+            user = User.get_user(username, cached=False)
 
         # may be that the user doesn't exist in DB
         if not user or not user.check_password(password):
@@ -40,3 +42,4 @@ class JWTLoginSerializer(Schema):
 
     class Meta:
         unknown = EXCLUDE
+        render_module = json_codec
@@ -0,0 +1,6 @@
+"""Performance benchmarks, run them as modules, e.g.:
+
+    $ python -m benchmarks.json_backends
+    $ python -m benchmarks.hot_paths --output baseline.json
+    $ python -m benchmarks.loadtest --target http
+"""
@@ -0,0 +1,145 @@
+"""Shared helpers of the benchmarks: a temporary database,
+synthetic data and in-process WSGI calls.
+
+The app modules must be imported inside "temporary_workdir", so the
+SQLite files of the settings are created in the temporary directory.
+"""
+import os
+from contextlib import contextmanager
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from benchmarks.json_backends import best_time
+
+
+@contextmanager
+def temporary_workdir() -> Iterator[str]:
+    """Run in a temporary working directory, the database
+    and the caches are created there and removed at the end.
+    The rate limit is disabled, unless set in the environment.
+
+    Yields:
+        Iterator[str]: Temporary directory path.
+    """
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    # all the requests come from the same IP
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+    current_dir = os.getcwd()
+    with TemporaryDirectory() as temp_dir:
+        os.chdir(temp_dir)
+        try:
+            yield temp_dir
+        finally:
+            from api.models import close_background_tasks
+            from database import close_all_db, close_db
+
+            close_background_tasks()
+            close_db()
+            close_all_db()
+            os.chdir(current_dir)
+
+
+def generate_data(users: int, notes_per_user: int,
+                  password: str = 'benchmark') -> List[Tuple[int, str]]:
+    """Create the schema and N users with M notes each.
+    The password is hashed once, all the users share it.
+
+    Args:
+        users (int): Number of users.
+        notes_per_user (int): Number of notes by user.
+        password (str): Users password. Defaults to "benchmark".
+
+    Returns:
+        List[Tuple[int, str]]: User IDs and usernames.
+    """
+    from api.models import Note, User
+    from database import db_instance
+    from migrations import migrate
+    from utils.hashers import password_hasher
+
+    migrate()
+    hashed_password = password_hasher.hash(password)
+    usernames = [f'user{index}' for index in range(users)]
+    with db_instance.atomic():
+        User.insert_many([
+            {'username': username, 'password': hashed_password}
+            for username in usernames
+        ]).execute()
+    user_list = list(User.select(User.id, User.username)
+                     .where(User.username.in_(usernames))
+                     .order_by(User.id).tuples())
+    for user_id, username in user_list:
+        note_list = [
+            {'name': f'Note {index}',
+             'text': f'Lorem ipsum dolor sit amet {index}, ñandú. ' * 4}
+            for index in range(notes_per_user)
+        ]
+        Note.bulk_create_user_notes(User(id=user_id), note_list)
+    return user_list
+
+
+def make_wsgi_call(app: Callable, method: str, path: str,
+                   query_string: str = '',
+                   headers: Optional[Dict[str, str]] = None,
+                   body: Optional[Callable[[], bytes]] = None
+                   ) -> Callable[[], bytes]:
+    """Build a function calling the WSGI app, without a server.
+
+    Args:
+        app (Callable): WSGI app.
+        method (str): HTTP method.
+        path (str): URL path.
+        query_string (str): Defaults to ''.
+        headers (Dict[str, str], None): HTTP headers. Defaults to None.
+        body (Callable[[], bytes], None): Builds the JSON body of each
+                                          call. Defaults to None.
+
+    Returns:
+        Callable[[], bytes]: Returns the response body.
+    """
+    base_environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query_string,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '8000',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.url_scheme': 'http',
+        'CONTENT_LENGTH': '0',
+    }
+    for name, value in (headers or {}).items():
+        base_environ['HTTP_' + name.upper().replace('-', '_')] = value
+
+    def start_response(status: str, headers: list, exc_info=None) -> None:
+        pass
+
+    def call() -> bytes:
+        environ = dict(base_environ)
+        data = body() if body else b''
+        if body:
+            environ['CONTENT_TYPE'] = 'application/json'
+        environ['CONTENT_LENGTH'] = str(len(data))
+        environ['wsgi.input'] = BytesIO(data)
+        chunks = app(environ, start_response)
+        try:
+            return b''.join(chunks)
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+    return call
+
+
+def measure(func: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Time a call.
+
+    Args:
+        func (Callable[[], object]): Benchmarked function.
+        repeat (int): Number of timing rounds.
+
+    Returns:
+        Dict[str, float]: Best and median time of a call, in seconds.
+    """
+    times = sorted(best_time(func, 1) for _ in range(repeat))
+    return {'best': times[0], 'median': times[len(times) // 2]}
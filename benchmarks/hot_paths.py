@@ -0,0 +1,249 @@
+# Run with "python -m benchmarks.hot_paths"
+
+import platform
+from argparse import ArgumentParser
+from datetime import datetime
+from fnmatch import fnmatch
+from itertools import count
+from json import dump as json_dump, load as json_load
+from sys import exit
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.fixtures import (generate_data, make_wsgi_call, measure,
+                                 temporary_workdir)
+
+
+def get_route_calls(app: Callable, headers: Dict[str, str],
+                    username: str, password: str
+                    ) -> Dict[Tuple[str, str], Callable[[], bytes]]:
+    """Build an in-process call for every API route.
+
+    Args:
+        app (Callable): WSGI app, with the API mounted at "/api/v1/".
+        headers (Dict[str, str]): Authorization headers.
+        username (str): Existing username.
+        password (str): Its password.
+
+    Returns:
+        Dict[Tuple[str, str], Callable[[], bytes]]: Calls by (method, rule).
+    """
+    from utils.json_codec import dumps as json_dumps
+
+    note = json_dumps({'name': 'Note', 'text': 'Lorem ipsum dolor sit amet.'})
+    note_list = json_dumps([{'name': f'Note {index}', 'text': 'Lorem ipsum.'}
+                            for index in range(10)])
+    login = json_dumps({'username': username, 'password': password})
+    user_ids = count()
+
+    def new_user() -> bytes:
+        return json_dumps({'username': f'new-user{next(user_ids)}',
+                           'password': password})
+
+    prefix = '/api/v1'
+    return {
+        ('GET', '/notes'): make_wsgi_call(
+            app, 'GET', f'{prefix}/notes', 'limit=100', headers),
+        ('POST', '/notes'): make_wsgi_call(
+            app, 'POST', f'{prefix}/notes', headers=headers,
+            body=lambda: note),
+        ('POST', '/notes/batch'): make_wsgi_call(
+            app, 'POST', f'{prefix}/notes/batch', headers=headers,
+            body=lambda: note_list),
+        ('GET', '/notes/search'): make_wsgi_call(
+            app, 'GET', f'{prefix}/notes/search', 'q=lorem&limit=20',
+            headers),
+        ('POST', '/users'): make_wsgi_call(
+            app, 'POST', f'{prefix}/users', body=new_user),
+        ('POST', '/auth/token'): make_wsgi_call(
+            app, 'POST', f'{prefix}/auth/token', body=lambda: login),
+    }
+
+
+def get_cases(users: int, notes: int) -> Dict[str, Callable[[], object]]:
+    """Create the synthetic data and build the benchmark cases.
+
+    Args:
+        users (int): Number of users.
+        notes (int): Number of notes by user.
+
+    Returns:
+        Dict[str, Callable[[], object]]: Benchmarked functions by name.
+
+    Raises:
+        LookupError: If an API route has no benchmark.
+    """
+    from api import app as api_app
+    from api.endpoints import NoteResource
+    from api.models import Note, User, user_cache
+    from api.serializers import NoteSerializer
+    from server import app
+    from utils.jwt_auth import (check_jwt_claims, decode_jwtoken,
+                                generate_jwtoken)
+
+    password = 'benchmark'
+    user_list = generate_data(users, notes, password=password)
+    user_id, username = user_list[0]
+    user = User.get_user(username)
+    jwtoken = generate_jwtoken(user)
+    note_list = list(Note.get_user_notes(user, limit=1000))
+    serializer = NoteSerializer()
+
+    def get_user_uncached() -> None:
+        user_cache.clear()
+        User.get_user(username)
+
+    def create_note() -> None:
+        Note.create(name='Note', text='Lorem ipsum dolor sit amet.',
+                    user=user)
+
+    cases = {
+        'serializer_dumps_10': lambda: serializer.dumps(note_list[:10],
+                                                        many=True),
+        'serializer_dumps_100': lambda: serializer.dumps(note_list[:100],
+                                                         many=True),
+        'serializer_dumps_1000': lambda: serializer.dumps(note_list[:1000],
+                                                          many=True),
+        'jwt_decode_and_check': lambda: check_jwt_claims(
+            decode_jwtoken(jwtoken), inject_user=False),
+        'user_get_user': lambda: User.get_user(username),
+        'user_get_user_uncached': get_user_uncached,
+        'note_list_notes_100': lambda: NoteResource.list_notes(
+            NoteResource, user, limit=100),
+        'note_list_notes_100_fields': lambda: NoteResource.list_notes(
+            NoteResource, user, limit=100, field_names=('id', 'name')),
+        'note_create': create_note,
+    }
+
+    headers = {'Authorization': f'Bearer {jwtoken}'}
+    route_calls = get_route_calls(app, headers, username, password)
+    for route in api_app.routes:
+        key = (route.method, route.rule)
+        if key not in route_calls:
+            raise LookupError(f'No benchmark for {route.method} '
+                              f'{route.rule}, add it to get_route_calls.')
+        cases[f'wsgi {route.method} {route.rule}'] = route_calls[key]
+    return cases
+
+
+def run(users: int, notes: int, repeat: int,
+        only: Optional[str] = None) -> dict:
+    """Run the benchmark cases.
+
+    Args:
+        users (int): Number of users.
+        notes (int): Number of notes by user.
+        repeat (int): Number of timing rounds.
+        only (str, None): Run only the cases matching the pattern,
+                          e.g. "wsgi *". Defaults to None.
+
+    Returns:
+        dict: Metadata and results, times in seconds.
+    """
+    results = dict()
+    with temporary_workdir():
+        from settings import PASSWORD_HASHER
+        from utils.json_codec import JSON_BACKEND
+
+        for name, func in get_cases(users, notes).items():
+            if only and not fnmatch(name, only):
+                continue
+            results[name] = measure(func, repeat)
+    return {
+        'meta': {
+            'date': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'json_backend': JSON_BACKEND,
+            'password_hasher_rounds': PASSWORD_HASHER.get('ROUNDS'),
+            'users': users,
+            'notes_per_user': notes,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def compare(report: dict, baseline: dict,
+            threshold: float) -> List[Tuple[str, float]]:
+    """Find the cases slower than in the baseline.
+
+    Args:
+        report (dict): Current results.
+        baseline (dict): Saved results.
+        threshold (float): Allowed slowdown, e.g. 0.1 is 10 %.
+
+    Returns:
+        List[Tuple[str, float]]: Regressions, case name and slowdown.
+    """
+    regressions = list()
+    baseline_results = baseline.get('results', {})
+    for name, result in report['results'].items():
+        if name not in baseline_results:
+            continue
+        slowdown = result['best'] / baseline_results[name]['best'] - 1
+        if slowdown > threshold:
+            regressions.append((name, slowdown))
+    return regressions
+
+
+def print_report(report: dict, baseline: Optional[dict] = None) -> None:
+    baseline_results = (baseline or {}).get('results', {})
+    print(f'{"case":<32} {"best (µs)":>12} {"median (µs)":>12} '
+          f'{"vs baseline":>12}')
+    for name, result in report['results'].items():
+        change = ''
+        if name in baseline_results:
+            ratio = result['best'] / baseline_results[name]['best'] - 1
+            change = f'{ratio:+.1%}'
+        print(f'{name:<32} {result["best"] * 1e6:>12.1f} '
+              f'{result["median"] * 1e6:>12.1f} {change:>12}')
+
+
+def main() -> int:
+    parser = ArgumentParser(
+        description='Benchmark the API hot paths on synthetic data.')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--notes', type=int, default=1000,
+                        help='Notes by user.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', default=None,
+                        help='Run only the matching cases, e.g. "wsgi *".')
+    parser.add_argument('--output', default=None,
+                        help='Write the results as JSON.')
+    parser.add_argument('--input', default=None,
+                        help='Load the results from JSON instead of '
+                             'running the cases.')
+    parser.add_argument('--baseline', default=None,
+                        help='Compare with the JSON results of a run.')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Allowed slowdown vs the baseline.')
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input) as file:
+            report = json_load(file)
+    else:
+        report = run(args.users, args.notes, args.repeat, only=args.only)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json_dump(report, file, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json_load(file)
+    print_report(report, baseline)
+    if baseline is None:
+        return 0
+
+    regressions = compare(report, baseline, args.threshold)
+    for name, slowdown in regressions:
+        print(f'Regression: {name} is {slowdown:.1%} slower.')
+    if regressions:
+        return 1
+    print(f'No regressions above {args.threshold:.0%}.')
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,81 @@
+# Run with "python -m benchmarks.ingestion"
+
+from argparse import ArgumentParser
+from time import perf_counter
+from typing import Callable, Tuple
+
+from benchmarks.fixtures import (generate_data, make_wsgi_call,
+                                 temporary_workdir)
+from benchmarks.json_backends import best_time
+
+
+TEXT = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 4
+
+
+def time_batches(create_notes: Callable[[], bytes], flush: Callable,
+                 repeat: int) -> Tuple[float, float]:
+    """Best time of a batch request, started with the search indexer
+    idle, and best time of its background indexing.
+    """
+    batch_times, index_times = list(), list()
+    for _ in range(repeat):
+        flush()
+        start = perf_counter()
+        create_notes()
+        created = perf_counter()
+        flush()
+        batch_times.append(created - start)
+        index_times.append(perf_counter() - created)
+    return min(batch_times), min(index_times)
+
+
+def run(batch_size: int, repeat: int) -> dict:
+    from api.models import User, get_search_indexer
+    from server import app
+    from utils.json_codec import dumps as json_dumps
+    from utils.jwt_auth import generate_jwtoken
+
+    (user_id, username), = generate_data(1, 0)
+    user = User(id=user_id, username=username)
+    headers = {'Authorization': f'Bearer {generate_jwtoken(user)}'}
+    note = json_dumps({'name': 'Note', 'text': TEXT})
+    note_list = json_dumps([{'name': f'Note {index}', 'text': TEXT}
+                            for index in range(batch_size)])
+    create_note = make_wsgi_call(app, 'POST', '/api/v1/notes',
+                                 headers=headers, body=lambda: note)
+    create_notes = make_wsgi_call(app, 'POST', '/api/v1/notes/batch',
+                                  headers=headers, body=lambda: note_list)
+    batch_time, index_time = time_batches(
+        create_notes, get_search_indexer(user_id).flush, repeat)
+    return {
+        'single': best_time(create_note, repeat),
+        'batch': batch_time / batch_size,
+        'index': index_time / batch_size,
+    }
+
+
+def main() -> None:
+    parser = ArgumentParser(
+        description='Compare the note creation by batch with the creation '
+                    'one by one, per note.')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='Notes by batch request.')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with temporary_workdir():
+        result = run(args.batch_size, args.repeat)
+
+    print(f'{"POST /notes, by note (µs)":<36} '
+          f'{result["single"] * 1e6:>9.1f}')
+    print(f'{"POST /notes/batch, by note (µs)":<36} '
+          f'{result["batch"] * 1e6:>9.1f}')
+    print(f'{"index in background, by note (µs)":<36} '
+          f'{result["index"] * 1e6:>9.1f}')
+    print(f'{"speedup":<36} {result["single"] / result["batch"]:>9.1f}x')
+    speedup = result['single'] / (result['batch'] + result['index'])
+    print(f'{"speedup, index included":<36} {speedup:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
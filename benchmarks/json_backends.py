@@ -0,0 +1,98 @@
+# Run with "python -m benchmarks.json_backends"
+
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from json import dumps as std_dumps, loads as std_loads
+from timeit import Timer
+from typing import Callable, Dict, List
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def make_note_page(size: int) -> dict:
+    """Build a note list page, as dumped by the API.
+
+    Args:
+        size (int): Number of notes.
+
+    Returns:
+        dict: Note list page.
+    """
+    start_date = datetime(2021, 5, 24)
+    results = [
+        {
+            'id': index,
+            'name': f'Note {index}',
+            'text': 'Lorem ipsum dolor sit amet, ñandú. ' * 8,
+            'creation_date': (start_date
+                              + timedelta(seconds=index)).isoformat(),
+        }
+        for index in range(1, size + 1)
+    ]
+    return {'results': results, 'next_cursor': None}
+
+
+def get_backends() -> Dict[str, Dict[str, Callable]]:
+    backends = {
+        'json': {
+            'dumps': lambda obj: std_dumps(obj).encode('utf-8'),
+            'loads': std_loads,
+        },
+    }
+    if orjson:
+        backends['orjson'] = {
+            'dumps': lambda obj: orjson.dumps(
+                obj, option=orjson.OPT_NON_STR_KEYS),
+            'loads': orjson.loads,
+        }
+    return backends
+
+
+def best_time(func: Callable[[], object], repeat: int) -> float:
+    """Best time of a call, in seconds."""
+    timer = Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run(sizes: List[int], repeat: int) -> List[dict]:
+    results = list()
+    backends = get_backends()
+    for size in sizes:
+        page = make_note_page(size)
+        document = std_dumps(page).encode('utf-8')
+        for name, backend in backends.items():
+            dumps, loads = backend['dumps'], backend['loads']
+            results.append({
+                'backend': name,
+                'notes': size,
+                'bytes': len(dumps(page)),
+                'dumps': best_time(lambda: dumps(page), repeat),
+                'loads': best_time(lambda: loads(document), repeat),
+            })
+    return results
+
+
+def main() -> None:
+    parser = ArgumentParser(
+        description='Compare the JSON backends on note list pages.')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    if not orjson:
+        print('orjson is not installed, only the standard library is run.')
+
+    print(f'{"backend":<8} {"notes":>6} {"bytes":>9} '
+          f'{"dumps (µs)":>12} {"loads (µs)":>12}')
+    for result in run(args.sizes, args.repeat):
+        print(f'{result["backend"]:<8} {result["notes"]:>6} '
+              f'{result["bytes"]:>9} {result["dumps"] * 1e6:>12.1f} '
+              f'{result["loads"] * 1e6:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
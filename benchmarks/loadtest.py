@@ -0,0 +1,410 @@
+# Run with "python -m benchmarks.loadtest"
+"""Offline load test of the whole stack ("server.app").
+
+Concurrent clients run a weighted mix of operations with pre-issued
+tokens, against the WSGI app in-process ("wsgi" target) or against the
+multi-worker server started on a local port ("http" target).
+"""
+import os
+import signal
+from argparse import ArgumentParser
+from http.client import HTTPConnection
+from io import BytesIO
+from json import dump as json_dump
+from math import ceil
+from random import Random
+from socket import create_connection, socket
+from sys import exit
+from threading import Thread
+from time import monotonic, perf_counter, sleep
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from benchmarks.fixtures import generate_data, temporary_workdir
+
+
+class Operation(NamedTuple):
+    method: str
+    path: str
+    query_string: str
+    # builds the JSON body, from a random generator and the username
+    body: Optional[Callable[[Random, str], dict]]
+    authenticated: bool
+
+
+PASSWORD = 'benchmark'
+
+OPERATIONS = {
+    'login': Operation(
+        'POST', '/api/v1/auth/token', '',
+        lambda rng, username: {'username': username, 'password': PASSWORD},
+        False,
+    ),
+    'list': Operation('GET', '/api/v1/notes', 'limit=100', None, True),
+    'create': Operation(
+        'POST', '/api/v1/notes', '',
+        lambda rng, username: {'name': f'Note {rng.random()}',
+                               'text': 'Lorem ipsum dolor sit amet.'},
+        True,
+    ),
+    'search': Operation('GET', '/api/v1/notes/search', 'q=lorem&limit=20',
+                        None, True),
+}
+
+
+class WSGITransport:
+    """Call the WSGI app in-process."""
+
+    def __init__(self, app: Callable) -> None:
+        self.app = app
+
+    def request(self, method: str, path: str, query_string: str,
+                headers: Dict[str, str], body: bytes) -> int:
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': query_string,
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '8000',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'wsgi.url_scheme': 'http',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': BytesIO(body),
+        }
+        for name, value in headers.items():
+            key = name.upper().replace('-', '_')
+            if key != 'CONTENT_TYPE':
+                key = f'HTTP_{key}'
+            environ[key] = value
+        statuses = list()
+
+        def start_response(status: str, headers: list,
+                           exc_info=None) -> None:
+            statuses.append(int(status.split()[0]))
+
+        chunks = self.app(environ, start_response)
+        try:
+            for chunk in chunks:
+                pass
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+        return statuses[-1]
+
+
+class HTTPTransport:
+    """Call a server on a local port, one connection by request."""
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+
+    def request(self, method: str, path: str, query_string: str,
+                headers: Dict[str, str], body: bytes) -> int:
+        url = f'{path}?{query_string}' if query_string else path
+        connection = HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            connection.request(method, url, body=body or None,
+                               headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        finally:
+            connection.close()
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    """Parse the operations mix, e.g. "list=8,create=1,login=1".
+
+    Args:
+        mix (str): Operation weights.
+
+    Raises:
+        ValueError: If an operation doesn't exist.
+
+    Returns:
+        Dict[str, int]: Weights by operation.
+    """
+    weights = dict()
+    for item in mix.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f'Unknown operation "{name}", choose from: '
+                             f'{", ".join(OPERATIONS)}.')
+        weights[name] = int(weight or 1)
+    return weights
+
+
+class ClientResult:
+    """Latencies and statuses of the requests of a client."""
+
+    def __init__(self) -> None:
+        # operation -> latencies in seconds
+        self.latencies: Dict[str, List[float]] = dict()
+        # operation -> status -> count
+        self.statuses: Dict[str, Dict[int, int]] = dict()
+
+    def add(self, operation: str, status: int, latency: float) -> None:
+        self.latencies.setdefault(operation, []).append(latency)
+        statuses = self.statuses.setdefault(operation, {})
+        statuses[status] = statuses.get(status, 0) + 1
+
+
+def run_client(transport, weights: Dict[str, int],
+               users: List[Tuple[str, str]], deadline: float,
+               max_requests: int, seed: int, result: ClientResult) -> None:
+    """Send requests until the deadline or "max_requests".
+
+    Args:
+        transport (WSGITransport, HTTPTransport): Transport.
+        weights (Dict[str, int]): Weights by operation.
+        users (List[Tuple[str, str]]): Usernames and tokens.
+        deadline (float): Monotonic time to stop.
+        max_requests (int): Requests of this client, 0 is unlimited.
+        seed (int): Random generator seed.
+        result (ClientResult): Client result, filled.
+    """
+    from utils.json_codec import dumps as json_dumps
+
+    rng = Random(seed)
+    names, cumulative_weights = list(weights), list()
+    for weight in weights.values():
+        cumulative_weights.append(
+            weight + (cumulative_weights[-1] if cumulative_weights else 0))
+    sent = 0
+    while monotonic() < deadline and (not max_requests
+                                      or sent < max_requests):
+        name, = rng.choices(names, cum_weights=cumulative_weights)
+        operation = OPERATIONS[name]
+        username, token = rng.choice(users)
+        headers = dict()
+        body = b''
+        if operation.authenticated:
+            headers['Authorization'] = f'Bearer {token}'
+        if operation.body:
+            body = json_dumps(operation.body(rng, username))
+            headers['Content-Type'] = 'application/json'
+        start = perf_counter()
+        try:
+            status = transport.request(operation.method, operation.path,
+                                       operation.query_string, headers, body)
+        except OSError as error:
+            status = 0
+        result.add(name, status, perf_counter() - start)
+        sent += 1
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile.
+
+    Args:
+        sorted_values (List[float]): Sorted values, not empty.
+        fraction (float): e.g. 0.95.
+
+    Returns:
+        float: Percentile value.
+    """
+    index = max(ceil(len(sorted_values) * fraction) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def summarize(results: List[ClientResult], elapsed: float) -> dict:
+    """Merge the client results.
+
+    Args:
+        results (List[ClientResult]): Client results.
+        elapsed (float): Test duration in seconds.
+
+    Returns:
+        dict: Throughput and latency percentiles by operation, in seconds.
+    """
+    summary = dict()
+    total = 0
+    operations = sorted({name for result in results
+                         for name in result.latencies})
+    for name in operations:
+        latencies = sorted(latency for result in results
+                           for latency in result.latencies.get(name, []))
+        statuses = dict()
+        for result in results:
+            for status, count in result.statuses.get(name, {}).items():
+                statuses[status] = statuses.get(status, 0) + count
+        errors = sum(count for status, count in statuses.items()
+                     if not 200 <= status < 400)
+        total += len(latencies)
+        operation = OPERATIONS[name]
+        summary[name] = {
+            'route': f'{operation.method} {operation.path}',
+            'requests': len(latencies),
+            'errors': errors,
+            'statuses': {str(status): count
+                         for status, count in sorted(statuses.items())},
+            'throughput': len(latencies) / elapsed,
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'max': latencies[-1],
+        }
+    return {'elapsed': elapsed, 'requests': total,
+            'throughput': total / elapsed, 'operations': summary}
+
+
+def get_free_port(host: str) -> int:
+    with socket() as probe:
+        probe.bind((host, 0))
+        return probe.getsockname()[1]
+
+
+def start_server(app: Callable, host: str, port: int, mode: str,
+                 workers: int, threads: int) -> int:
+    """Start the multi-worker server in a child process.
+
+    Returns:
+        int: Master process ID.
+    """
+    from api.models import close_background_tasks
+    from database import close_all_db, close_db
+    from utils.servers import Master
+
+    # the workers must open their own connections
+    close_background_tasks()
+    close_db()
+    close_all_db()
+    pid = os.fork()
+    if pid:
+        return pid
+    exit_code = 0
+    try:
+        Master(app, host=host, port=port, mode=mode, workers=workers,
+               threads=threads).run()
+    except BaseException:
+        exit_code = 1
+    finally:
+        os._exit(exit_code)
+
+
+def wait_for_port(host: str, port: int, timeout: float = 10) -> None:
+    deadline = monotonic() + timeout
+    while True:
+        try:
+            create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            if monotonic() > deadline:
+                raise
+            sleep(0.05)
+
+
+def run(args) -> dict:
+    """Create the data, start the target and run the clients.
+
+    Returns:
+        dict: Settings and summary.
+    """
+    weights = parse_mix(args.mix)
+    with temporary_workdir():
+        from api.models import User
+        from server import app
+        from utils.jwt_auth import generate_jwtoken
+
+        user_list = generate_data(args.users, args.notes, password=PASSWORD)
+        users = [(username, generate_jwtoken(User(username=username)))
+                 for user_id, username in user_list]
+
+        server_pid = None
+        if args.target == 'http':
+            port = args.port or get_free_port(args.host)
+            server_pid = start_server(app, args.host, port, args.mode,
+                                      args.workers, args.threads)
+            wait_for_port(args.host, port)
+            transport = HTTPTransport(args.host, port)
+        else:
+            transport = WSGITransport(app)
+
+        try:
+            results = [ClientResult() for _ in range(args.concurrency)]
+            max_requests = (-(-args.requests // args.concurrency)
+                            if args.requests else 0)
+            start = monotonic()
+            deadline = start + args.duration
+            clients = [
+                Thread(target=run_client,
+                       args=(transport, weights, users, deadline,
+                             max_requests, args.seed + index, result))
+                for index, result in enumerate(results)
+            ]
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+            elapsed = monotonic() - start
+        finally:
+            if server_pid:
+                os.kill(server_pid, signal.SIGTERM)
+                os.waitpid(server_pid, 0)
+
+    settings = {name: getattr(args, name)
+                for name in ('target', 'mix', 'concurrency', 'duration',
+                             'requests', 'users', 'notes', 'mode',
+                             'workers', 'threads', 'seed')}
+    return {'settings': settings, **summarize(results, elapsed)}
+
+
+def print_summary(report: dict) -> None:
+    print(f'{"operation":<8} {"route":<28} {"requests":>9} {"errors":>7} '
+          f'{"req/s":>9} {"p50 (ms)":>9} {"p95 (ms)":>9} {"p99 (ms)":>9} '
+          f'{"max (ms)":>9}')
+    for name, summary in report['operations'].items():
+        print(f'{name:<8} {summary["route"]:<28} {summary["requests"]:>9} '
+              f'{summary["errors"]:>7} {summary["throughput"]:>9.1f} '
+              f'{summary["p50"] * 1e3:>9.2f} {summary["p95"] * 1e3:>9.2f} '
+              f'{summary["p99"] * 1e3:>9.2f} {summary["max"] * 1e3:>9.2f}')
+    print(f'Total: {report["requests"]} requests in '
+          f'{report["elapsed"]:.1f} s, {report["throughput"]:.1f} req/s')
+
+
+def main() -> int:
+    parser = ArgumentParser(
+        description='Offline load test of the whole stack.')
+    parser.add_argument('--target', default='wsgi', choices=('wsgi', 'http'),
+                        help='Call the WSGI app in-process or start the '
+                             'multi-worker server on a local port.')
+    parser.add_argument('--mix', default='list=8,create=1,login=1',
+                        help='Operation weights, operations: '
+                             f'{", ".join(OPERATIONS)}.')
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help='Concurrent clients.')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='Max seconds.')
+    parser.add_argument('--requests', type=int, default=0,
+                        help='Max requests, 0 is unlimited.')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--notes', type=int, default=100,
+                        help='Notes by user.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0,
+                        help='Server port, a free one by default.')
+    # gevent needs the monkey patching before importing the app
+    parser.add_argument('--mode', default='threaded',
+                        choices=('prefork', 'threaded'),
+                        help='Server mode of the "http" target.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None,
+                        help='Write the results as JSON.')
+    args = parser.parse_args()
+
+    report = run(args)
+    print_summary(report)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json_dump(report, file, indent=2)
+    errors = sum(summary['errors']
+                 for summary in report['operations'].values())
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    exit(main())
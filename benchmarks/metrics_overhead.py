@@ -0,0 +1,77 @@
+# Run with "python -m benchmarks.metrics_overhead"
+
+from argparse import ArgumentParser
+
+from benchmarks.fixtures import (generate_data, make_wsgi_call,
+                                 temporary_workdir)
+from benchmarks.json_backends import best_time
+
+
+def run(notes: int, repeat: int) -> dict:
+    from api import app as api_app
+    from api.models import User
+    from server import app
+    from utils.jwt_auth import generate_jwtoken
+    from utils.metrics import (MetricsPlugin, metrics_registry, phase_timer,
+                               start_request_timings, stop_request_timings)
+
+    (user_id, username), = generate_data(1, notes)
+    user = User(id=user_id, username=username)
+    headers = {'Authorization': f'Bearer {generate_jwtoken(user)}'}
+    call = make_wsgi_call(app, 'GET', '/api/v1/notes', 'limit=100', headers)
+
+    # alternated, so both get the same machine noise
+    without_metrics = with_metrics = float('inf')
+    for _ in range(repeat):
+        api_app.uninstall('metrics')
+        without_metrics = min(without_metrics, best_time(call, 3))
+        api_app.install(MetricsPlugin(metrics_registry))
+        with_metrics = min(with_metrics, best_time(call, 3))
+
+    def timed_phase() -> None:
+        with phase_timer('db'):
+            pass
+
+    def observe() -> None:
+        start_request_timings()
+        stop_request_timings()
+        metrics_registry.observe_request('GET', '/notes', 200, 0.001,
+                                         {'auth': 0.0001, 'db': 0.0002})
+
+    start_request_timings()
+    phase_time = best_time(timed_phase, repeat)
+    stop_request_timings()
+    return {
+        'without_metrics': without_metrics,
+        'with_metrics': with_metrics,
+        'phase_timer': phase_time,
+        'observe_request': best_time(observe, repeat),
+    }
+
+
+def main() -> None:
+    parser = ArgumentParser(
+        description='Measure the overhead of the request metrics '
+                    'on the note list endpoint.')
+    parser.add_argument('--notes', type=int, default=1000,
+                        help='Notes of the benchmark user.')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    with temporary_workdir():
+        result = run(args.notes, args.repeat)
+
+    overhead = result['with_metrics'] - result['without_metrics']
+    print(f'{"GET /notes without metrics (µs)":<36} '
+          f'{result["without_metrics"] * 1e6:>9.1f}')
+    print(f'{"GET /notes with metrics (µs)":<36} '
+          f'{result["with_metrics"] * 1e6:>9.1f}')
+    print(f'{"overhead (µs)":<36} {overhead * 1e6:>9.1f} '
+          f'({overhead / result["without_metrics"]:.1%})')
+    print(f'{"phase_timer (µs)":<36} {result["phase_timer"] * 1e6:>9.2f}')
+    print(f'{"observe_request (µs)":<36} '
+          f'{result["observe_request"] * 1e6:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,8 +3,9 @@
 # If it's static html it's better to use Nginx,
 # instead of this app
 
-from bottle import Bottle, static_file
+from bottle import Bottle
 
+from utils.assets import AssetPipeline
 from utils.settings import load_module_as_dict
 
 
@@ -13,10 +14,22 @@ settings = load_module_as_dict('settings')
 app = Bottle()
 app.config.update(settings)
 
+# read, fingerprinted and compressed once, by the master before forking
+assets = AssetPipeline(app.config.get('ASSETS')).load()
+
 
 @app.route('/', method=('GET', ), name='root')
 def root():
-    return static_file('index.html', root='templates')
+    return assets.serve_page('index.html')
+
+
+# "/static/js/main.<hash>.js" is cached by the browsers for good,
+# "/static/js/main.js" is revalidated
+@app.route(f'{app.config.get("ASSETS").get("URL")}<filename:path>',
+           method=('GET', ),
+           name='static')
+def serve_static_files(filename):
+    return assets.serve_file(filename)
 
 
 # Only development
@@ -24,12 +37,7 @@ if app.config.get('DEBUG'):
     import bottle
     bottle.debug(mode=app.config.get('DEBUG'))
 
-    @app.route('/static/<filename:path>',
-               method=('GET', ),
-               name='static')
-    def serve_static_files(filename):
-        return static_file(filename, root='staticfiles')
-
-    app.run(host=app.config.get('HOST'),
-            port=5000,
-            reloader=app.config.get('DEBUG'))
+    if __name__ == '__main__':
+        app.run(host=app.config.get('HOST'),
+                port=5000,
+                reloader=app.config.get('DEBUG'))
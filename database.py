@@ -1,11 +1,92 @@
+from typing import Dict, List, Optional
+
 from peewee import SqliteDatabase
+from playhouse.pool import PooledDatabase, PooledSqliteDatabase
 
+from utils.metrics import TimedDatabaseMixin
 from utils.settings import load_module_as_dict
+from utils.sharding import ShardRouter
 
 
 settings = load_module_as_dict('settings')
 
-db_instance = SqliteDatabase(settings.get('DATABASE').get('NAME'))
+
+class TimedSqliteDatabase(TimedDatabaseMixin, SqliteDatabase):
+    pass
+
+
+class TimedPooledSqliteDatabase(TimedDatabaseMixin, PooledSqliteDatabase):
+    pass
+
+
+def create_database(database_settings: dict) -> SqliteDatabase:
+    """Create the SQLite database, pooled or not.
+    The pragmas are set only when a connection is opened,
+    the queries are timed for the request metrics.
+
+    Args:
+        database_settings (dict): DATABASE settings.
+
+    Returns:
+        SqliteDatabase: Database instance.
+    """
+    name = database_settings.get('NAME')
+    pragmas = database_settings.get('PRAGMAS', {})
+    if not database_settings.get('POOL'):
+        return TimedSqliteDatabase(name, pragmas=pragmas)
+
+    # pooled connections are shared by threads, one at a time
+    return TimedPooledSqliteDatabase(
+        name,
+        max_connections=database_settings.get('MAX_CONNECTIONS'),
+        stale_timeout=database_settings.get('STALE_TIMEOUT'),
+        timeout=database_settings.get('WAIT_TIMEOUT'),
+        pragmas=pragmas,
+        check_same_thread=False,
+    )
+
+
+db_instance = create_database(settings.get('DATABASE'))
+
+_shard_databases: Dict[int, SqliteDatabase] = dict()
+
+
+def get_shard_databases(shards: Optional[int] = None
+                        ) -> List[SqliteDatabase]:
+    """Get the note shards databases, created once by file.
+
+    Args:
+        shards (int, None): Number of shards. Defaults to None (settings).
+
+    Returns:
+        List[SqliteDatabase]: Shard databases, only db_instance
+                              with a single shard.
+    """
+    database_settings = settings.get('DATABASE')
+    shards = shards or database_settings.get('SHARDS')
+    if shards == 1:
+        return [db_instance]
+    for index in range(shards):
+        if index not in _shard_databases:
+            name = database_settings.get('SHARD_NAME').format(index=index)
+            _shard_databases[index] = create_database(
+                dict(database_settings, NAME=name))
+    return [_shard_databases[index] for index in range(shards)]
+
+
+note_shards = ShardRouter(get_shard_databases())
+
+
+def get_databases() -> List[SqliteDatabase]:
+    """Get the directory and the shards databases.
+
+    Returns:
+        List[SqliteDatabase]: db_instance first, then the shards.
+    """
+    databases = [db_instance]
+    databases += [database for database in note_shards.databases
+                  if database is not db_instance]
+    return databases
 
 
 def connect_db() -> None:
@@ -16,8 +97,34 @@ def connect_db() -> None:
 
 
 def close_db() -> None:
-    """Close the database connection,
+    """Close the database connections, shards included,
     after each request.
+    With the pool, the connection is given back to it.
+    """
+    for database in get_databases():
+        if not database.is_closed():
+            database.close()
+
+
+def close_all_db() -> None:
+    """Close every connection of the pools, e.g. before forking,
+    so the workers don't share them.
+    """
+    for database in get_databases():
+        if hasattr(database, 'close_all'):
+            database.close_all()
+
+
+def pool_stats() -> dict:
+    """Connection pool usage.
+
+    Returns:
+        dict: Max connections, connections in use and idle connections.
     """
-    if not db_instance.is_closed():
-        db_instance.close()
+    if not isinstance(db_instance, PooledDatabase):
+        return {}
+    return {
+        'max_connections': db_instance._max_connections,
+        'in_use': len(db_instance._in_use),
+        'idle': len(db_instance._connections),
+    }
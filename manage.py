@@ -0,0 +1,380 @@
+# Run with "python manage.py <command>"
+
+from argparse import ArgumentParser, Namespace
+from sys import exit
+
+
+def migrate(args: Namespace) -> int:
+    """Apply the pending migrations."""
+    from database import get_databases
+    from migrations import migrate
+
+    databases = get_databases()
+    applied_count = 0
+    for database in databases:
+        applied_migrations = migrate(database, target=args.target)
+        for migration in applied_migrations:
+            print(f'Applied {migration.version:04d}_{migration.name}'
+                  f' to {database.database}')
+        applied_count += len(applied_migrations)
+    if not applied_count:
+        print('No migrations to apply.')
+    return 0
+
+
+def show_migrations(args: Namespace) -> int:
+    """List the migrations and if they are applied."""
+    from database import get_databases
+    from migrations import get_applied_versions, get_migrations
+
+    for database in get_databases():
+        print(f'{database.database}:')
+        applied_versions = get_applied_versions(database)
+        for migration in get_migrations():
+            mark = 'X' if migration.version in applied_versions else ' '
+            print(f'    [{mark}] {migration.version:04d}_{migration.name}')
+    return 0
+
+
+def check_query_plans(args: Namespace) -> int:
+    """Check that the hot queries use the indexes."""
+    from migrations import get_pending_migrations
+    from migrations.query_plans import check_query_plans
+
+    if get_pending_migrations():
+        print('Apply the pending migrations first: "manage.py migrate".')
+        return 1
+    errors = check_query_plans()
+    for name, details in errors.items():
+        print(f'{name}:')
+        for detail in details:
+            print(f'    {detail}')
+    if errors:
+        return 1
+    print('All query plans use the indexes.')
+    return 0
+
+
+def check_serializers(args: Namespace) -> int:
+    """Check that the fast note dumper matches NoteSerializer."""
+    from datetime import datetime
+
+    from api.endpoints import NoteResource
+    from api.models import Note
+    from api.serializers import NoteSerializer
+    from database import note_shards
+    from utils.serializers import check_dumper_parity
+
+    sample_notes = [
+        Note(id=1, name='note', text='text',
+             creation_date=datetime(2021, 5, 24)),
+        Note(id=2, name='ñandú "note"', text='line\nline\t\u2028',
+             creation_date=datetime(2021, 5, 24, 12, 30, 15, 123)),
+    ]
+    # a sample of the first shard
+    note_query = Note.select().order_by(Note.id).limit(args.limit)
+    note_query = note_query.bind(note_shards.databases[0])
+
+    mismatches = list()
+    # all the fields, and a projection of "?fields="
+    for field_names in (None, ('id', 'name')):
+        serializer = NoteSerializer(only=field_names)
+        dumper = NoteResource.get_dumper(NoteResource, field_names)
+        mismatches += check_dumper_parity(serializer, dumper, sample_notes)
+        row_query = note_query.select(*dumper.columns).tuples()
+        mismatches += check_dumper_parity(serializer, dumper, note_query,
+                                          rows=row_query)
+    for expected, result in mismatches:
+        print(f'NoteSerializer: {expected}')
+        print(f'Dumper:         {result}')
+    if mismatches:
+        return 1
+    print('The note dumper matches NoteSerializer.')
+    return 0
+
+
+def rebuild_search(args: Namespace) -> int:
+    """Index again all the available notes for the full-text search."""
+    from api.models import NoteSearch
+    from migrations import get_pending_migrations
+
+    if get_pending_migrations():
+        print('Apply the pending migrations first: "manage.py migrate".')
+        return 1
+    count = NoteSearch.rebuild_index()
+    print(f'Indexed {count} notes.')
+    return 0
+
+
+def cache_stats(args: Namespace) -> int:
+    """Show the response cache usage, shared by the workers
+    with the "sqlite" backend.
+    """
+    from utils.response_cache import response_cache
+
+    if args.clear:
+        response_cache.clear()
+    for name, value in response_cache.stats().items():
+        print(f'{name}: {value}')
+    return 0
+
+
+def compact(args: Namespace) -> int:
+    """Archive the old soft-deleted rows and release the free pages."""
+    import signal
+    from datetime import timedelta
+    from threading import Event
+
+    from api.models import compactor
+    from migrations import get_pending_migrations
+    from settings import COMPACTION
+
+    if get_pending_migrations():
+        print('Apply the pending migrations first: "manage.py migrate".')
+        return 1
+    if args.full_vacuum:
+        print('Rebuilding the database with incremental auto_vacuum...')
+        compactor.full_vacuum()
+
+    def print_report(report) -> None:
+        for table, count in report.moved_rows.items():
+            print(f'Archived {count} rows of {table}.')
+        print(f'Reclaimed {report.reclaimed_pages} pages '
+              f'({report.reclaimed_bytes / 1024:.1f} KiB), '
+              f'{report.free_pages} free pages left, '
+              f'in {report.seconds:.2f} s.')
+
+    retention = None
+    if args.retention_days is not None:
+        retention = timedelta(days=args.retention_days)
+    if not args.periodic:
+        print_report(compactor.compact(retention=retention))
+        return 0
+
+    stop = Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda signum, frame: stop.set())
+    compactor.run_periodically(COMPACTION.get('INTERVAL'), stop,
+                               print_report, retention=retention)
+    return 0
+
+
+def rebalance_shards(args: Namespace) -> int:
+    """Move the notes of each user to its shard, after changing
+    the number of shards. Stop the API first."""
+    from api.models import Note, NoteVersion
+    from database import get_shard_databases, note_shards
+    from migrations import get_pending_migrations, migrate
+    from utils.sharding import rebalance_shards
+
+    if get_pending_migrations():
+        print('Apply the pending migrations first: "manage.py migrate".')
+        return 1
+    old_databases = get_shard_databases(args.previous)
+    # the previous shards have the schema, unless they are new
+    for database in old_databases:
+        migrate(database)
+
+    note_table = Note._meta.table_name
+    tables = {
+        note_table: Note.user.column_name,
+        f'{note_table}_archive': Note.user.column_name,
+        NoteVersion._meta.table_name: NoteVersion.user_id.column_name,
+    }
+    moved_rows = rebalance_shards(old_databases, note_shards.databases,
+                                  tables)
+    print(f'Moved {moved_rows.pop("users")} users from {args.previous} '
+          f'to {len(note_shards.databases)} shards.')
+    for table, count in moved_rows.items():
+        print(f'Moved {count} rows of {table}.')
+    return 0
+
+
+def profile_startup(args: Namespace) -> int:
+    """Show the slowest imports of an app module."""
+    from utils.startup import get_module_time, get_startup_time
+
+    import_times = get_startup_time(args.module, repeat=args.repeat)
+    key = 'self_time' if args.sort == 'self' else 'cumulative_time'
+    slowest = sorted(import_times, key=lambda import_time:
+                     getattr(import_time, key), reverse=True)
+    print(f'{"module":<48} {"self (ms)":>10} {"cumulative (ms)":>16}')
+    for import_time in slowest[:args.top]:
+        module = '  ' * import_time.depth + import_time.module
+        print(f'{module:<48} {import_time.self_time * 1e3:>10.1f} '
+              f'{import_time.cumulative_time * 1e3:>16.1f}')
+    total = get_module_time(import_times, args.module)
+    print(f'Importing {args.module} takes {total * 1e3:.1f} ms.')
+    return 0
+
+
+def check_startup(args: Namespace) -> int:
+    """Check that the app modules import within the startup budgets."""
+    from settings import STARTUP
+    from utils.startup import get_module_time, get_startup_time
+
+    over_budget = False
+    for module, budget in STARTUP.get('IMPORT_BUDGETS').items():
+        import_times = get_startup_time(module, repeat=args.repeat)
+        total = get_module_time(import_times, module)
+        status = 'OK'
+        if total > budget:
+            over_budget = True
+            status = 'OVER BUDGET'
+        print(f'{module}: {total * 1e3:.1f} ms, '
+              f'budget {budget * 1e3:.0f} ms, {status}')
+    if over_budget:
+        print('Find the slow imports with "manage.py profile_startup".')
+        return 1
+    return 0
+
+
+def runserver(args: Namespace) -> int:
+    """Run the API with the production multi-worker server."""
+    from api.models import close_background_tasks
+    from database import close_all_db, close_db
+    from migrations import PendingMigrationsError, schema_guard
+    from server import app
+    from utils.response_cache import response_cache
+    from utils.servers import Master
+
+    # checked once, the workers inherit it
+    try:
+        schema_guard()
+    except PendingMigrationsError as error:
+        print(error)
+        return 1
+
+    def before_fork() -> None:
+        close_background_tasks()
+        close_db()
+        close_all_db()
+        response_cache.close()
+
+    master = Master(
+        app,
+        host=args.host,
+        port=args.port,
+        mode=args.mode,
+        workers=args.workers,
+        threads=args.threads,
+        max_requests=args.max_requests,
+        backlog=app.config.get('SERVER').get('BACKLOG'),
+        graceful_timeout=app.config.get('SERVER').get('GRACEFUL_TIMEOUT'),
+        before_fork=before_fork,
+        access_log=app.config.get('DEBUG'),
+    )
+    master.run()
+    return 0
+
+
+def get_parser() -> ArgumentParser:
+    from settings import HOST, SERVER
+
+    parser = ArgumentParser(description='Project management commands.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parser_migrate = subparsers.add_parser('migrate', help=migrate.__doc__)
+    parser_migrate.add_argument('--target', type=int, default=None,
+                                help='Last migration version to apply.')
+    parser_migrate.set_defaults(func=migrate)
+
+    parser_show = subparsers.add_parser('showmigrations',
+                                        help=show_migrations.__doc__)
+    parser_show.set_defaults(func=show_migrations)
+
+    parser_plans = subparsers.add_parser('check_query_plans',
+                                         help=check_query_plans.__doc__)
+    parser_plans.set_defaults(func=check_query_plans)
+
+    parser_serializers = subparsers.add_parser('check_serializers',
+                                               help=check_serializers.__doc__)
+    parser_serializers.add_argument('--limit', type=int, default=1000,
+                                    help='Max number of notes to check.')
+    parser_serializers.set_defaults(func=check_serializers)
+
+    parser_search = subparsers.add_parser('rebuild_search',
+                                          help=rebuild_search.__doc__)
+    parser_search.set_defaults(func=rebuild_search)
+
+    parser_cache = subparsers.add_parser('cache_stats',
+                                         help=cache_stats.__doc__)
+    parser_cache.add_argument('--clear', action='store_true',
+                              help='Remove the cached responses first.')
+    parser_cache.set_defaults(func=cache_stats)
+
+    parser_compact = subparsers.add_parser('compact', help=compact.__doc__)
+    parser_compact.add_argument('--retention-days', type=float,
+                                default=None,
+                                help='Age of the deleted rows to archive.')
+    parser_compact.add_argument('--periodic', action='store_true',
+                                help='Run every COMPACTION interval until '
+                                     'stopped.')
+    parser_compact.add_argument('--full-vacuum', action='store_true',
+                                help='Enable the incremental vacuum first, '
+                                     'once by database, it locks it.')
+    parser_compact.set_defaults(func=compact)
+
+    parser_rebalance = subparsers.add_parser('rebalance_shards',
+                                             help=rebalance_shards.__doc__)
+    parser_rebalance.add_argument('--from', dest='previous', type=int,
+                                  required=True,
+                                  help='Previous number of shards, the new '
+                                       'one is DATABASE_SHARDS.')
+    parser_rebalance.set_defaults(func=rebalance_shards)
+
+    parser_profile = subparsers.add_parser('profile_startup',
+                                           help=profile_startup.__doc__)
+    parser_profile.add_argument('--module', default='server',
+                                help='Imported module.')
+    parser_profile.add_argument('--sort', default='cumulative',
+                                choices=('cumulative', 'self'))
+    parser_profile.add_argument('--top', type=int, default=30,
+                                help='Number of modules to show.')
+    parser_profile.add_argument('--repeat', type=int, default=3,
+                                help='Runs, the fastest is shown.')
+    parser_profile.set_defaults(func=profile_startup)
+
+    parser_startup = subparsers.add_parser('check_startup',
+                                           help=check_startup.__doc__)
+    parser_startup.add_argument('--repeat', type=int, default=3,
+                                help='Runs, the fastest is checked.')
+    parser_startup.set_defaults(func=check_startup)
+
+    parser_runserver = subparsers.add_parser('runserver',
+                                             help=runserver.__doc__)
+    parser_runserver.add_argument('--host', default=HOST)
+    parser_runserver.add_argument('--port', type=int,
+                                  default=SERVER.get('PORT'))
+    parser_runserver.add_argument('--mode', default=SERVER.get('MODE'),
+                                  choices=('prefork', 'threaded', 'gevent'))
+    parser_runserver.add_argument('--workers', type=int,
+                                  default=SERVER.get('WORKERS'))
+    parser_runserver.add_argument('--threads', type=int,
+                                  default=SERVER.get('THREADS'),
+                                  help='Threads or greenlets by worker.')
+    parser_runserver.add_argument('--max-requests', type=int,
+                                  default=SERVER.get('MAX_REQUESTS'),
+                                  help='Requests before replacing a worker.')
+    parser_runserver.set_defaults(func=runserver)
+    return parser
+
+
+def main() -> int:
+    args = get_parser().parse_args()
+
+    # before importing the app, so the thread-locals are greenlet-locals
+    if args.func is runserver and args.mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+
+    from database import close_db
+
+    try:
+        return args.func(args)
+    finally:
+        close_db()
+
+
+if __name__ == '__main__':
+    exit(main())
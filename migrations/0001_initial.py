@@ -0,0 +1,33 @@
+from peewee import Database
+from playhouse.migrate import SqliteMigrator
+
+
+def forward(database: Database, migrator: SqliteMigrator) -> None:
+    """Create the User and Note tables.
+    Databases created before the migrations already have them.
+    """
+    database.execute_sql(
+        'CREATE TABLE IF NOT EXISTS "user" ('
+        '"id" INTEGER NOT NULL PRIMARY KEY, '
+        '"available" INTEGER NOT NULL, '
+        '"creation_date" DATETIME NOT NULL, '
+        '"username" VARCHAR(45) NOT NULL, '
+        '"password" VARCHAR(128) NOT NULL)'
+    )
+    database.execute_sql(
+        'CREATE UNIQUE INDEX IF NOT EXISTS "user_username" '
+        'ON "user" ("username")'
+    )
+    database.execute_sql(
+        'CREATE TABLE IF NOT EXISTS "note" ('
+        '"id" INTEGER NOT NULL PRIMARY KEY, '
+        '"available" INTEGER NOT NULL, '
+        '"creation_date" DATETIME NOT NULL, '
+        '"name" VARCHAR(60) NOT NULL, '
+        '"text" TEXT NOT NULL, '
+        '"user_id" INTEGER NOT NULL, '
+        'FOREIGN KEY ("user_id") REFERENCES "user" ("id"))'
+    )
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "note_user_id" ON "note" ("user_id")'
+    )
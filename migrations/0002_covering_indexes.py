@@ -0,0 +1,17 @@
+from peewee import Database
+from playhouse.migrate import SqliteMigrator
+
+
+def forward(database: Database, migrator: SqliteMigrator) -> None:
+    """Add the indexes of the hot queries:
+    the user's note list, sorted by (creation_date, id),
+    and the available user by username.
+    """
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "note_user_id_available_creation_date_id" '
+        'ON "note" ("user_id", "available", "creation_date", "id")'
+    )
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "user_username_available" '
+        'ON "user" ("username", "available")'
+    )
@@ -0,0 +1,13 @@
+from peewee import Database
+from playhouse.migrate import SqliteMigrator
+
+
+def forward(database: Database, migrator: SqliteMigrator) -> None:
+    """Create the NoteVersion table, the version of each user's note list.
+    A user without row has the version 0.
+    """
+    database.execute_sql(
+        'CREATE TABLE IF NOT EXISTS "note_version" ('
+        '"user_id" INTEGER NOT NULL PRIMARY KEY, '
+        '"version" INTEGER NOT NULL)'
+    )
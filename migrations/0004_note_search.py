@@ -0,0 +1,47 @@
+from peewee import Database
+from playhouse.migrate import SqliteMigrator
+
+
+def forward(database: Database, migrator: SqliteMigrator) -> None:
+    """Create the full-text index of the available notes, an FTS5 table
+    over the Note table, kept in sync with triggers, and fill it.
+    """
+    database.execute_sql(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS "note_search" USING fts5('
+        '"name", "text", '
+        'content="note", content_rowid="id", '
+        'tokenize="unicode61 remove_diacritics 2")'
+    )
+    # only the available notes are indexed, an external content table
+    # must be told the old values to remove a row
+    database.execute_sql(
+        'CREATE TRIGGER IF NOT EXISTS "note_search_insert" '
+        'AFTER INSERT ON "note" WHEN new."available" BEGIN '
+        'INSERT INTO "note_search" ("rowid", "name", "text") '
+        'VALUES (new."id", new."name", new."text"); '
+        'END'
+    )
+    database.execute_sql(
+        'CREATE TRIGGER IF NOT EXISTS "note_search_delete" '
+        'AFTER DELETE ON "note" WHEN old."available" BEGIN '
+        'INSERT INTO "note_search" ("note_search", "rowid", "name", "text") '
+        'VALUES (\'delete\', old."id", old."name", old."text"); '
+        'END'
+    )
+    database.execute_sql(
+        'CREATE TRIGGER IF NOT EXISTS "note_search_update" '
+        'AFTER UPDATE OF "name", "text", "available" ON "note" BEGIN '
+        'INSERT INTO "note_search" ("note_search", "rowid", "name", "text") '
+        'SELECT \'delete\', old."id", old."name", old."text" '
+        'WHERE old."available"; '
+        'INSERT INTO "note_search" ("rowid", "name", "text") '
+        'SELECT new."id", new."name", new."text" WHERE new."available"; '
+        'END'
+    )
+    database.execute_sql(
+        'INSERT INTO "note_search" ("note_search") VALUES (\'delete-all\')'
+    )
+    database.execute_sql(
+        'INSERT INTO "note_search" ("rowid", "name", "text") '
+        'SELECT "id", "name", "text" FROM "note" WHERE "available"'
+    )
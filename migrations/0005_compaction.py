@@ -0,0 +1,62 @@
+from peewee import Database
+from playhouse.migrate import SqliteMigrator
+
+
+# same format as the DateTimeField values, in local time
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')"
+
+
+def forward(database: Database, migrator: SqliteMigrator) -> None:
+    """Add the soft deletion date of the users and notes,
+    set by triggers when "available" changes,
+    and the archive tables of the compacted rows.
+    The rows already deleted are dated now.
+    """
+    for table in ('user', 'note'):
+        database.execute_sql(
+            f'ALTER TABLE "{table}" ADD COLUMN "deletion_date" DATETIME')
+        database.execute_sql(
+            f'UPDATE "{table}" SET "deletion_date" = {NOW} '
+            f'WHERE NOT "available"')
+        # the other columns are not updated, so the FTS triggers don't run
+        database.execute_sql(
+            f'CREATE TRIGGER IF NOT EXISTS "{table}_deletion_date" '
+            f'AFTER UPDATE OF "available" ON "{table}" '
+            f'WHEN old."available" IS NOT new."available" BEGIN '
+            f'UPDATE "{table}" SET "deletion_date" = CASE '
+            f'WHEN new."available" THEN NULL ELSE {NOW} END '
+            f'WHERE "id" = new."id"; '
+            f'END'
+        )
+        # only the deleted rows, the compaction candidates
+        database.execute_sql(
+            f'CREATE INDEX IF NOT EXISTS "{table}_deletion_date" '
+            f'ON "{table}" ("deletion_date") '
+            f'WHERE "deletion_date" IS NOT NULL'
+        )
+
+    database.execute_sql(
+        'CREATE TABLE IF NOT EXISTS "user_archive" ('
+        '"id" INTEGER NOT NULL PRIMARY KEY, '
+        '"available" INTEGER NOT NULL, '
+        '"creation_date" DATETIME NOT NULL, '
+        '"deletion_date" DATETIME, '
+        '"username" VARCHAR(45) NOT NULL, '
+        '"password" VARCHAR(128) NOT NULL, '
+        '"archive_date" DATETIME NOT NULL)'
+    )
+    database.execute_sql(
+        'CREATE TABLE IF NOT EXISTS "note_archive" ('
+        '"id" INTEGER NOT NULL PRIMARY KEY, '
+        '"available" INTEGER NOT NULL, '
+        '"creation_date" DATETIME NOT NULL, '
+        '"deletion_date" DATETIME, '
+        '"name" VARCHAR(60) NOT NULL, '
+        '"text" TEXT NOT NULL, '
+        '"user_id" INTEGER NOT NULL, '
+        '"archive_date" DATETIME NOT NULL)'
+    )
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "note_archive_user_id" '
+        'ON "note_archive" ("user_id")'
+    )
@@ -0,0 +1,13 @@
+from peewee import Database
+from playhouse.migrate import SqliteMigrator
+
+
+def forward(database: Database, migrator: SqliteMigrator) -> None:
+    """Create the ID sequences of the sharded tables, used only in the
+    directory database. A sequence without row starts after the max ID.
+    """
+    database.execute_sql(
+        'CREATE TABLE IF NOT EXISTS "id_sequence" ('
+        '"name" VARCHAR(60) NOT NULL PRIMARY KEY, '
+        '"next_id" INTEGER NOT NULL)'
+    )
@@ -0,0 +1,48 @@
+from peewee import Database
+from playhouse.migrate import SqliteMigrator
+
+
+# the note isn't indexed yet, "NoteSearch.index_pending" indexes it
+NOT_PENDING = ('NOT EXISTS (SELECT 1 FROM "note_search_pending" '
+               'WHERE "id" = {}."id")')
+
+
+def forward(database: Database, migrator: SqliteMigrator) -> None:
+    """Create the notes waiting for the full-text index, the batches of
+    notes are indexed at once later instead of by row on insert.
+    The FTS triggers skip them, so they are not indexed twice and their
+    changes are not removed from an index that doesn't have them.
+    """
+    database.execute_sql(
+        'CREATE TABLE IF NOT EXISTS "note_search_pending" ('
+        '"id" INTEGER NOT NULL PRIMARY KEY)'
+    )
+    for action in ('insert', 'delete', 'update'):
+        database.execute_sql(f'DROP TRIGGER IF EXISTS "note_search_{action}"')
+    database.execute_sql(
+        'CREATE TRIGGER "note_search_insert" '
+        'AFTER INSERT ON "note" '
+        f'WHEN new."available" AND {NOT_PENDING.format("new")} BEGIN '
+        'INSERT INTO "note_search" ("rowid", "name", "text") '
+        'VALUES (new."id", new."name", new."text"); '
+        'END'
+    )
+    database.execute_sql(
+        'CREATE TRIGGER "note_search_delete" '
+        'AFTER DELETE ON "note" '
+        f'WHEN old."available" AND {NOT_PENDING.format("old")} BEGIN '
+        'INSERT INTO "note_search" ("note_search", "rowid", "name", "text") '
+        'VALUES (\'delete\', old."id", old."name", old."text"); '
+        'END'
+    )
+    database.execute_sql(
+        'CREATE TRIGGER "note_search_update" '
+        'AFTER UPDATE OF "name", "text", "available" ON "note" '
+        f'WHEN {NOT_PENDING.format("old")} BEGIN '
+        'INSERT INTO "note_search" ("note_search", "rowid", "name", "text") '
+        'SELECT \'delete\', old."id", old."name", old."text" '
+        'WHERE old."available"; '
+        'INSERT INTO "note_search" ("rowid", "name", "text") '
+        'SELECT new."id", new."name", new."text" WHERE new."available"; '
+        'END'
+    )
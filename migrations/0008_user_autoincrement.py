@@ -0,0 +1,43 @@
+from peewee import Database
+from playhouse.migrate import SqliteMigrator
+
+
+def forward(database: Database, migrator: SqliteMigrator) -> None:
+    """Rebuild the User table with AUTOINCREMENT, so the IDs of the
+    archived users are never given again. The sequence starts after
+    the max ID, archived users included. The note IDs already come
+    from "id_sequence".
+    """
+    cursor = database.execute_sql(
+        'SELECT "sql" FROM "sqlite_master" WHERE "tbl_name" = ? '
+        'AND "type" IN (?, ?) AND "sql" IS NOT NULL',
+        ('user', 'index', 'trigger'))
+    # indexes and triggers, dropped with the table
+    schema = [sql for sql, in cursor.fetchall()]
+
+    database.execute_sql(
+        'CREATE TABLE "user_new" ('
+        '"id" INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, '
+        '"available" INTEGER NOT NULL, '
+        '"creation_date" DATETIME NOT NULL, '
+        '"username" VARCHAR(45) NOT NULL, '
+        '"password" VARCHAR(128) NOT NULL, '
+        '"deletion_date" DATETIME)'
+    )
+    database.execute_sql(
+        'INSERT INTO "user_new" ("id", "available", "creation_date", '
+        '"username", "password", "deletion_date") '
+        'SELECT "id", "available", "creation_date", "username", '
+        '"password", "deletion_date" FROM "user"'
+    )
+    database.execute_sql('DROP TABLE "user"')
+    database.execute_sql('ALTER TABLE "user_new" RENAME TO "user"')
+    for sql in schema:
+        database.execute_sql(sql)
+
+    database.execute_sql(
+        'DELETE FROM "sqlite_sequence" WHERE "name" = ?', ('user', ))
+    database.execute_sql(
+        'INSERT INTO "sqlite_sequence" ("name", "seq") '
+        'SELECT ?, max(coalesce((SELECT max("id") FROM "user"), 0), '
+        'coalesce((SELECT max("id") FROM "user_archive"), 0))', ('user', ))
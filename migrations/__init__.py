@@ -0,0 +1,181 @@
+"""Versioned schema migrations.
+
+Every migration is a module named "<version>_<name>.py" in this package,
+with a "forward(database, migrator)" function. The applied versions
+are stored in the "migration_history" table.
+
+Run with "python manage.py migrate".
+"""
+from datetime import datetime
+from importlib import import_module
+from pathlib import Path
+from re import compile as re_compile
+from threading import Lock
+from types import ModuleType
+from typing import List, NamedTuple, Optional
+
+from peewee import CharField, Database, DateTimeField, IntegerField, Model
+from playhouse.migrate import SqliteMigrator
+
+from database import db_instance, get_databases
+from settings import STARTUP
+
+
+MIGRATIONS_DIR = Path(__file__).parent
+
+MIGRATION_NAME_REGEX = re_compile(r'^(?P<version>\d{4})_(?P<name>\w+)\.py$')
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    module: ModuleType
+
+
+class MigrationHistory(Model):
+    version = IntegerField(primary_key=True)
+    name = CharField(100)
+    applied_date = DateTimeField(default=datetime.now)
+
+    class Meta:
+        database = db_instance
+        table_name = 'migration_history'
+
+
+def get_migrations() -> List[Migration]:
+    """Get the migrations of this package, sorted by version.
+
+    Returns:
+        List[Migration]: Migrations.
+    """
+    migrations = list()
+    for path in sorted(MIGRATIONS_DIR.glob('*.py')):
+        match = MIGRATION_NAME_REGEX.match(path.name)
+        if not match:
+            continue
+        module = import_module(f'{__name__}.{path.stem}')
+        migration = Migration(int(match.group('version')),
+                              match.group('name'), module)
+        migrations.append(migration)
+    return migrations
+
+
+def get_applied_versions(database: Database = db_instance) -> set:
+    """Get the applied migration versions.
+
+    Args:
+        database (Database): Database instance. Defaults to db_instance.
+
+    Returns:
+        set: Applied versions.
+    """
+    with MigrationHistory.bind_ctx(database):
+        MigrationHistory.create_table(safe=True)
+        query = MigrationHistory.select(MigrationHistory.version)
+        return {version for version, in query.tuples()}
+
+
+def get_pending_migrations(
+        database: Optional[Database] = None) -> List[Migration]:
+    """Get the migrations not applied yet.
+
+    Args:
+        database (Database, None): Database instance. Defaults to None
+                                   (any of the directory and the shards).
+
+    Returns:
+        List[Migration]: Pending migrations.
+    """
+    databases = [database] if database else get_databases()
+    applied_versions = [get_applied_versions(database)
+                        for database in databases]
+    return [migration for migration in get_migrations()
+            if any(migration.version not in versions
+                   for versions in applied_versions)]
+
+
+def migrate(database: Optional[Database] = None,
+            target: Optional[int] = None) -> List[Migration]:
+    """Apply the pending migrations, each one in its own transaction.
+    Every database has the whole schema, the shards only use
+    the tables of the notes.
+
+    Args:
+        database (Database, None): Database instance. Defaults to None
+                                   (the directory, then the shards).
+        target (int, None): Last version to apply. Defaults to None (all).
+
+    Returns:
+        List[Migration]: Applied migrations, of every database.
+    """
+    if database is None:
+        applied_migrations = list()
+        for database in get_databases():
+            applied_migrations += migrate(database, target=target)
+        return applied_migrations
+
+    migrator = SqliteMigrator(database)
+    applied_migrations = list()
+    for migration in get_pending_migrations(database):
+        if target is not None and migration.version > target:
+            break
+        with database.atomic(), MigrationHistory.bind_ctx(database):
+            migration.module.forward(database, migrator)
+            MigrationHistory.create(version=migration.version,
+                                    name=migration.name)
+        applied_migrations.append(migration)
+    return applied_migrations
+
+
+class PendingMigrationsError(Exception):
+    pass
+
+
+class SchemaGuard:
+    """Check the schema once by process, on first use instead of on import.
+
+    After the first check it's a flag lookup, so it can run on every
+    request. Set "checked" before forking, so the workers inherit it.
+    """
+
+    def __init__(self, database: Optional[Database] = None,
+                 auto_migrate: bool = False) -> None:
+        """
+        Args:
+            database (Database, None): Database instance. Defaults to None
+                                       (the directory and the shards).
+            auto_migrate (bool): Apply the pending migrations instead of
+                                 failing, only development.
+                                 Defaults to False.
+        """
+        self.database = database
+        self.auto_migrate = auto_migrate
+        self.checked = False
+        self._lock = Lock()
+
+    def __call__(self) -> None:
+        """Check that there are no pending migrations.
+
+        Raises:
+            PendingMigrationsError: If there are pending migrations.
+        """
+        if self.checked:
+            return
+        with self._lock:
+            if self.checked:
+                return
+            if self.auto_migrate:
+                migrate(self.database)
+            else:
+                pending_migrations = get_pending_migrations(self.database)
+                if pending_migrations:
+                    names = ', '.join(f'{migration.version:04d}_'
+                                      f'{migration.name}'
+                                      for migration in pending_migrations)
+                    raise PendingMigrationsError(
+                        f'Pending migrations: {names}, '
+                        f'run "manage.py migrate".')
+            self.checked = True
+
+
+schema_guard = SchemaGuard(auto_migrate=STARTUP.get('AUTO_MIGRATE'))
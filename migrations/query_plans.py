@@ -0,0 +1,96 @@
+"""Check that the hot queries are answered by the indexes
+added in the migrations, with "EXPLAIN QUERY PLAN".
+
+Run with "python manage.py check_query_plans".
+"""
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+from peewee import Database, ModelSelect
+
+from api.models import Note, User, compactor
+from database import db_instance, note_shards
+
+
+class QueryPlanCheck(NamedTuple):
+    name: str
+    build_query: Callable[[], ModelSelect]
+    # any of these indexes must be used
+    indexes: Tuple[str, ...]
+
+
+QUERY_PLAN_CHECKS = (
+    QueryPlanCheck(
+        'user_notes_first_page',
+        lambda: Note.get_user_notes(User(id=1), limit=101),
+        ('note_user_id_available_creation_date_id', ),
+    ),
+    QueryPlanCheck(
+        'user_notes_next_page',
+        lambda: Note.get_user_notes(User(id=1), cursor=(datetime.now(), 1),
+                                    limit=101),
+        ('note_user_id_available_creation_date_id', ),
+    ),
+    # the planner prefers the unique index when it's enough,
+    # both have the username as first column
+    QueryPlanCheck(
+        'available_user',
+        lambda: User.select_available().where(User.username == 'username'),
+        ('user_username_available', 'user_username'),
+    ),
+    QueryPlanCheck(
+        'deleted_notes_to_archive',
+        lambda: compactor.select_candidates(Note, datetime.now()),
+        ('note_deletion_date', ),
+    ),
+    QueryPlanCheck(
+        'deleted_users_to_archive',
+        lambda: compactor.select_candidates(User, datetime.now()),
+        ('user_deletion_date', ),
+    ),
+)
+
+
+def explain_query_plan(query: ModelSelect,
+                       database: Database = db_instance) -> List[str]:
+    """Get the query plan details.
+
+    Args:
+        query (ModelSelect): Query.
+        database (Database): Database instance. Defaults to db_instance.
+
+    Returns:
+        List[str]: Query plan details.
+    """
+    sql, params = query.sql()
+    cursor = database.execute_sql(f'EXPLAIN QUERY PLAN {sql}', params)
+    return [row[-1] for row in cursor.fetchall()]
+
+
+def check_query_plans(database: Database = db_instance) -> Dict[str, list]:
+    """Check the hot query plans: an index search,
+    without full scans nor sorting in a temporary B-tree.
+
+    Args:
+        database (Database): Database instance. Defaults to db_instance.
+
+    Returns:
+        Dict[str, list]: Errors by check name, empty if all passed.
+    """
+    errors = dict()
+    for check in QUERY_PLAN_CHECKS:
+        # every database has the whole schema, the shards the same plans
+        with note_shards.bind_database(note_shards.databases[0]):
+            query = check.build_query()
+            details = explain_query_plan(query, database)
+        check_errors = list()
+        uses_index = any(f'INDEX {index} ' in f'{detail} '
+                         for detail in details for index in check.indexes)
+        if not uses_index:
+            check_errors.append(f'Index not used: {" or ".join(check.indexes)}')
+        check_errors.extend(detail for detail in details
+                            if detail.startswith('SCAN')
+                            or 'TEMP B-TREE' in detail)
+        if check_errors:
+            errors[check.name] = check_errors + details
+    return errors
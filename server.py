@@ -1,9 +1,21 @@
 # Run with "python server.py"
 
+from sys import stderr
+
 from bottle import Bottle
 
 from api import app as api_app
-from database import close_db
+from api.models import (User, note_writers_stats, search_indexers_stats,
+                        user_cache)
+from database import close_db, pool_stats
+from migrations import PendingMigrationsError, schema_guard
+from utils.compression import CompressionMiddleware
+from utils.jwt_auth import token_cache
+from utils.exceptions import JSONResponseSchemaOutdated
+from utils.metrics import (MetricsPlugin, get_metrics_resource,
+                           metrics_registry)
+from utils.rate_limit import RateLimitPlugin
+from utils.response_cache import response_cache
 from utils.settings import load_module_as_dict
 
 settings = load_module_as_dict('settings')
@@ -20,11 +32,68 @@ app.mount('/api/v1/', api_app)
 app.add_hook('after_request', close_db)
 
 
-# Only development
+# Schema, created or updated only with "python manage.py migrate",
+# checked on the first API request
+def check_schema() -> None:
+    try:
+        schema_guard()
+    except PendingMigrationsError as error:
+        print(error, file=stderr, flush=True)
+        raise JSONResponseSchemaOutdated(exception=error)
+
+
+api_app.add_hook('before_request', check_schema)
+
+
+# Metrics
+if app.config.get('METRICS').get('ENABLED'):
+    api_app.install(MetricsPlugin(metrics_registry))
+    metrics_registry.add_gauges('response_cache', 'Note list pages cache.',
+                                response_cache.stats)
+    metrics_registry.add_gauges('token_cache', 'Verified tokens cache.',
+                                token_cache.stats)
+    metrics_registry.add_gauges('user_cache', 'Users identity map.',
+                                user_cache.stats)
+    metrics_registry.add_gauges('database_pool', 'DB connection pool.',
+                                pool_stats)
+    metrics_registry.add_gauges('search_indexer', 'Notes search indexer.',
+                                search_indexers_stats)
+    if app.config.get('NOTES_GROUP_COMMIT').get('ENABLED'):
+        metrics_registry.add_gauges('note_writer', 'Notes group commit.',
+                                    note_writers_stats)
+    app.route(app.config.get('METRICS').get('ROUTE'), 'GET',
+              get_metrics_resource)
+
+
+# Rate limit,
+# installed after the metrics, so the rejected requests are recorded
+if app.config.get('RATE_LIMIT').get('ENABLED'):
+    rate_limit_plugin = RateLimitPlugin(app.config.get('RATE_LIMIT'))
+    api_app.install(rate_limit_plugin)
+    metrics_registry.add_gauges('rate_limit', 'Rate limiter.',
+                                rate_limit_plugin.stats)
+
+if app.config.get('USER_CACHE').get('PRELOAD'):
+    User.preload_cache()
+    close_db()
+
+
+# Compression, of the whole app, the attributes are still the Bottle ones
+if app.config.get('COMPRESSION').get('ENABLED'):
+    compression_middleware = CompressionMiddleware(
+        app, app.config.get('COMPRESSION'))
+    metrics_registry.add_gauges('compression', 'Response compression.',
+                                compression_middleware.stats)
+    app = compression_middleware
+
+
+# Only development,
+# in production "python manage.py runserver"
 if app.config.get('DEBUG'):
     import bottle
     bottle.debug(mode=app.config.get('DEBUG'))
 
-    app.run(host=app.config.get('HOST'),
-            port=8000,
-            reloader=app.config.get('DEBUG'))
+    if __name__ == '__main__':
+        bottle.run(app, host=app.config.get('HOST'),
+                   port=app.config.get('SERVER').get('PORT'),
+                   reloader=app.config.get('DEBUG'))
@@ -1,4 +1,5 @@
 from datetime import timedelta
+from os import cpu_count
 
 from decouple import config
 
@@ -7,8 +8,62 @@ DEBUG = config('DEBUG', cast=bool, default=False)
 
 HOST = config('HOST', default='127.0.0.1')
 
+# "python manage.py runserver"
+SERVER = {
+    'PORT':             config('PORT', cast=int, default=8000),
+    # "prefork", "threaded" or "gevent"
+    'MODE':             config('SERVER_MODE', default='prefork'),
+    'WORKERS':          config('SERVER_WORKERS', cast=int,
+                               default=cpu_count() or 1),
+    # threads or greenlets by worker, not used in "prefork" mode
+    'THREADS':          config('SERVER_THREADS', cast=int, default=8),
+    # requests before replacing a worker, 0 is unlimited
+    'MAX_REQUESTS':     config('SERVER_MAX_REQUESTS', cast=int,
+                               default=10000),
+    'BACKLOG':          2048,
+    # seconds
+    'GRACEFUL_TIMEOUT': 30,
+}
+
 DATABASE = {
     'NAME': 'db.sqlite3',
+    # reuse the connections between requests
+    'POOL':             config('DATABASE_POOL', cast=bool, default=True),
+    'MAX_CONNECTIONS':  32,
+    # seconds, idle connections older than this are recycled
+    'STALE_TIMEOUT':    300,
+    # seconds waiting for a free connection, 0 waits forever
+    'WAIT_TIMEOUT':     10,
+    # set once, when the connection is opened
+    'PRAGMAS': {
+        # first, before the file is initialized, only new databases,
+        # "manage.py compact --full-vacuum" once for the existing ones
+        'auto_vacuum':  'incremental',
+        'journal_mode': 'wal',
+        'synchronous':  'normal',
+        'mmap_size':    64 * 1024 * 1024,
+        # negative value: KiB
+        'cache_size':   -16 * 1024,
+    },
+    # the notes of each user in one of N files, the users in NAME,
+    # 1 keeps the notes in NAME too,
+    # changing it needs "manage.py rebalance_shards --from <previous>"
+    'SHARDS':           config('DATABASE_SHARDS', cast=int, default=1),
+    'SHARD_NAME':       'db.shard{index}.sqlite3',
+    # note IDs reserved at once from the sequence of NAME
+    'ID_BLOCK_SIZE':    1000,
+}
+
+PASSWORD_HASHER = {
+    # bcrypt cost factor, the users are rehashed on login when it changes
+    'ROUNDS':           12,
+    # "thread" or "process"
+    'EXECUTOR':         'thread',
+    'WORKERS':          4,
+    # waiting hashes, more are shed with a 503
+    'QUEUE_SIZE':       32,
+    # seconds
+    'TIMEOUT':          30,
 }
 
 JSON_WEB_TOKEN = {
@@ -17,6 +72,158 @@ JSON_WEB_TOKEN = {
     'ALGORITHM':            'HS256',
     'USER_FIELD_CLAIM':     'username',
     'TOKEN_LIFETIME':       timedelta(days=1),
+    # verified tokens cache, 0 disables it
+    'CACHE_SIZE':           10000,
+    'CACHE_TTL':            timedelta(minutes=5),
 }
 
 SECRET_KEY = config('SECRET_KEY')
+
+USER_CACHE = {
+    # users identity map, 0 disables it
+    'MAX_SIZE':         10000,
+    # the users are read again after it, so the changes of other workers,
+    # of bulk "User.update()" queries or of the database by hand are seen,
+    # the verified tokens are cached for no longer either
+    'TTL':              timedelta(seconds=30),
+    # load the available users on startup
+    'PRELOAD':          config('USER_CACHE_PRELOAD', cast=bool,
+                               default=False),
+}
+
+PAGINATION = {
+    'DEFAULT_LIMIT':    100,
+    'MAX_LIMIT':        1000,
+}
+
+NOTES_BATCH = {
+    # max notes per request
+    'MAX_SIZE':         1000,
+    # max request body bytes, the other routes have the bottle 100 KiB
+    'MAX_BODY_SIZE':    8 * 1024 * 1024,
+}
+
+# concurrent POST /notes written in one transaction by a writer thread,
+# each request is answered after the commit
+NOTES_GROUP_COMMIT = {
+    'ENABLED':          config('NOTES_GROUP_COMMIT', cast=bool,
+                               default=False),
+    # seconds collecting notes after the first one, the added latency
+    'WINDOW':           0.002,
+    # max notes by transaction
+    'MAX_BATCH':        100,
+    # waiting notes, more are shed with a 503
+    'QUEUE_SIZE':       1000,
+    # seconds, the notes not written yet are dropped with a 503
+    'TIMEOUT':          10,
+}
+
+STREAMING = {
+    'MAX_LIMIT':        100000,
+    'CHUNK_SIZE':       64 * 1024,
+}
+
+# responses compressed as the client accepts ("Accept-Encoding"),
+# disable it if the reverse proxy already compresses
+COMPRESSION = {
+    'ENABLED':          config('COMPRESSION_ENABLED', cast=bool,
+                               default=True),
+    # bytes, smaller bodies are sent as they are
+    'MIN_SIZE':         1024,
+    # gzip and deflate, 1 (fastest) to 9 (smallest)
+    'LEVEL':            config('COMPRESSION_LEVEL', cast=int, default=6),
+    # brotli, only with the "brotli" package, 0 (fastest) to 11 (smallest)
+    'BROTLI_QUALITY':   config('COMPRESSION_BROTLI_QUALITY', cast=int,
+                               default=4),
+    # by preference, when the client accepts several with the same "q"
+    'ENCODINGS':        ('br', 'gzip', 'deflate'),
+    # content type prefixes
+    'CONTENT_TYPES':    ('application/json', 'text/'),
+}
+
+# "client.py" static files, fingerprinted and compressed at startup
+ASSETS = {
+    'ROOT':             'staticfiles',
+    'URL':              '/static/',
+    'TEMPLATES':        'templates',
+    # the fingerprinted files never change, the pages are revalidated
+    'MAX_AGE':          timedelta(days=365),
+    # bytes, smaller files aren't compressed
+    'MIN_SIZE':         256,
+    'CONTENT_TYPES':    ('text/', 'application/javascript',
+                         'application/json', 'image/svg+xml'),
+    # read the files again on each page request, only development
+    'RELOAD':           DEBUG,
+}
+
+# serialized note list pages
+RESPONSE_CACHE = {
+    # "memory" (by worker), "sqlite" (shared by the workers) or "none"
+    'BACKEND':          config('RESPONSE_CACHE_BACKEND', default='memory'),
+    'PATH':             'cache.sqlite3',
+    'MAX_BYTES':        64 * 1024 * 1024,
+    # bigger pages aren't cached
+    'MAX_ENTRY_BYTES':  1024 * 1024,
+    'TTL':              timedelta(minutes=1),
+}
+
+METRICS = {
+    # request timings, by worker process, the route is public once enabled,
+    # block it at the reverse proxy
+    'ENABLED':          config('METRICS_ENABLED', cast=bool, default=False),
+    # Prometheus endpoint, outside of the API
+    'ROUTE':            '/metrics',
+}
+
+RATE_LIMIT = {
+    'ENABLED':          config('RATE_LIMIT_ENABLED', cast=bool,
+                               default=True),
+    # the buckets are by worker process
+    'SHARDS':           16,
+    # buckets by limit, the least recently used are dropped beyond it
+    'MAX_KEYS':         100000,
+    # client IP from "X-Forwarded-For", only behind a trusted proxy
+    'FORWARDED_FOR':    config('RATE_LIMIT_FORWARDED_FOR', cast=bool,
+                               default=False),
+    # trusted proxies appending to "X-Forwarded-For", the client IP is
+    # the entry at this position from the right
+    'PROXIES':          config('RATE_LIMIT_PROXIES', cast=int, default=1),
+    # "<METHOD> <route>": {"IP" or "USERNAME": limit}
+    # RATE: requests by second, BURST: requests at once
+    'ROUTES': {
+        'POST /auth/token': {
+            'IP':       {'RATE': 1, 'BURST': 10},
+            'USERNAME': {'RATE': 0.1, 'BURST': 5},
+        },
+        'POST /users': {
+            'IP':       {'RATE': 0.2, 'BURST': 5},
+        },
+    },
+}
+
+COMPACTION = {
+    # soft-deleted rows older than this are moved to the archive tables
+    'RETENTION':        timedelta(days=30),
+    # rows per transaction, the write lock is released between batches
+    'BATCH_SIZE':       500,
+    # free pages released per incremental vacuum step
+    'VACUUM_PAGES':     1000,
+    # seconds between batches and vacuum steps, so the writers get the lock
+    'PAUSE':            0.05,
+    # "manage.py compact --periodic"
+    'INTERVAL':         timedelta(hours=1),
+}
+
+STARTUP = {
+    # apply the pending migrations on the first request, only development,
+    # else the API answers 503 until "manage.py migrate"
+    'AUTO_MIGRATE':     config('AUTO_MIGRATE', cast=bool, default=False),
+    # max import time of each app module, in seconds,
+    # "manage.py check_startup"
+    'IMPORT_BUDGETS': {
+        'server':       config('STARTUP_SERVER_BUDGET', cast=float,
+                               default=0.5),
+        'client':       config('STARTUP_CLIENT_BUDGET', cast=float,
+                               default=0.2),
+    },
+}
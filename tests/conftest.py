@@ -0,0 +1,102 @@
+"""Shared fixtures of the tests.
+
+The settings are read and the SQLite files are created relative to the
+working directory, so a temporary one is set before any app module is
+imported by the tests.
+"""
+import os
+from io import BytesIO
+from itertools import count
+from tempfile import TemporaryDirectory
+from typing import Callable, Iterator, NamedTuple, Optional
+
+import pytest
+
+
+os.environ.setdefault('SECRET_KEY', 'test')
+# all the requests come from the same IP
+os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+
+WORKDIR = TemporaryDirectory()
+os.chdir(WORKDIR.name)
+
+usernames = (f'user{index}' for index in count())
+
+
+class Response(NamedTuple):
+    status: int
+    headers: dict
+    body: bytes
+
+
+@pytest.fixture(scope='session', autouse=True)
+def database() -> Iterator[None]:
+    """Apply the migrations, the databases are removed at the end."""
+    from api.models import close_background_tasks
+    from database import close_all_db, close_db
+    from migrations import migrate
+
+    migrate()
+    yield
+    close_background_tasks()
+    close_db()
+    close_all_db()
+
+
+@pytest.fixture
+def user():
+    """New user, the password isn't hashed, it can't log in."""
+    from api.models import User
+
+    user_id = User.insert(username=next(usernames), password='!').execute()
+    return User.get_by_id(user_id)
+
+
+@pytest.fixture
+def api_call() -> Callable[..., Response]:
+    """Call the server app, or another WSGI app, in-process,
+    without a server.
+    """
+    from server import app
+    from utils.json_codec import dumps as json_dumps
+    from utils.jwt_auth import generate_jwtoken
+
+    def call(method: str, path: str, query_string: str = '',
+             data: Optional[object] = None, user=None,
+             headers: Optional[dict] = None,
+             wsgi_app: Optional[Callable] = None) -> Response:
+        body = b'' if data is None else json_dumps(data)
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': query_string,
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '8000',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': BytesIO(body),
+            'CONTENT_LENGTH': str(len(body)),
+        }
+        if data is not None:
+            environ['CONTENT_TYPE'] = 'application/json'
+        if user is not None:
+            token = generate_jwtoken(user)
+            environ['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        for name, value in (headers or {}).items():
+            environ['HTTP_' + name.upper().replace('-', '_')] = value
+
+        response = dict()
+
+        def start_response(status: str, headers: list, exc_info=None):
+            response.update(status=int(status[:3]), headers=dict(headers))
+
+        chunks = (wsgi_app or app)(environ, start_response)
+        try:
+            body = b''.join(chunks)
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+        return Response(response['status'], response['headers'], body)
+
+    return call
@@ -0,0 +1,165 @@
+import gzip
+from datetime import timedelta
+
+import pytest
+from bottle import Bottle
+
+from utils.assets import AssetPipeline
+from utils.compression import brotli
+
+
+SCRIPT = b'function main() { return "Lorem ipsum dolor sit amet."; }\n' * 20
+STYLE = b'body { margin: 0; }\n'
+PAGE = '''<html>
+<link href="/static/css/style.css" rel="stylesheet">
+<script src='/static/js/main.js'></script>
+<a href="/static/js/missing.js">
+<a href="/api/v1/notes">
+</html>
+'''
+
+
+@pytest.fixture
+def assets(tmp_path) -> AssetPipeline:
+    (tmp_path / 'static' / 'js').mkdir(parents=True)
+    (tmp_path / 'static' / 'css').mkdir()
+    (tmp_path / 'static' / 'js' / 'main.js').write_bytes(SCRIPT)
+    (tmp_path / 'static' / 'css' / 'style.css').write_bytes(STYLE)
+    (tmp_path / 'templates').mkdir()
+    (tmp_path / 'templates' / 'index.html').write_text(PAGE)
+    return AssetPipeline({
+        'ROOT': str(tmp_path / 'static'),
+        'URL': '/static/',
+        'TEMPLATES': str(tmp_path / 'templates'),
+        'MAX_AGE': timedelta(days=365),
+        'MIN_SIZE': 256,
+        'CONTENT_TYPES': ('text/', 'application/javascript'),
+        'RELOAD': False,
+    }).load()
+
+
+@pytest.fixture
+def client_app(assets) -> Bottle:
+    """Routes of the client app, with the test assets."""
+    app = Bottle()
+    app.route('/', callback=lambda: assets.serve_page('index.html'))
+    app.route('/static/<name:path>', callback=assets.serve_file)
+    return app
+
+
+def test_fingerprinted_names(assets):
+    script_name = assets.manifest['js/main.js']
+
+    assert script_name.startswith('js/main.')
+    assert script_name.endswith('.js')
+    assert assets.files[script_name] is assets.files['js/main.js']
+    assert assets.files[assets.manifest['css/style.css']].bodies == {
+        'identity': STYLE}
+
+
+def test_new_content_new_name(assets):
+    script_name = assets.manifest['js/main.js']
+    style_name = assets.manifest['css/style.css']
+
+    with open(f'{assets.root}/js/main.js', 'ab') as file:
+        file.write(b'main();\n')
+    assets.load()
+
+    assert assets.manifest['js/main.js'] != script_name
+    assert assets.manifest['css/style.css'] == style_name
+
+
+def test_page_references(assets, api_call, client_app):
+    response = api_call('GET', '/', wsgi_app=client_app)
+    page = response.body.decode()
+
+    assert response.headers['Cache-Control'] == 'no-cache'
+    assert f'href="/static/{assets.manifest["css/style.css"]}"' in page
+    assert f"src='/static/{assets.manifest['js/main.js']}'" in page
+    # not a static file, or not one of the root
+    assert 'href="/static/js/missing.js"' in page
+    assert 'href="/api/v1/notes"' in page
+
+
+def test_immutable_fingerprinted_file(assets, api_call, client_app):
+    path = f'/static/{assets.manifest["js/main.js"]}'
+
+    response = api_call('GET', path, wsgi_app=client_app)
+
+    assert response.status == 200
+    assert response.headers['Cache-Control'] == \
+        f'public, max-age={365 * 24 * 3600}, immutable'
+    # "text/javascript" from Python 3.11, else "application/javascript"
+    assert 'javascript' in response.headers['Content-Type']
+    assert response.body == SCRIPT
+
+
+def test_revalidated_original_name(api_call, client_app):
+    response = api_call('GET', '/static/js/main.js', wsgi_app=client_app)
+
+    assert response.status == 200
+    assert response.headers['Cache-Control'] == 'public, no-cache'
+    assert response.body == SCRIPT
+
+
+def test_missing_file(api_call, client_app):
+    response = api_call('GET', '/static/js/missing.js', wsgi_app=client_app)
+
+    assert response.status == 404
+
+
+@pytest.mark.parametrize('encoding, decompress', [
+    ('gzip', gzip.decompress),
+    pytest.param('br', brotli and brotli.decompress,
+                 marks=pytest.mark.skipif(brotli is None,
+                                          reason='brotli not installed')),
+])
+def test_compressed_variant(assets, api_call, client_app, encoding,
+                            decompress):
+    asset = assets.files['js/main.js']
+
+    response = api_call('GET', '/static/js/main.js', wsgi_app=client_app,
+                        headers={'Accept-Encoding': encoding})
+
+    assert response.headers['Content-Encoding'] == encoding
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert response.headers['Etag'] == f'"{asset.digest}-{encoding}"'
+    assert response.body == asset.bodies[encoding]
+    assert decompress(response.body) == SCRIPT
+
+
+def test_small_file_not_compressed(assets, api_call, client_app):
+    response = api_call('GET', '/static/css/style.css', wsgi_app=client_app,
+                        headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in response.headers
+    assert 'Vary' not in response.headers
+    assert response.body == STYLE
+
+
+@pytest.mark.parametrize('accept_encoding', ['', 'gzip'])
+def test_not_modified(assets, api_call, client_app, accept_encoding):
+    path = f'/static/{assets.manifest["js/main.js"]}'
+    headers = {'Accept-Encoding': accept_encoding}
+    etag = api_call('GET', path, wsgi_app=client_app,
+                    headers=headers).headers['Etag']
+
+    response = api_call('GET', path, wsgi_app=client_app,
+                        headers={**headers, 'If-None-Match': f'W/{etag}'})
+
+    assert response.status == 304
+    assert response.body == b''
+    assert response.headers['Etag'] == etag
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert 'immutable' in response.headers['Cache-Control']
+
+
+def test_other_encoding_is_modified(api_call, client_app):
+    etag = api_call('GET', '/static/js/main.js', wsgi_app=client_app,
+                    headers={'Accept-Encoding': 'gzip'}).headers['Etag']
+
+    response = api_call('GET', '/static/js/main.js', wsgi_app=client_app,
+                        headers={'If-None-Match': etag})
+
+    assert response.status == 200
+    assert response.body == SCRIPT
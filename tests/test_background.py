@@ -0,0 +1,85 @@
+from threading import Event
+
+from peewee import OperationalError, SqliteDatabase
+
+from utils.background import BackgroundTask
+
+
+def test_requests_are_coalesced(tmp_path):
+    started, release = Event(), Event()
+    calls = list()
+
+    def function() -> None:
+        calls.append(len(calls))
+        started.set()
+        release.wait(5)
+
+    task = BackgroundTask(SqliteDatabase(str(tmp_path / 'db.sqlite3')),
+                          function)
+    task.request()
+    assert started.wait(5)
+    # while it runs
+    for _ in range(3):
+        task.request()
+    release.set()
+
+    assert task.flush(timeout=5)
+    assert calls == [0, 1]
+    assert task.stats() == {'runs': 2, 'errors': 0, 'pending': 0}
+
+
+def test_failed_run_is_retried(tmp_path):
+    results = [OperationalError('database is locked'), None]
+
+    def function() -> None:
+        result = results.pop(0)
+        if result is not None:
+            raise result
+
+    task = BackgroundTask(SqliteDatabase(str(tmp_path / 'db.sqlite3')),
+                          function, retry_interval=0.01)
+    task.request()
+
+    assert task.flush(timeout=5)
+    assert results == []
+    assert task.stats() == {'runs': 1, 'errors': 1, 'pending': 0}
+
+
+def test_flush_timeout(tmp_path):
+    release = Event()
+    task = BackgroundTask(SqliteDatabase(str(tmp_path / 'db.sqlite3')),
+                          lambda: release.wait(5))
+    task.request()
+
+    assert not task.flush(timeout=0.01)
+    release.set()
+    assert task.flush(timeout=5)
+
+
+def test_close_runs_the_pending_requests(tmp_path):
+    started, release = Event(), Event()
+    calls = list()
+
+    def function() -> None:
+        calls.append(len(calls))
+        started.set()
+        release.wait(5)
+
+    task = BackgroundTask(SqliteDatabase(str(tmp_path / 'db.sqlite3')),
+                          function)
+    task.request()
+    assert started.wait(5)
+    task.request()
+    thread = task._thread
+    release.set()
+
+    task.close()
+
+    assert not thread.is_alive()
+    assert calls == [0, 1]
+    # started again by the next request
+    task.request()
+    assert task.flush(timeout=5)
+    assert calls == [0, 1, 2]
+    task.close()
+    task.close()
@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+import pytest
+from peewee import IntegrityError
+
+from api.models import Note, User
+from database import note_shards
+from utils.compaction import compactor
+
+
+# the rows deleted until now are archived
+RETENTION = timedelta(seconds=-1)
+
+
+def create_note(user, available: bool = True) -> Note:
+    with note_shards.bind(user.id):
+        note = Note.create(name='Note', text='Text', user=user)
+        if not available:
+            note.available = False
+            note.save()
+    return note
+
+
+def count_rows(user, table: str, row_id: int) -> int:
+    database = note_shards.get_database(user.id)
+    cursor = database.execute_sql(
+        f'SELECT COUNT(*) FROM "{table}" WHERE "id" = ?', (row_id, ))
+    return cursor.fetchone()[0]
+
+
+def test_deleted_notes_are_archived(user):
+    note = create_note(user)
+    deleted_note = create_note(user, available=False)
+
+    report = compactor.compact(retention=RETENTION)
+
+    assert report.moved_rows['note'] >= 1
+    assert count_rows(user, 'note', note.id) == 1
+    assert count_rows(user, 'note', deleted_note.id) == 0
+    assert count_rows(user, 'note_archive', deleted_note.id) == 1
+
+
+def test_archived_user_id_is_not_reused(user):
+    note = create_note(user)
+    User.update(available=False).where(User.id == user.id).execute()
+
+    compactor.compact(retention=RETENTION)
+
+    # with its notes, available or not
+    assert count_rows(user, 'note_archive', note.id) == 1
+    assert count_rows(user, 'user_archive', user.id) == 1
+    new_user_id = User.insert(username=f'{user.username}-new',
+                              password='!').execute()
+    assert new_user_id > user.id
+
+
+def test_archive_conflict_fails(user):
+    note = create_note(user, available=False)
+    database = note_shards.get_database(user.id)
+    database.execute_sql(
+        'INSERT INTO "note_archive" VALUES (?, 0, ?, ?, ?, ?, ?, ?)',
+        (note.id, note.creation_date, note.creation_date, 'Archived',
+         'Text', user.id, note.creation_date))
+    try:
+        with pytest.raises(IntegrityError):
+            compactor.compact(retention=RETENTION)
+
+        # neither overwritten nor deleted
+        assert count_rows(user, 'note', note.id) == 1
+        cursor = database.execute_sql(
+            'SELECT "name" FROM "note_archive" WHERE "id" = ?', (note.id, ))
+        assert cursor.fetchone() == ('Archived', )
+    finally:
+        database.execute_sql('DELETE FROM "note_archive" WHERE "id" = ?',
+                             (note.id, ))
+
+
+def test_stale_save_is_archived(user):
+    note = create_note(user)
+    with note_shards.bind(user.id):
+        stale_note = Note.get_by_id(note.id)
+        note.available = False
+        note.save()
+        stale_note.available = False
+        stale_note.save()
+
+    compactor.compact(retention=RETENTION)
+
+    assert count_rows(user, 'note_archive', note.id) == 1
@@ -0,0 +1,146 @@
+import zlib
+
+import pytest
+
+from utils.compression import CompressionMiddleware, choose_encoding
+
+
+SETTINGS = {
+    'MIN_SIZE': 100,
+    'LEVEL': 6,
+    'BROTLI_QUALITY': 4,
+    'ENCODINGS': ('br', 'gzip', 'deflate'),
+    'CONTENT_TYPES': ('application/json', 'text/'),
+}
+BODY = b'{"name": "Note", "text": "Lorem ipsum dolor sit amet."}' * 10
+ETAG = '"abc"'
+
+
+def make_app(body=BODY, streamed: bool = False, headers: tuple = ()):
+    """WSGI app with an ETag, a 304 if "If-None-Match" matches it."""
+    def app(environ: dict, start_response):
+        response_headers = [('ETag', ETAG), *headers]
+        if environ.get('HTTP_IF_NONE_MATCH') == ETAG:
+            start_response('304 Not Modified', response_headers)
+            return []
+        response_headers.append(('Content-Type', 'application/json'))
+        if streamed:
+            start_response('200 OK', response_headers)
+            return (body[index:index + 50]
+                    for index in range(0, len(body), 50))
+        response_headers.append(('Content-Length', str(len(body))))
+        start_response('200 OK', response_headers)
+        return [body]
+    return CompressionMiddleware(app, SETTINGS)
+
+
+def decompress(body: bytes, encoding: str) -> bytes:
+    wbits = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+    return zlib.decompress(body, wbits[encoding])
+
+
+@pytest.mark.parametrize('header, encoding', [
+    ('', None),
+    ('gzip', 'gzip'),
+    ('GZIP', 'gzip'),
+    ('deflate, gzip', 'gzip'),
+    ('gzip;q=0.5, deflate', 'deflate'),
+    ('gzip;q=0', None),
+    ('gzip;q=abc', None),
+    ('*', 'br'),
+    ('*, br;q=0', 'gzip'),
+    ('*;q=0, deflate', 'deflate'),
+    ('identity;q=0', None),
+    ('identity;q=0, gzip', 'gzip'),
+    ('identity', None),
+])
+def test_choose_encoding(header, encoding):
+    assert choose_encoding(header, ('br', 'gzip', 'deflate')) == encoding
+
+
+@pytest.mark.parametrize('encoding', ['gzip', 'deflate'])
+def test_compressed(api_call, encoding):
+    response = api_call('GET', '/', headers={'Accept-Encoding': encoding},
+                        wsgi_app=make_app())
+
+    assert response.headers['Content-Encoding'] == encoding
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert response.headers['Content-Length'] == str(len(response.body))
+    assert decompress(response.body, encoding) == BODY
+
+
+@pytest.mark.parametrize('streamed', [False, True])
+def test_min_size(api_call, streamed):
+    body = BODY[:SETTINGS['MIN_SIZE'] - 1]
+    response = api_call('GET', '/', headers={'Accept-Encoding': 'gzip'},
+                        wsgi_app=make_app(body, streamed))
+
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert response.headers['ETag'] == ETAG
+    assert response.body == body
+
+
+def test_streamed_body(api_call):
+    response = api_call('GET', '/', headers={'Accept-Encoding': 'gzip'},
+                        wsgi_app=make_app(streamed=True))
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    assert decompress(response.body, 'gzip') == BODY
+
+
+def test_etag_by_encoding(api_call):
+    app = make_app()
+    response = api_call('GET', '/', headers={'Accept-Encoding': 'gzip'},
+                        wsgi_app=app)
+    etag = response.headers['ETag']
+    assert etag == '"abc-gzip"'
+
+    # the app compares its own ETag, without the suffix
+    response = api_call('GET', '/', wsgi_app=app, headers={
+        'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status == 304
+    assert response.body == b''
+    assert response.headers['ETag'] == etag
+    assert response.headers['Vary'] == 'Accept-Encoding'
+
+
+def test_not_modified_without_encoding(api_call):
+    response = api_call('GET', '/', headers={'If-None-Match': ETAG},
+                        wsgi_app=make_app())
+
+    assert response.status == 304
+    assert response.headers['ETag'] == ETAG
+    assert response.headers['Vary'] == 'Accept-Encoding'
+
+
+def test_head(api_call):
+    response = api_call('HEAD', '/', headers={'Accept-Encoding': 'gzip'},
+                        wsgi_app=make_app())
+
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['Content-Length'] == str(len(BODY))
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert response.headers['ETag'] == ETAG
+
+
+@pytest.mark.parametrize('headers', [
+    (('Content-Encoding', 'gzip'), ),
+    (('Cache-Control', 'no-transform'), ),
+])
+def test_sent_as_is(api_call, headers):
+    response = api_call('GET', '/', headers={'Accept-Encoding': 'deflate'},
+                        wsgi_app=make_app(headers=headers))
+
+    assert response.headers.get('Content-Encoding') == dict(headers).get(
+        'Content-Encoding')
+    assert response.headers['ETag'] == ETAG
+    assert response.body == BODY
+
+
+def test_vary_is_extended(api_call):
+    response = api_call('GET', '/', headers={'Accept-Encoding': 'gzip'},
+                        wsgi_app=make_app(headers=(('Vary', 'Origin'), )))
+
+    assert response.headers['Vary'] == 'Origin, Accept-Encoding'
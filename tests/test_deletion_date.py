@@ -0,0 +1,47 @@
+from api.models import Note, User
+from database import note_shards
+
+
+def test_set_on_soft_delete(user):
+    user.available = False
+    user.save()
+
+    assert User.get_by_id(user.id).deletion_date is not None
+
+
+def test_stale_instance_keeps_the_date(user):
+    stale_user = User.get_by_id(user.id)
+    user.available = False
+    user.save()
+    deletion_date = User.get_by_id(user.id).deletion_date
+
+    # loaded before the deletion, saved as deleted
+    stale_user.available = False
+    stale_user.username = f'{user.username}-renamed'
+    stale_user.save()
+
+    saved_user = User.get_by_id(user.id)
+    assert saved_user.username == stale_user.username
+    assert saved_user.deletion_date == deletion_date
+
+
+def test_cleared_on_restore(user):
+    with note_shards.bind(user.id):
+        note = Note.create(name='Note', text='Text', user=user)
+        stale_note = Note.get_by_id(note.id)
+        note.available = False
+        note.save()
+        assert Note.get_by_id(note.id).deletion_date is not None
+
+        stale_note.available = True
+        stale_note.save()
+
+        assert Note.get_by_id(note.id).deletion_date is None
+
+
+def test_set_on_deleted_insert(user):
+    with note_shards.bind(user.id):
+        note = Note.create(name='Note', text='Text', user=user,
+                           available=False)
+
+        assert Note.get_by_id(note.id).deletion_date is not None
@@ -0,0 +1,144 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+from time import sleep
+
+import pytest
+from peewee import SqliteDatabase
+
+from utils.group_commit import GroupCommitBusy, GroupCommitWriter
+
+
+class Recorder:
+    """Writes the items in a table, fails the batches with "bad" items,
+    and blocks on "block" until released.
+    """
+
+    def __init__(self, database: SqliteDatabase) -> None:
+        self.database = database
+        self.batches = list()
+        self.release = Event()
+        database.execute_sql('CREATE TABLE "item" ("name" TEXT NOT NULL)')
+
+    def __call__(self, items: list) -> list:
+        self.batches.append(list(items))
+        if 'block' in items:
+            self.release.wait(5)
+        for item in items:
+            self.database.execute_sql('INSERT INTO "item" VALUES (?)',
+                                      (item, ))
+        if 'bad' in items:
+            raise ValueError(item)
+        return [item.upper() for item in items]
+
+    def get_items(self) -> list:
+        cursor = self.database.execute_sql('SELECT "name" FROM "item"')
+        return sorted(name for name, in cursor.fetchall())
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    database = SqliteDatabase(str(tmp_path / 'db.sqlite3'))
+    yield Recorder(database)
+    database.close()
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        yield executor
+
+
+def wait_queued(writer: GroupCommitWriter, count: int) -> None:
+    for _ in range(500):
+        if writer.stats()['queued'] == count:
+            return
+        sleep(0.01)
+    raise AssertionError(f'{count} items not queued')
+
+
+def submit_blocked(writer: GroupCommitWriter, recorder: Recorder,
+                   executor: ThreadPoolExecutor, items: list) -> list:
+    """Submit the items while the writer is busy, so they are queued."""
+    futures = [executor.submit(writer.submit, 'block')]
+    while not recorder.batches:
+        sleep(0.01)
+    for item in items:
+        futures.append(executor.submit(writer.submit, item))
+    wait_queued(writer, len(items))
+    recorder.release.set()
+    return futures
+
+
+def test_queued_items_are_written_together(recorder, executor):
+    writer = GroupCommitWriter(recorder.database, recorder, window=0,
+                               max_batch=3)
+
+    futures = submit_blocked(writer, recorder, executor, list('abcde'))
+
+    assert [future.result() for future in futures] == ['BLOCK', *'ABCDE']
+    assert sorted(map(len, recorder.batches)) == [1, 2, 3]
+    assert writer.stats() == {'batches': 3, 'items': 6, 'queued': 0}
+    assert recorder.get_items() == ['a', 'b', 'block', 'c', 'd', 'e']
+    writer.close()
+
+
+def test_error_fails_only_its_caller(recorder, executor):
+    writer = GroupCommitWriter(recorder.database, recorder, window=0)
+
+    _, *futures = submit_blocked(writer, recorder, executor,
+                                 ['a', 'bad', 'b'])
+
+    assert futures[0].result() == 'A'
+    with pytest.raises(ValueError):
+        futures[1].result()
+    assert futures[2].result() == 'B'
+    # the failed batch is rolled back, then written item by item
+    assert recorder.batches[1:] == [['a', 'bad', 'b'], ['a'], ['bad'], ['b']]
+    assert recorder.get_items() == ['a', 'b', 'block']
+    writer.close()
+
+
+def test_full_queue_is_busy(recorder, executor):
+    writer = GroupCommitWriter(recorder.database, recorder, queue_size=1)
+
+    futures = submit_blocked(writer, recorder, executor, ['a'])
+    recorder.release.clear()
+    with pytest.raises(GroupCommitBusy):
+        writer.submit('b')
+
+    recorder.release.set()
+    assert [future.result() for future in futures] == ['BLOCK', 'A']
+    writer.close()
+
+
+def test_timeout_drops_the_item(recorder, executor):
+    writer = GroupCommitWriter(recorder.database, recorder, timeout=0.05)
+    future = executor.submit(writer.submit, 'block')
+    while not recorder.batches:
+        sleep(0.01)
+
+    with pytest.raises(GroupCommitBusy):
+        writer.submit('a')
+
+    recorder.release.set()
+    assert future.result() == 'BLOCK'
+    writer.close()
+    assert recorder.get_items() == ['block']
+
+
+def test_close_writes_the_queued_items(recorder, executor):
+    writer = GroupCommitWriter(recorder.database, recorder, window=0,
+                               max_batch=2)
+    futures = submit_blocked(writer, recorder, executor, list('abc'))
+    thread = writer._thread
+
+    writer.close()
+
+    assert not thread.is_alive()
+    assert recorder.get_items() == ['a', 'b', 'block', 'c']
+    assert [future.result() for future in futures] == ['BLOCK', *'ABC']
+    # started again by the next item
+    assert writer.submit('d') == 'D'
+    assert writer._thread is not thread
+    writer.close()
+    writer.close()
@@ -0,0 +1,50 @@
+from decimal import Decimal
+
+import pytest
+
+from api.serializers import NoteSerializer
+from utils.json_codec import dumps, loads
+
+
+def test_round_trip():
+    obj = {'name': 'ñandú 🦤', 'ids': [1, 2 ** 53 + 1], 'none': None}
+
+    data = dumps(obj)
+
+    assert isinstance(data, bytes)
+    assert loads(data) == loads(data.decode('utf-8')) == obj
+
+
+def test_default():
+    # not encoded by any of the backends
+    price = Decimal('1.50')
+
+    assert loads(dumps({'price': price}, default=str)) == {'price': '1.50'}
+    with pytest.raises(TypeError):
+        dumps({'price': price})
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'indent': 2},
+    {'sort_keys': True},
+    {'separators': (',', ':')},
+])
+def test_unsupported_options(kwargs):
+    with pytest.raises(TypeError):
+        dumps({'b': 1, 'a': 2}, **kwargs)
+
+
+def test_positional_options():
+    with pytest.raises(TypeError):
+        dumps({'a': 1}, str)
+    with pytest.raises(TypeError):
+        loads('{}', dict)
+
+
+def test_serializer_options():
+    serializer = NoteSerializer()
+
+    assert loads(serializer.dumps({'id': 1, 'name': 'Note'})) == {
+        'id': 1, 'name': 'Note'}
+    with pytest.raises(TypeError):
+        serializer.dumps({'id': 1}, indent=2)
@@ -0,0 +1,122 @@
+import os
+import subprocess
+import sys
+from threading import Barrier, Thread
+
+from utils.metrics import Histogram, HistogramFamily, MetricsRegistry
+from utils.startup import BASE_DIR
+
+
+def test_histogram_buckets():
+    histogram = Histogram((0.1, 1.0))
+
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+
+    assert histogram.snapshot() == ([2, 1, 1], 2.65, 4)
+
+
+def test_concurrent_observations():
+    # switch threads as often as possible, to interleave the additions
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    histogram = Histogram((0.1, 1.0))
+    threads, observations = 8, 20000
+    barrier = Barrier(threads)
+
+    def observe() -> None:
+        barrier.wait()
+        for _ in range(observations):
+            histogram.observe(0.5)
+
+    thread_list = [Thread(target=observe) for _ in range(threads)]
+    try:
+        for thread in thread_list:
+            thread.start()
+        for thread in thread_list:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    counts, total, count = histogram.snapshot()
+    assert count == counts[1] == threads * observations
+    assert total == threads * observations * 0.5
+
+
+def test_render():
+    family = HistogramFamily('duration_seconds', 'Duration.', ('route', ),
+                             (0.1, ))
+    family.labels('/notes').observe(0.05)
+    family.labels('/notes').observe(0.5)
+
+    assert family.render() == [
+        '# HELP duration_seconds Duration.',
+        '# TYPE duration_seconds histogram',
+        'duration_seconds_bucket{route="/notes",le="0.1"} 1',
+        'duration_seconds_bucket{route="/notes",le="+Inf"} 2',
+        'duration_seconds_sum{route="/notes"} 0.55',
+        'duration_seconds_count{route="/notes"} 2',
+    ]
+
+
+def test_observe_request_phases():
+    registry = MetricsRegistry(buckets=(1.0, ))
+
+    registry.observe_request('GET', '/notes', 200, 0.5,
+                             {'auth': 0.1, 'db': 0.2})
+
+    phases = {labels[-1]: histogram.snapshot()[1] for labels, histogram
+              in registry.phase_duration.histograms.items()}
+    assert phases == {'auth': 0.1, 'db': 0.2, 'other': 0.5 - 0.1 - 0.2}
+
+
+def test_disabled_by_default(api_call):
+    assert api_call('GET', '/metrics').status == 404
+
+
+# the metrics are installed on import of the server, with the settings
+# read once, so it runs in a new interpreter
+METRICS_SCRIPT = '''
+from benchmarks.fixtures import make_wsgi_call
+from migrations import migrate
+
+migrate()
+
+from api.models import User
+from server import app
+from utils.jwt_auth import generate_jwtoken
+
+user = User.get_by_id(User.insert(username='user', password='!').execute())
+headers = {'Authorization': f'Bearer {generate_jwtoken(user)}'}
+make_wsgi_call(app, 'GET', '/api/v1/notes', headers=headers)()
+make_wsgi_call(app, 'GET', '/api/v1/notes')()
+print(make_wsgi_call(app, 'GET', '/metrics')().decode())
+'''
+
+
+def test_metrics_enabled(tmp_path):
+    env = dict(os.environ, METRICS_ENABLED='true',
+               PYTHONPATH=str(BASE_DIR))
+    result = subprocess.run([sys.executable, '-c', METRICS_SCRIPT],
+                            cwd=tmp_path, env=env, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, universal_newlines=True)
+    assert result.returncode == 0, result.stderr
+    lines = result.stdout.splitlines()
+
+    def count(metric: str, status: int, phase: str = '') -> int:
+        labels = f'method="GET",route="/notes",status="{status}"'
+        if phase:
+            labels += f',phase="{phase}"'
+        prefix = f'{metric}_count{{{labels}}} '
+        values = [line[len(prefix):] for line in lines
+                  if line.startswith(prefix)]
+        assert values, prefix
+        return int(values[0])
+
+    assert count('http_request_duration_seconds', 200) == 1
+    assert count('http_request_duration_seconds', 401) == 1
+    for phase in ('auth', 'auth_header', 'auth_decode', 'auth_user', 'db',
+                  'serialization', 'encoding', 'other'):
+        assert count('http_request_phase_duration_seconds', 200,
+                     phase=phase) == 1
+    assert '# TYPE user_cache_hits gauge' in lines
@@ -0,0 +1,159 @@
+import pytest
+from marshmallow import ValidationError
+from marshmallow.fields import Int
+
+from api.endpoints import NoteResource
+from api.models import Note, NoteSearch, get_search_indexer
+from api.serializers import NoteSerializer
+from database import note_shards
+from settings import NOTES_BATCH
+from utils.json_codec import loads as json_loads
+from utils.serializers import StrLoader
+
+
+@pytest.mark.parametrize('items', [
+    [],
+    [{'name': 'Note', 'text': 'Text'}],
+    [{'name': '', 'text': 'ñandú', 'id': 3, 'extra': None}],
+    [{'name': 'Note', 'text': 'Text'}, {'name': 'Note'}],
+    [{'name': 'Note', 'text': None}],
+    [{'name': 1, 'text': 'Text'}],
+    [['Note', 'Text']],
+    {'name': 'Note', 'text': 'Text'},
+    None,
+])
+def test_loader_parity(items):
+    schema = NoteSerializer(many=True)
+    try:
+        expected = schema.load(items)
+    except ValidationError as error:
+        with pytest.raises(ValidationError) as loader_error:
+            NoteResource.loader.load(items)
+        assert loader_error.value.messages == error.messages
+        assert loader_error.value.valid_data == error.valid_data
+    else:
+        assert NoteResource.loader.load(items) == expected
+
+
+def test_loader_rejects_other_fields():
+    class PriorityNoteSerializer(NoteSerializer):
+        priority = Int()
+
+    with pytest.raises(ValueError):
+        StrLoader(PriorityNoteSerializer())
+
+
+def create_notes(api_call, user, note_list: list):
+    response = api_call('POST', '/api/v1/notes/batch', data=note_list,
+                        user=user)
+    return response.status, json_loads(response.body)
+
+
+def test_create_notes(api_call, user):
+    note_list = [{'name': f'Note {index}', 'text': 'Text'}
+                 for index in range(3)]
+    note_list.append({'name': 'Without text'})
+
+    status, data = create_notes(api_call, user, note_list)
+
+    assert status == 201
+    assert len(data['ids']) == 3
+    assert data['errors'] == {'3': {'text': ['Missing data for '
+                                             'required field.']}}
+    names = [note.name for note in Note.get_user_notes(user)]
+    assert names == ['Note 0', 'Note 1', 'Note 2']
+
+
+def test_body_bigger_than_bottle_limit(api_call, user):
+    text = 'x' * 1000
+    note_list = [{'name': f'Note {index}', 'text': text}
+                 for index in range(NOTES_BATCH.get('MAX_SIZE'))]
+
+    status, data = create_notes(api_call, user, note_list)
+
+    assert status == 201
+    assert len(data['ids']) == len(note_list)
+
+
+def test_body_too_large(api_call, user):
+    text = 'x' * (NOTES_BATCH.get('MAX_BODY_SIZE') // 10)
+
+    status, data = create_notes(api_call, user,
+                                [{'name': 'Note', 'text': text}] * 10)
+
+    assert status == 413
+    assert data == {'detail': ['Max body size is '
+                               f'{NOTES_BATCH.get("MAX_BODY_SIZE")} bytes.']}
+
+
+def search(api_call, user, terms: str) -> list:
+    response = api_call('GET', '/api/v1/notes/search', f'q={terms}',
+                        user=user)
+    assert response.status == 200
+    return sorted(note['id'] for note in json_loads(response.body)['results'])
+
+
+def count_pending(user) -> int:
+    database = note_shards.get_database(user.id)
+    query = 'SELECT COUNT(*) FROM "note_search_pending"'
+    return database.execute_sql(query).fetchone()[0]
+
+
+def test_deferred_search_index(api_call, user, monkeypatch):
+    database = note_shards.get_database(user.id)
+    # indexed only when the test runs it
+    monkeypatch.setattr(get_search_indexer(user.id), 'request',
+                        lambda: None)
+    note_list = [{'name': f'alpha {index}', 'text': 'Text'}
+                 for index in range(5)]
+    _, data = create_notes(api_call, user, note_list)
+    edited_id, disabled_id, deleted_id, *note_ids = data['ids']
+    assert count_pending(user) >= 5
+
+    # changed before being indexed
+    with note_shards.bind(user.id):
+        note = Note.get_by_id(edited_id)
+        note.name = 'omega'
+        note.save()
+        note = Note.get_by_id(disabled_id)
+        note.available = False
+        note.save()
+        Note.get_by_id(deleted_id).delete_instance()
+
+    # the search only reads
+    assert search(api_call, user, 'alpha') == []
+    assert count_pending(user) >= 5
+
+    assert NoteSearch.index_pending(database) >= 5
+    assert search(api_call, user, 'alpha') == note_ids
+    assert count_pending(user) == 0
+    assert search(api_call, user, 'omega') == [edited_id]
+
+    # indexed, the triggers keep it in sync again
+    with note_shards.bind(user.id):
+        Note.get_by_id(note_ids[0]).delete_instance()
+    assert search(api_call, user, 'alpha') == note_ids[1:]
+    assert NoteSearch.index_pending(database) == 0
+
+
+def test_indexed_after_the_batch(api_call, user):
+    note_list = [{'name': 'delta', 'text': 'Text'} for _ in range(3)]
+
+    _, data = create_notes(api_call, user, note_list)
+
+    assert get_search_indexer(user.id).flush(timeout=5)
+    assert count_pending(user) == 0
+    assert search(api_call, user, 'delta') == data['ids']
+
+
+def test_search_indexes_the_notes_left(api_call, user, monkeypatch):
+    indexer = get_search_indexer(user.id)
+    # e.g. the process ended before indexing them
+    monkeypatch.setattr(indexer, 'request', lambda: None)
+    _, data = create_notes(api_call, user, [{'name': 'kappa', 'text': ''}])
+    monkeypatch.undo()
+
+    search(api_call, user, 'kappa')
+
+    assert indexer.flush(timeout=5)
+    assert search(api_call, user, 'kappa') == data['ids']
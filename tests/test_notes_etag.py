@@ -0,0 +1,94 @@
+import pytest
+
+from api.models import Note
+from database import note_shards
+
+
+# the header names are capitalized by Bottle, e.g. "Etag"
+def get_notes(api_call, user, etag: str = None):
+    headers = {'If-None-Match': etag} if etag else None
+    return api_call('GET', '/api/v1/notes', 'limit=10', user=user,
+                    headers=headers)
+
+
+def create_note(user, available: bool = True) -> Note:
+    with note_shards.bind(user.id):
+        return Note.create(name='Note', text='Text', user=user,
+                           available=available)
+
+
+def test_not_modified(api_call, user):
+    create_note(user)
+    response = get_notes(api_call, user)
+    etag = response.headers['Etag']
+
+    not_modified = get_notes(api_call, user, etag)
+
+    assert response.status == 200
+    assert not_modified.status == 304
+    assert not_modified.body == b''
+    assert not_modified.headers['Etag'] == etag
+    assert not_modified.headers['Cache-Control'] == 'private, no-cache'
+    # another page, another ETag
+    response = api_call('GET', '/api/v1/notes', 'limit=5', user=user,
+                        headers={'If-None-Match': etag})
+    assert response.status == 200
+
+
+def create(api_call, user) -> None:
+    with note_shards.bind(user.id):
+        Note.create(name='New', text='Text', user=user)
+
+
+def create_by_route(api_call, user) -> None:
+    response = api_call('POST', '/api/v1/notes', user=user,
+                        data={'name': 'New', 'text': 'Text'})
+    assert response.status == 200
+
+
+def create_by_batch(api_call, user) -> None:
+    response = api_call('POST', '/api/v1/notes/batch', user=user,
+                        data=[{'name': 'New', 'text': 'Text'}])
+    assert response.status == 201
+
+
+def disable(api_call, user) -> None:
+    with note_shards.bind(user.id):
+        note = Note.get(Note.user == user)
+        note.available = False
+        note.save()
+
+
+def enable(api_call, user) -> None:
+    with note_shards.bind(user.id):
+        note = Note.get(Note.user == user, Note.available == False)
+        note.available = True
+        note.save()
+
+
+@pytest.mark.parametrize('change', [create, create_by_route,
+                                    create_by_batch, disable, enable])
+def test_changes_bump_the_version(api_call, user, change):
+    create_note(user)
+    create_note(user, available=False)
+    response = get_notes(api_call, user)
+    etag = response.headers['Etag']
+
+    change(api_call, user)
+
+    response = get_notes(api_call, user, etag)
+    assert response.status == 200
+    assert response.headers['Etag'] != etag
+    assert get_notes(api_call, user, response.headers['Etag']).status == 304
+
+
+def test_etag_by_user(api_call, user):
+    other_user = type(user).get_by_id(
+        type(user).insert(username=f'{user.username}-other',
+                          password='!').execute())
+    etag = get_notes(api_call, user).headers['Etag']
+
+    response = get_notes(api_call, other_user, etag)
+
+    assert response.status == 200
+    assert response.headers['Etag'] != etag
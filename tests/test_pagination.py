@@ -0,0 +1,125 @@
+from datetime import datetime
+
+import pytest
+
+from api.models import Note, User
+from utils.json_codec import loads as json_loads
+from utils.pagination import decode_cursor, encode_cursor
+
+
+CREATION_DATE = datetime(2021, 6, 1, 12, 30, 15, 123456)
+
+
+@pytest.mark.parametrize('creation_date, pk', [
+    (CREATION_DATE, 1),
+    (CREATION_DATE.replace(microsecond=0), 2 ** 62),
+    (datetime(1999, 12, 31), 0),
+])
+def test_cursor_round_trip(creation_date, pk):
+    cursor = encode_cursor(creation_date, pk)
+
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == (creation_date, pk)
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor(CREATION_DATE, 123456789)
+
+    assert all(char.isalnum() or char in '-_' for char in cursor)
+
+
+@pytest.mark.parametrize('cursor', [
+    '',
+    '!!!',
+    'a',
+    # valid base64, not UTF-8
+    '_-8',
+    # "2021-06-01T12:30:15" without separator
+    'MjAyMS0wNi0wMVQxMjozMDoxNQ',
+    # "not a date|1"
+    'bm90IGEgZGF0ZXwx',
+    # "2021-06-01T12:30:15|x"
+    'MjAyMS0wNi0wMVQxMjozMDoxNXx4',
+    # "2021-06-01T12:30:15|1|2"
+    'MjAyMS0wNi0wMVQxMjozMDoxNXwxfDI',
+])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_tampered_cursor():
+    cursor = encode_cursor(CREATION_DATE, 42)
+    # the last character of the ID, "42" is now "4\x12"
+    tampered_cursor = cursor[:-2] + 'B' + cursor[-1]
+
+    with pytest.raises(ValueError):
+        decode_cursor(tampered_cursor)
+
+
+@pytest.mark.parametrize('cursor', ['!!!', 'bm90IGEgZGF0ZXwx'])
+def test_invalid_cursor_request(api_call, user, cursor):
+    response = api_call('GET', '/api/v1/notes', f'cursor={cursor}',
+                        user=user)
+
+    assert response.status == 400
+    assert json_loads(response.body) == {'cursor': ['Invalid cursor.']}
+
+
+def create_tied_notes(user, count: int) -> list:
+    """Notes with the same creation date, only the ID breaks the ties."""
+    note_list = [{'name': f'Note {index}', 'text': 'Text',
+                  'creation_date': CREATION_DATE} for index in range(count)]
+    return Note.bulk_create_user_notes(user, note_list)
+
+
+def test_creation_date_ties_across_pages(user):
+    note_ids = create_tied_notes(user, 7)
+
+    seen_ids = list()
+    cursor = None
+    while True:
+        page = list(Note.get_user_notes(user, cursor=cursor, limit=3))
+        if not page:
+            break
+        seen_ids += [note.id for note in page]
+        cursor = (page[-1].creation_date, page[-1].id)
+
+    assert seen_ids == sorted(note_ids)
+
+
+def test_creation_date_ties_across_request_pages(api_call, user):
+    note_ids = create_tied_notes(user, 5)
+    later_note_ids = Note.bulk_create_user_notes(
+        user, [{'name': 'Later', 'text': 'Text'}])
+
+    seen_ids = list()
+    query_string = 'limit=2'
+    while True:
+        response = api_call('GET', '/api/v1/notes', query_string, user=user)
+        assert response.status == 200
+        page = json_loads(response.body)
+        seen_ids += [note['id'] for note in page['results']]
+        if page['next_cursor'] is None:
+            break
+        query_string = f'limit=2&cursor={page["next_cursor"]}'
+
+    assert seen_ids == sorted(note_ids) + later_note_ids
+
+
+def test_forged_cursor_only_pages_own_notes(api_call, user):
+    # the cursors aren't signed, any keyset is only a position
+    # in the user's notes
+    other_user = User.get_by_id(
+        User.insert(username=f'{user.username}-other', password='!')
+        .execute())
+    create_tied_notes(other_user, 3)
+    note_ids = create_tied_notes(user, 3)
+    cursor = encode_cursor(datetime(1970, 1, 1), 0)
+
+    response = api_call('GET', '/api/v1/notes', f'cursor={cursor}',
+                        user=user)
+
+    assert response.status == 200
+    page = json_loads(response.body)
+    assert [note['id'] for note in page['results']] == sorted(note_ids)
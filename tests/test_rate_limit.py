@@ -0,0 +1,149 @@
+import pytest
+from bottle import Bottle, request
+
+from api.app import app as api_app
+from utils.json_codec import loads as json_loads
+from utils.rate_limit import RateLimitPlugin, TokenBuckets, get_client_ip
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Frozen monotonic clock, moved with "clock.now"."""
+    class Clock:
+        now = 0.0
+
+    clock = Clock()
+    monkeypatch.setattr('utils.rate_limit.monotonic', lambda: clock.now)
+    return clock
+
+
+def test_burst_then_refill(clock):
+    buckets = TokenBuckets(rate=2, burst=3)
+
+    assert [buckets.consume('key') for _ in range(3)] == [0, 0, 0]
+    assert buckets.consume('key') == 0.5
+    clock.now = 0.5
+    assert buckets.consume('key') == 0
+    assert buckets.consume('key') == 0.5
+    # never more than the burst
+    clock.now = 100
+    assert [buckets.consume('key') for _ in range(4)] == [0, 0, 0, 0.5]
+    # other keys have their own bucket
+    assert buckets.consume('other') == 0
+
+
+def test_idle_keys_are_dropped(clock):
+    buckets = TokenBuckets(rate=1, burst=2, shards=1)
+
+    buckets.consume('first', 2)
+    clock.now = 1
+    buckets.consume('second', 2)
+    clock.now = 2.5
+    buckets.consume('third')
+
+    # "first" was full again, the same as a new bucket
+    assert len(buckets) == 2
+    assert buckets.consume('second', 2) == 0.5
+
+
+def test_max_keys(clock):
+    buckets = TokenBuckets(rate=1, burst=10, shards=1, max_keys=2)
+
+    for key in ('first', 'second', 'third'):
+        buckets.consume(key, 10)
+
+    assert len(buckets) == 2
+    # the least recently used was dropped, it starts full
+    assert buckets.consume('first', 10) == 0
+    assert buckets.consume('third', 10) > 0
+
+
+@pytest.mark.parametrize('forwarded_for, proxies, header, client_ip', [
+    (False, 1, '1.2.3.4, 203.0.113.9', '10.0.0.1'),
+    (True, 1, '1.2.3.4, 203.0.113.9', '203.0.113.9'),
+    (True, 2, '1.2.3.4, 203.0.113.9', '1.2.3.4'),
+    (True, 2, '6.6.6.6, 1.2.3.4, 203.0.113.9', '1.2.3.4'),
+    (True, 1, '', '10.0.0.1'),
+    (True, 2, '203.0.113.9', '10.0.0.1'),
+])
+def test_client_ip(forwarded_for, proxies, header, client_ip):
+    environ = {'REMOTE_ADDR': '10.0.0.1'}
+    if header:
+        environ['HTTP_X_FORWARDED_FOR'] = header
+    request.bind(environ)
+
+    assert get_client_ip(forwarded_for, proxies) == client_ip
+
+
+def create_app(limits: dict, forwarded_for: bool = False):
+    app = Bottle()
+    app.route('/auth/token', 'POST', lambda: 'ok')
+    # the JSON errors of the API
+    app.error_handler = api_app.error_handler
+    plugin = RateLimitPlugin({
+        'SHARDS': 4,
+        'MAX_KEYS': 100,
+        'FORWARDED_FOR': forwarded_for,
+        'PROXIES': 1,
+        'ROUTES': {'POST /auth/token': limits},
+    })
+    app.install(plugin)
+    return app, plugin
+
+
+def test_too_many_requests(api_call, clock):
+    app, plugin = create_app({'IP': {'RATE': 0.5, 'BURST': 2}})
+
+    statuses = [api_call('POST', '/auth/token', wsgi_app=app).status
+                for _ in range(2)]
+    response = api_call('POST', '/auth/token', wsgi_app=app)
+
+    assert statuses == [200, 200]
+    assert response.status == 429
+    assert response.headers['Retry-After'] == '2'
+    assert response.headers['Content-Type'] == 'application/json'
+    assert json_loads(response.body) == {
+        'detail': 'Too many requests, try again later.'}
+    assert plugin.stats() == {'keys': 1, 'rejected': 1}
+
+
+def test_limit_by_username(api_call, clock):
+    app, _ = create_app({'USERNAME': {'RATE': 1, 'BURST': 1}})
+
+    def login(data) -> int:
+        return api_call('POST', '/auth/token', data=data,
+                        wsgi_app=app).status
+
+    assert login({'username': 'first', 'password': 'x'}) == 200
+    assert login({'username': 'first', 'password': 'y'}) == 429
+    assert login({'username': 'second', 'password': 'x'}) == 200
+    # without username, only the IP limit applies
+    assert login({'password': 'x'}) == 200
+    assert login(['first']) == 200
+
+
+def test_forwarded_for_is_not_spoofed(api_call, clock):
+    app, _ = create_app({'IP': {'RATE': 1, 'BURST': 1}},
+                        forwarded_for=True)
+
+    statuses = [
+        api_call('POST', '/auth/token', wsgi_app=app, headers={
+            'X-Forwarded-For': f'1.2.3.{index}, 203.0.113.9',
+        }).status
+        for index in range(3)
+    ]
+
+    assert statuses == [200, 429, 429]
+
+
+def test_limits_kept_when_applied_again(api_call, clock):
+    app, plugin = create_app({'IP': {'RATE': 1, 'BURST': 1}})
+    assert api_call('POST', '/auth/token', wsgi_app=app).status == 200
+
+    # the plugins are applied again to every route
+    app.reset()
+    app.route('/users', 'POST', lambda: 'ok')
+
+    assert api_call('POST', '/auth/token', wsgi_app=app).status == 429
+    assert len(plugin.limiters) == 1
+    assert plugin.stats() == {'keys': 1, 'rejected': 1}
@@ -0,0 +1,60 @@
+import pytest
+
+from utils.response_cache import (MemoryResponseCache, ResponseCache,
+                                  SQLiteResponseCache)
+
+
+def test_interface_is_abstract():
+    with pytest.raises(TypeError):
+        ResponseCache()
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def cache(request, tmp_path):
+    if request.param == 'memory':
+        cache = MemoryResponseCache(max_bytes=100, ttl=60)
+    else:
+        cache = SQLiteResponseCache(path=str(tmp_path / 'cache.sqlite3'),
+                                    max_bytes=100, ttl=60)
+    yield cache
+    cache.close()
+
+
+def test_get_set_invalidate(cache):
+    cache.set(1, 'a', b'first')
+    cache.set(1, 'b', b'second')
+    cache.set(2, 'a', b'other')
+
+    assert cache.get(1, 'a') == b'first'
+    cache.invalidate(1)
+    assert cache.get(1, 'a') is None
+    assert cache.get(1, 'b') is None
+    assert cache.get(2, 'a') == b'other'
+    assert cache.stats()['hits'] == 2
+
+    cache.clear()
+    assert cache.get(2, 'a') is None
+    assert cache.get_usage() == {'entries': 0, 'bytes': 0}
+
+
+def test_bounded_in_bytes(cache):
+    cache.set(1, 'big', b'x' * 101)
+    for key in 'abc':
+        cache.set(1, key, b'x' * 40)
+
+    assert cache.get(1, 'big') is None
+    assert cache.get(1, 'a') is None
+    assert cache.get_usage() == {'entries': 2, 'bytes': 80}
+
+
+def test_sqlite_error_is_a_miss(tmp_path):
+    # a directory can't be opened as a database
+    cache = SQLiteResponseCache(path=str(tmp_path))
+
+    cache.set(1, 'a', b'value')
+    cache.invalidate(1)
+    cache.clear()
+
+    assert cache.get(1, 'a') is None
+    assert cache.get_usage() == {'entries': 0, 'bytes': 0}
+    assert cache.stats()['misses'] == 1
@@ -0,0 +1,112 @@
+from urllib.parse import quote
+
+import pytest
+
+from api.models import Note, NoteSearch, User
+from database import note_shards
+from utils.json_codec import loads as json_loads
+
+
+def create_notes(user, note_list: list) -> list:
+    """Notes indexed by the triggers, in the creation order."""
+    with note_shards.bind(user.id):
+        return [Note.create(user=user, **note).id for note in note_list]
+
+
+def search_page(api_call, user, query_string: str) -> dict:
+    response = api_call('GET', '/api/v1/notes/search', query_string,
+                        user=user)
+    assert response.status == 200
+    return json_loads(response.body)
+
+
+def search(api_call, user, terms: str) -> list:
+    page = search_page(api_call, user, f'q={quote(terms)}')
+    return [note['id'] for note in page['results']]
+
+
+@pytest.mark.parametrize('terms, query', [
+    ('alpha', '"alpha"'),
+    ('alpha beta', '"alpha" "beta"'),
+    ('alp*', '"alp"*'),
+    ('*', '"*"'),
+    ('a"b OR', '"a""b" "OR"'),
+    ('NEAR(alpha beta)', '"NEAR(alpha" "beta)"'),
+])
+def test_build_query(terms, query):
+    assert NoteSearch.build_query(terms) == query
+
+
+def test_all_words_match(api_call, user):
+    both_id, alpha_id, _ = create_notes(user, [
+        {'name': 'Alpha', 'text': 'beta gamma'},
+        {'name': 'Alpha', 'text': 'gamma'},
+        {'name': 'Beta', 'text': 'gamma'},
+    ])
+
+    assert search(api_call, user, 'alpha beta') == [both_id]
+    assert sorted(search(api_call, user, 'alpha')) == [both_id, alpha_id]
+    assert search(api_call, user, 'alp') == []
+    assert sorted(search(api_call, user, 'alp*')) == [both_id, alpha_id]
+
+
+def test_best_match_first(api_call, user):
+    once_id, many_id = create_notes(user, [
+        {'name': 'Note', 'text': 'delta ' + 'filler ' * 50},
+        {'name': 'Delta', 'text': 'delta delta'},
+    ])
+
+    assert search(api_call, user, 'delta') == [many_id, once_id]
+
+
+@pytest.mark.parametrize('terms', ['"', 'a OR', 'NEAR(a b)', 'name:a', '-a'])
+def test_syntax_is_not_injected(api_call, user, terms):
+    create_notes(user, [{'name': 'Note', 'text': 'Text'}])
+
+    assert search(api_call, user, terms) == []
+
+
+def test_snippet(api_call, user):
+    create_notes(user, [{'name': 'Note', 'text': 'one epsilon two'}])
+
+    page = search_page(api_call, user, 'q=epsilon')
+
+    assert page['results'][0]['snippet'] == 'one <mark>epsilon</mark> two'
+
+
+def test_only_own_available_notes(api_call, user):
+    other_user = User.get_by_id(
+        User.insert(username=f'{user.username}-other', password='!')
+        .execute())
+    create_notes(other_user, [{'name': 'Zeta', 'text': 'Text'}])
+    kept_id, disabled_id, deleted_id = create_notes(
+        user, [{'name': 'Zeta', 'text': 'Text'}] * 3)
+    with note_shards.bind(user.id):
+        note = Note.get_by_id(disabled_id)
+        note.available = False
+        note.save()
+        Note.get_by_id(deleted_id).delete_instance()
+
+    assert search(api_call, user, 'zeta') == [kept_id]
+
+
+def test_next_offset(api_call, user):
+    note_ids = create_notes(user, [{'name': 'Eta', 'text': 'Text'}] * 3)
+
+    page = search_page(api_call, user, 'q=eta&limit=2')
+    assert page['next_offset'] == 2
+    seen_ids = [note['id'] for note in page['results']]
+    page = search_page(api_call, user, 'q=eta&limit=2&offset=2')
+    assert page['next_offset'] is None
+    seen_ids += [note['id'] for note in page['results']]
+
+    assert seen_ids == note_ids
+
+
+@pytest.mark.parametrize('query_string', ['', 'q=', 'q=%20%20', 'q=a&limit=0',
+                                          'q=a&offset=-1'])
+def test_invalid_search(api_call, user, query_string):
+    response = api_call('GET', '/api/v1/notes/search', query_string,
+                        user=user)
+
+    assert response.status == 400
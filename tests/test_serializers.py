@@ -0,0 +1,100 @@
+from datetime import datetime
+from itertools import combinations
+
+import pytest
+from marshmallow import post_dump
+
+from api.endpoints import NoteResource
+from api.models import Note
+from api.serializers import NoteSerializer
+from utils.json_codec import dumps as json_dumps
+from utils.serializers import RowDumper, check_dumper_parity
+
+
+FIELD_NAMES = tuple(NoteSerializer._declared_fields)
+
+# every subset of the fields, in the schema order, as "?fields=" loads them
+PROJECTIONS = [None] + [
+    field_names
+    for size in range(1, len(FIELD_NAMES) + 1)
+    for field_names in combinations(FIELD_NAMES, size)
+]
+
+EDGE_NOTES = [
+    Note(id=1, name='Note', text='Text',
+         creation_date=datetime(2021, 6, 1, 12, 30, 15, 123456)),
+    # isoformat without microseconds
+    Note(id=2, name='', text='',
+         creation_date=datetime(2021, 6, 1, 12, 30, 15)),
+    Note(id=2 ** 53 + 1, name='ñandú 🦤 "quoted" \\ </script>',
+         text='line\nbreak\ttab\x00nul  ',
+         creation_date=datetime(1, 1, 1)),
+    Note(id=0, name='x' * 60, text='Lorem ipsum. ' * 10000,
+         creation_date=datetime(9999, 12, 31, 23, 59, 59, 999999)),
+    # null values, e.g. of a LEFT JOIN
+    Note(id=None, name=None, text=None, creation_date=None),
+]
+
+
+def get_rows(dumper: RowDumper, instances: list) -> list:
+    return [tuple(getattr(instance, column.name)
+                  for column in dumper.columns)
+            for instance in instances]
+
+
+@pytest.mark.parametrize('field_names', PROJECTIONS)
+def test_edge_values_parity(field_names):
+    schema = NoteSerializer(only=field_names)
+    dumper = NoteResource.get_dumper(NoteResource, field_names)
+
+    assert check_dumper_parity(schema, dumper, EDGE_NOTES) == []
+
+
+@pytest.mark.parametrize('field_names', PROJECTIONS)
+def test_database_rows_parity(user, field_names):
+    note_list = [
+        {'name': f'Note {index}', 'text': f'ñandú {index} ' * index}
+        for index in range(5)
+    ]
+    note_list.append({'name': 'Same date', 'text': 'Text',
+                      'creation_date': datetime(2021, 6, 1)})
+    Note.bulk_create_user_notes(user, note_list)
+    schema = NoteSerializer(only=field_names)
+    dumper = NoteResource.get_dumper(NoteResource, field_names)
+
+    rows = list(NoteResource.get_notes_query(NoteResource, user,
+                                             field_names=field_names))
+    instances = list(Note.get_user_notes(user))
+
+    assert len(rows) == len(instances) == len(note_list)
+    assert check_dumper_parity(schema, dumper, instances, rows) == []
+
+
+@pytest.mark.parametrize('field_names', PROJECTIONS)
+def test_page_parity(field_names):
+    schema = NoteSerializer(only=field_names, many=True)
+    dumper = NoteResource.get_dumper(NoteResource, field_names)
+
+    rows = get_rows(dumper, EDGE_NOTES)
+
+    assert json_dumps([dumper(row) for row in rows]) == schema.dumps(
+        EDGE_NOTES)
+
+
+def test_extra_fields_not_dumped():
+    dumper = NoteResource.get_dumper(NoteResource, ('name', ))
+
+    row, = get_rows(dumper, EDGE_NOTES[:1])
+
+    assert dumper.field_names == ('name', 'creation_date', 'id')
+    assert dumper(row) == {'name': 'Note'}
+
+
+def test_dump_processors_rejected():
+    class ProcessedNoteSerializer(NoteSerializer):
+        @post_dump
+        def add_title(self, data: dict, **kwargs) -> dict:
+            return dict(data, title=data.get('name'))
+
+    with pytest.raises(ValueError):
+        RowDumper(ProcessedNoteSerializer(), Note)
@@ -0,0 +1,222 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+import pytest
+from peewee import Model, SqliteDatabase
+
+from migrations import migrate
+from utils.sharding import (IdAllocator, ShardNotBound, ShardRouter,
+                            get_shard_index, rebalance_shards)
+
+
+@pytest.fixture
+def create_databases(tmp_path):
+    databases = list()
+
+    def create(*names: str) -> list:
+        new_databases = [SqliteDatabase(str(tmp_path / f'{name}.sqlite3'))
+                         for name in names]
+        databases.extend(new_databases)
+        return new_databases
+
+    yield create
+    for database in databases:
+        database.close()
+
+
+def test_shard_index():
+    indexes = [get_shard_index(user_id, 4) for user_id in range(1, 4001)]
+
+    assert all(get_shard_index(user_id, 1) == 0 for user_id in range(100))
+    # stable, not salted by process
+    assert indexes[:8] == [get_shard_index(user_id, 4)
+                           for user_id in range(1, 9)]
+    counts = Counter(indexes)
+    assert sorted(counts) == [0, 1, 2, 3]
+    assert all(800 < count < 1200 for count in counts.values())
+
+
+def test_router_binding(create_databases):
+    databases = create_databases('shard0', 'shard1', 'shard2')
+    router = ShardRouter(databases)
+    user_id = 7
+    database = databases[get_shard_index(user_id, 3)]
+
+    assert router.get_database(user_id) is database
+    with pytest.raises(ShardNotBound):
+        router.obj
+    with router.bind(user_id):
+        assert router.obj is database
+        with router.bind_database(databases[0]):
+            assert router.obj is databases[0]
+        assert router.obj is database
+        # bound by thread
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            with pytest.raises(ShardNotBound):
+                executor.submit(lambda: router.obj).result()
+    assert list(router) == databases
+
+
+def test_single_shard_is_always_bound(create_databases):
+    database, = create_databases('shard0')
+    router = ShardRouter([database])
+
+    assert router.obj is database
+    assert router.get_database(42) is database
+
+
+class Item(Model):
+    class Meta:
+        table_name = 'item'
+
+
+@pytest.fixture
+def id_allocator(create_databases):
+    directory, *shards = create_databases('directory', 'shard0', 'shard1')
+    migrate(directory)
+    for shard in shards:
+        for table in ('item', 'item_archive'):
+            shard.execute_sql(
+                f'CREATE TABLE "{table}" ("id" INTEGER PRIMARY KEY)')
+    shards[0].execute_sql('INSERT INTO "item" VALUES (5)')
+    shards[1].execute_sql('INSERT INTO "item_archive" VALUES (12)')
+
+    def create() -> IdAllocator:
+        return IdAllocator(directory, Item, 10, ShardRouter(shards))
+
+    return create
+
+
+def test_ids_start_after_the_archived_rows(id_allocator):
+    allocator = id_allocator()
+
+    assert allocator.get_ids(3) == [13, 14, 15]
+    assert allocator.get_ids(10) == list(range(16, 26))
+
+
+def test_ids_are_unique_across_threads_and_processes(id_allocator):
+    # each allocator is a process, taking its own blocks
+    allocators = [id_allocator() for _ in range(3)]
+
+    def get_ids(index: int) -> list:
+        allocator = allocators[index % len(allocators)]
+        return list(chain.from_iterable(allocator.get_ids(count)
+                                        for count in (1, 7, 3) * 20))
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        id_lists = list(executor.map(get_ids, range(12)))
+
+    ids = list(chain.from_iterable(id_lists))
+    assert len(ids) == len(set(ids)) == 12 * 220
+    assert min(ids) == 13
+    assert all(id_list == sorted(id_list) for id_list in id_lists)
+
+
+def test_forked_process_takes_a_new_block(id_allocator):
+    allocator = id_allocator()
+    parent_ids = allocator.get_ids(1)
+
+    # as seen by a child process, with the block of its parent
+    allocator._pid = None
+    child_ids = allocator.get_ids(1)
+
+    assert parent_ids == [13]
+    assert child_ids == [23]
+
+
+@pytest.fixture
+def note_shards(create_databases):
+    old_database, = create_databases('db')
+    new_databases = create_databases('shard0', 'shard1', 'shard2')
+    for database in (old_database, *new_databases):
+        migrate(database)
+
+    user_ids = range(1, 31)
+    for user_id in user_ids:
+        for name in ('alpha', 'beta'):
+            old_database.execute_sql(
+                'INSERT INTO "note" ("available", "creation_date", "name", '
+                '"text", "user_id") VALUES (1, 0, ?, ?, ?)',
+                (name, 'Text', user_id))
+        old_database.execute_sql(
+            'INSERT INTO "note_archive" VALUES (?, 0, 0, 0, ?, ?, ?, 0)',
+            (1000 + user_id, 'archived', 'Text', user_id))
+        old_database.execute_sql('INSERT INTO "note_version" VALUES (?, 1)',
+                                 (user_id, ))
+    return old_database, new_databases, user_ids
+
+
+TABLES = {
+    'note': 'user_id',
+    'note_archive': 'user_id',
+    'note_version': 'user_id',
+}
+
+
+def select_user_ids(database: SqliteDatabase, table: str) -> list:
+    cursor = database.execute_sql(f'SELECT "user_id" FROM "{table}"')
+    return sorted(user_id for user_id, in cursor.fetchall())
+
+
+def search(database: SqliteDatabase, terms: str) -> list:
+    cursor = database.execute_sql(
+        'SELECT "rowid" FROM "note_search" WHERE "note_search" MATCH ? '
+        'ORDER BY "rowid"', (terms, ))
+    return [rowid for rowid, in cursor.fetchall()]
+
+
+def check_layout(old_database, new_databases, user_ids) -> None:
+    assert all(not select_user_ids(old_database, table) for table in TABLES)
+    assert search(old_database, 'alpha') == []
+    for index, database in enumerate(new_databases):
+        shard_user_ids = [user_id for user_id in user_ids
+                          if get_shard_index(user_id, 3) == index]
+        assert select_user_ids(database, 'note') == sorted(shard_user_ids * 2)
+        assert select_user_ids(database, 'note_archive') == shard_user_ids
+        assert select_user_ids(database, 'note_version') == shard_user_ids
+        cursor = database.execute_sql(
+            'SELECT "id" FROM "note" WHERE "name" = ? ORDER BY "id"',
+            ('alpha', ))
+        assert search(database, 'alpha') == [row[0] for row in cursor]
+        database.execute_sql(
+            'INSERT INTO "note_search" ("note_search", "rank") '
+            'VALUES (\'integrity-check\', 0)')
+
+
+def test_rebalance(note_shards):
+    old_database, new_databases, user_ids = note_shards
+
+    moved_rows = rebalance_shards([old_database], new_databases, TABLES)
+
+    assert moved_rows == {'note': 60, 'note_archive': 30,
+                          'note_version': 30, 'users': 30}
+    check_layout(old_database, new_databases, user_ids)
+    # nothing left to move
+    moved_rows = rebalance_shards([old_database], new_databases, TABLES)
+    assert moved_rows['users'] == 0
+
+
+def test_interrupted_rebalance(note_shards):
+    old_database, new_databases, user_ids = note_shards
+    user_id = user_ids[0]
+    target = new_databases[get_shard_index(user_id, 3)]
+    rebalance_shards([old_database], new_databases, TABLES)
+    # as if interrupted after copying the user to its new shard, before
+    # deleting it from the old one, with a new note in the old one
+    old_database.execute_sql(
+        'INSERT INTO "note" ("id", "available", "creation_date", "name", '
+        '"text", "user_id") VALUES (2000, 1, 0, ?, ?, ?)',
+        ('gamma', 'Text', user_id))
+    cursor = target.execute_sql('SELECT * FROM "note" WHERE "user_id" = ?',
+                                (user_id, ))
+    for row in cursor.fetchall():
+        old_database.execute_sql(
+            'INSERT INTO "note" VALUES (?, ?, ?, ?, ?, ?, ?)', row)
+
+    moved_rows = rebalance_shards([old_database], new_databases, TABLES)
+
+    assert moved_rows['users'] == 1
+    assert moved_rows['note'] == 3
+    assert len(search(target, 'gamma')) == 1
+    assert select_user_ids(old_database, 'note') == []
@@ -0,0 +1,81 @@
+import pytest
+
+from api.endpoints import NoteResource
+from api.models import Note
+from api.serializers import NoteListQuerySerializer
+from utils.json_codec import loads as json_loads
+
+
+def get_page(api_call, user, query_string: str) -> dict:
+    response = api_call('GET', '/api/v1/notes', query_string, user=user)
+    assert response.status == 200
+    return json_loads(response.body)
+
+
+@pytest.mark.parametrize('fields, message', [
+    ('id,owner', 'Unknown fields: owner.'),
+    ('password,id,user', 'Unknown fields: password, user.'),
+    ('', 'Must have field names.'),
+    (' , ', 'Must have field names.'),
+])
+def test_invalid_fields(api_call, user, fields, message):
+    response = api_call('GET', '/api/v1/notes', f'fields={fields}',
+                        user=user)
+
+    assert response.status == 400
+    assert json_loads(response.body) == {'fields': [message]}
+
+
+@pytest.mark.parametrize('stream', ['false', 'true'])
+def test_only_the_requested_fields(api_call, user, stream):
+    note_ids = Note.bulk_create_user_notes(
+        user, [{'name': f'Note {index}', 'text': 'Text'}
+               for index in range(3)])
+
+    seen_ids = list()
+    query_string = f'fields=name,id&limit=2&stream={stream}'
+    while True:
+        page = get_page(api_call, user, query_string)
+        # in the schema order, the cursor fields aren't added
+        assert all(list(note) == ['id', 'name'] for note in page['results'])
+        seen_ids += [note['id'] for note in page['results']]
+        if page['next_cursor'] is None:
+            break
+        query_string = (f'fields=name,id&limit=2&stream={stream}'
+                        f'&cursor={page["next_cursor"]}')
+
+    assert seen_ids == note_ids
+
+
+def test_without_cursor_fields(api_call, user):
+    Note.bulk_create_user_notes(user, [{'name': 'First', 'text': 'Text'},
+                                       {'name': 'Second', 'text': 'Text'}])
+
+    page = get_page(api_call, user, 'fields=name&limit=1')
+    assert page['results'] == [{'name': 'First'}]
+    page = get_page(api_call, user,
+                    f'fields=name&limit=1&cursor={page["next_cursor"]}')
+    assert page['results'] == [{'name': 'Second'}]
+
+
+def test_same_fields_same_tuple():
+    serializer = NoteListQuerySerializer()
+
+    field_names = serializer.load({'fields': 'text,id'})['field_names']
+
+    assert field_names == ('id', 'text')
+    assert serializer.load({'fields': ' id, text,id'})['field_names'] \
+        == field_names
+
+
+def test_dumper_by_field_subset(api_call, user):
+    Note.bulk_create_user_notes(user, [{'name': 'Note', 'text': 'Text'}])
+    NoteResource.dumpers.pop(('id', 'text'), None)
+
+    get_page(api_call, user, 'fields=text,id')
+    dumper = NoteResource.dumpers[('id', 'text')]
+    get_page(api_call, user, 'fields=id,text,id')
+
+    assert NoteResource.get_dumper(NoteResource, ('id', 'text')) is dumper
+    assert NoteResource.get_dumper(NoteResource) is NoteResource.dumper
+    assert NoteResource.get_dumper(NoteResource, ('id', )) is not dumper
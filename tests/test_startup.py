@@ -0,0 +1,30 @@
+import pytest
+
+from settings import STARTUP
+from utils.startup import (get_module_time, get_startup_time,
+                           parse_import_times)
+
+
+def test_parse_import_times():
+    output = '\n'.join([
+        'import time: self [us] | cumulative | imported package',
+        'import time:       150 |        150 |   bottle',
+        'import time:      1200 |       2000 | server',
+        'Traceback (most recent call last):',
+    ])
+
+    import_times = parse_import_times(output)
+
+    assert [(import_time.module, import_time.depth)
+            for import_time in import_times] == [('bottle', 1),
+                                                 ('server', 0)]
+    assert get_module_time(import_times, 'server') == 0.002
+    assert get_module_time(import_times, 'client') == 0.0
+
+
+@pytest.mark.parametrize('module, budget',
+                         STARTUP.get('IMPORT_BUDGETS').items())
+def test_import_budget(module, budget):
+    import_times = get_startup_time(module)
+
+    assert 0 < get_module_time(import_times, module) <= budget
@@ -0,0 +1,151 @@
+from time import monotonic
+
+import pytest
+from marshmallow import ValidationError
+
+from api.models import User, user_cache
+from auth.serializers import JWTLoginSerializer
+from settings import USER_CACHE
+from utils.hashers import password_hasher
+from utils.jwt_auth import token_cache
+
+
+TTL = USER_CACHE.get('TTL').total_seconds()
+
+
+def test_cached_user(user):
+    assert User.get_user(user.username) is User.get_user(user.username)
+
+
+def test_stale_user_expires(user, monkeypatch):
+    User.get_user(user.username)
+    # no signals, the identity map isn't updated
+    User.update(available=False).where(User.id == user.id).execute()
+
+    assert User.get_user(user.username) is not None
+    now = monotonic()
+    monkeypatch.setattr('utils.cache.monotonic', lambda: now + TTL + 1)
+    assert User.get_user(user.username) is None
+
+
+def test_user_not_cached(user):
+    cached_user = User.get_user(user.username)
+    User.update(available=False).where(User.id == user.id).execute()
+
+    assert User.get_user(user.username, cached=False) is None
+    assert user_cache.get(('username', user.username)) is None
+    assert cached_user.available
+
+
+def test_login_reads_the_user_again(user):
+    # cached with the password "!", which can't log in
+    User.get_user(user.username)
+    password = password_hasher.hash('secret')
+    User.update(password=password).where(User.id == user.id).execute()
+
+    data = JWTLoginSerializer().load({'username': user.username,
+                                      'password': 'secret'})
+
+    assert 'access_token' in data
+
+
+def test_login_of_disabled_user(user):
+    password = password_hasher.hash('secret')
+    User.update(password=password).where(User.id == user.id).execute()
+    User.get_user(user.username)
+    User.update(available=False).where(User.id == user.id).execute()
+
+    with pytest.raises(ValidationError) as error:
+        JWTLoginSerializer().load({'username': user.username,
+                                   'password': 'secret'})
+    assert 'No active account' in str(error.value)
+
+
+def test_verified_token_expires_with_the_user(api_call, user, monkeypatch):
+    assert api_call('GET', '/api/v1/notes', user=user).status == 200
+    User.update(available=False).where(User.id == user.id).execute()
+
+    now = monotonic()
+    monkeypatch.setattr('utils.cache.monotonic', lambda: now + TTL + 1)
+
+    assert api_call('GET', '/api/v1/notes', user=user).status == 401
+
+
+def test_disabled_user_is_evicted(user):
+    User.get_user(user.username)
+    User.get_user_by_id(user.id)
+
+    user.available = False
+    user.save()
+
+    assert user_cache.get(('username', user.username)) is None
+    assert user_cache.get(('id', user.id)) is None
+    assert User.get_user(user.username) is None
+    assert User.get_user_by_id(user.id) is None
+
+
+def test_deleted_user_is_evicted(user):
+    User.get_user(user.username)
+    User.get_user_by_id(user.id)
+
+    user.delete_instance()
+
+    assert user_cache.get(('username', user.username)) is None
+    assert User.get_user(user.username) is None
+    assert User.get_user_by_id(user.id) is None
+
+
+def test_changed_password_is_cached(user):
+    cached_user = User.get_user(user.username)
+
+    user.set_password('secret')
+    user.save()
+
+    assert User.get_user(user.username) is not cached_user
+    assert User.get_user(user.username).check_password('secret')
+    data = JWTLoginSerializer().load({'username': user.username,
+                                      'password': 'secret'})
+    assert 'access_token' in data
+    with pytest.raises(ValidationError):
+        JWTLoginSerializer().load({'username': user.username,
+                                   'password': '!'})
+
+
+def cached_tokens(user: User) -> list:
+    return [key for key, (value, _) in token_cache._entries.items()
+            if value[1].id == user.id]
+
+
+def test_disabled_user_tokens(api_call, user):
+    assert api_call('GET', '/api/v1/notes', user=user).status == 200
+    assert cached_tokens(user)
+
+    user.available = False
+    user.save()
+
+    assert not cached_tokens(user)
+    assert api_call('GET', '/api/v1/notes', user=user).status == 401
+
+
+def test_deleted_user_tokens(api_call, user):
+    assert api_call('GET', '/api/v1/notes', user=user).status == 200
+
+    user.delete_instance()
+
+    assert not cached_tokens(user)
+    assert api_call('GET', '/api/v1/notes', user=user).status == 401
+
+
+def test_changed_password_tokens(api_call, user):
+    assert api_call('GET', '/api/v1/notes', user=user).status == 200
+    stale_user = token_cache.get(cached_tokens(user)[0])[1]
+
+    user.set_password('secret')
+    user.save()
+
+    # verified again, with the saved user
+    assert not cached_tokens(user)
+    assert api_call('GET', '/api/v1/notes', user=user).status == 200
+    cached_user = token_cache.get(cached_tokens(user)[0])[1]
+    assert cached_user is not stale_user
+    assert cached_user.password == user.password
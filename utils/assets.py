@@ -0,0 +1,189 @@
+"""Static assets of the client, served from memory.
+
+At startup every file of the static root is read, fingerprinted with
+its content hash ("js/main.js" is also "js/main.<hash>.js") and
+compressed once (gzip, and brotli with the "brotli" package). The pages
+are rewritten to reference the fingerprinted URLs, which are cached by
+the browsers for good: a new content is a new URL.
+"""
+import gzip
+import os
+import re
+from hashlib import blake2b
+from mimetypes import guess_type
+from typing import Dict, NamedTuple
+
+from bottle import HTTPError, HTTPResponse, request
+
+from utils.compression import brotli, choose_encoding
+from utils.response import ResponseNotModified, etag_matches
+
+
+class Asset(NamedTuple):
+    content_type: str
+    # content hash
+    digest: str
+    # body by content encoding, "identity" is the original one
+    bodies: Dict[str, bytes]
+
+
+class AssetPipeline:
+    """Fingerprinted static files and the pages referencing them."""
+
+    def __init__(self, assets_settings: dict) -> None:
+        """
+        Args:
+            assets_settings (dict): ASSETS settings.
+        """
+        self.root = assets_settings.get('ROOT')
+        self.url = assets_settings.get('URL')
+        self.templates = assets_settings.get('TEMPLATES')
+        self.max_age = int(assets_settings.get('MAX_AGE').total_seconds())
+        self.min_size = assets_settings.get('MIN_SIZE')
+        self.content_types = tuple(assets_settings.get('CONTENT_TYPES'))
+        self.reload = assets_settings.get('RELOAD')
+        # served file name -> asset, the original names too
+        self.files: Dict[str, Asset] = dict()
+        # original file name -> fingerprinted file name
+        self.manifest: Dict[str, str] = dict()
+        self.pages: Dict[str, Asset] = dict()
+
+    def build_asset(self, path: str, data: bytes) -> Asset:
+        """Hash and compress a file.
+
+        Args:
+            path (str): File path, for its content type.
+            data (bytes): File content.
+
+        Returns:
+            Asset: Asset, with the compressed bodies only if smaller.
+        """
+        content_type, _ = guess_type(path)
+        content_type = content_type or 'application/octet-stream'
+        if content_type.startswith('text/'):
+            content_type += '; charset=UTF-8'
+        bodies = {'identity': data}
+        if (content_type.startswith(self.content_types)
+                and len(data) >= self.min_size):
+            bodies['gzip'] = gzip.compress(data, compresslevel=9, mtime=0)
+            if brotli:
+                bodies['br'] = brotli.compress(data, quality=11)
+        bodies = {encoding: body for encoding, body in bodies.items()
+                  if len(body) <= len(data)}
+        digest = blake2b(data, digest_size=8).hexdigest()
+        return Asset(content_type, digest, bodies)
+
+    def load(self) -> 'AssetPipeline':
+        """Read the static files and the pages again.
+
+        Returns:
+            AssetPipeline: Self.
+        """
+        files = dict()
+        manifest = dict()
+        for directory, _, file_names in os.walk(self.root):
+            for file_name in file_names:
+                path = os.path.join(directory, file_name)
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                with open(path, 'rb') as file:
+                    asset = self.build_asset(path, file.read())
+                stem, extension = os.path.splitext(name)
+                fingerprinted_name = f'{stem}.{asset.digest}{extension}'
+                files[name] = files[fingerprinted_name] = asset
+                manifest[name] = fingerprinted_name
+
+        pages = dict()
+        if os.path.isdir(self.templates):
+            for file_name in os.listdir(self.templates):
+                path = os.path.join(self.templates, file_name)
+                if not file_name.endswith('.html') or os.path.isdir(path):
+                    continue
+                with open(path, encoding='utf-8') as file:
+                    html = self.rewrite(file.read(), manifest)
+                pages[file_name] = self.build_asset(path,
+                                                    html.encode('utf-8'))
+        self.files, self.manifest, self.pages = files, manifest, pages
+        return self
+
+    def rewrite(self, html: str, manifest: Dict[str, str]) -> str:
+        """Replace the static file URLs by the fingerprinted ones,
+        in the "src" and "href" attributes.
+
+        Args:
+            html (str): Page.
+            manifest (Dict[str, str]): Fingerprinted file names.
+
+        Returns:
+            str: Rewritten page.
+        """
+        pattern = re.compile(
+            r'''((?:src|href)\s*=\s*["'])''' + re.escape(self.url)
+            + r'''([^"'?#]+)''')
+
+        def replace(match: re.Match) -> str:
+            name = manifest.get(match.group(2), match.group(2))
+            return f'{match.group(1)}{self.url}{name}'
+
+        return pattern.sub(replace, html)
+
+    def serve(self, asset: Asset, cache_control: str) -> HTTPResponse:
+        """Respond with the best encoding accepted by the client.
+
+        Args:
+            asset (Asset): Asset.
+            cache_control (str): "Cache-Control" header.
+
+        Returns:
+            HTTPResponse: Asset body, or 304 if the client has it.
+        """
+        encoding = choose_encoding(request.get_header('Accept-Encoding', ''),
+                                   tuple(asset.bodies)) or 'identity'
+        suffix = '' if encoding == 'identity' else f'-{encoding}'
+        headers = {
+            'ETag': f'"{asset.digest}{suffix}"',
+            'Cache-Control': cache_control,
+        }
+        if len(asset.bodies) > 1:
+            headers['Vary'] = 'Accept-Encoding'
+        if etag_matches(request.get_header('If-None-Match'), headers['ETag']):
+            return ResponseNotModified(headers=headers)
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        headers['Content-Type'] = asset.content_type
+        return HTTPResponse(asset.bodies[encoding], **headers)
+
+    def serve_file(self, name: str) -> HTTPResponse:
+        """Serve a static file, for good if it's fingerprinted.
+
+        Args:
+            name (str): File name, relative to the static root.
+
+        Returns:
+            HTTPResponse: File, 404 if it doesn't exist.
+        """
+        asset = self.files.get(name)
+        if asset is None:
+            return HTTPError(404, 'File does not exist.')
+        if name in self.manifest:
+            # the original name, its content can change
+            cache_control = 'public, no-cache'
+        else:
+            cache_control = f'public, max-age={self.max_age}, immutable'
+        return self.serve(asset, cache_control)
+
+    def serve_page(self, name: str) -> HTTPResponse:
+        """Serve a page, revalidated on every load, its fingerprinted
+        files are then taken from the browser cache.
+
+        Args:
+            name (str): Template file name.
+
+        Returns:
+            HTTPResponse: Page, 404 if it doesn't exist.
+        """
+        if self.reload:
+            self.load()
+        asset = self.pages.get(name)
+        if asset is None:
+            return HTTPError(404, 'File does not exist.')
+        return self.serve(asset, 'no-cache')
@@ -0,0 +1,123 @@
+"""Database work run in a dedicated thread, off the requests.
+
+The requests made while the task runs are coalesced in a single next run,
+so the task must handle everything left to do, e.g. the pending rows.
+"""
+import os
+from threading import Condition, Thread
+from time import sleep
+from typing import Any, Callable, Optional
+
+from peewee import Database
+
+
+class BackgroundTask:
+    """Run a function in a dedicated thread each time it's requested."""
+
+    def __init__(self, database: Database, function: Callable[[], Any],
+                 name: str = 'background-task',
+                 retry_interval: float = 1.0) -> None:
+        """
+        Args:
+            database (Database): Database instance, its connection of the
+                                 thread is closed after each run.
+            function (Callable[[], Any]): Task.
+            name (str): Thread name. Defaults to "background-task".
+            retry_interval (float): Seconds before running it again when
+                                    it fails, e.g. the database is locked.
+                                    Defaults to 1.0.
+        """
+        self.database = database
+        self.function = function
+        self.name = name
+        self.retry_interval = retry_interval
+        self.runs = 0
+        self.errors = 0
+        self._requested = 0
+        self._done = 0
+        self._pid: Optional[int] = None
+        self._thread: Optional[Thread] = None
+        self._stop = False
+        self._condition = Condition()
+
+    def request(self) -> None:
+        """Run the task soon, without waiting for it. The thread is
+        started on first use, and again in a forked worker.
+        """
+        with self._condition:
+            if self._pid != os.getpid():
+                self._requested = self._done = 0
+                self._stop = False
+                self._thread = Thread(target=self.run, name=self.name,
+                                      daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+            self._requested += 1
+            self._condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the task ran after the last request.
+
+        Args:
+            timeout (float, None): Max seconds waiting. Defaults to None.
+
+        Returns:
+            bool: False if it timed out.
+        """
+        with self._condition:
+            requested = self._requested
+            return self._condition.wait_for(
+                lambda: self._done >= requested, timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Run the pending requests and stop the thread, e.g. before
+        closing the database connections. The next request starts it
+        again.
+
+        Args:
+            timeout (float, None): Max seconds waiting for the thread.
+                                   Defaults to None.
+        """
+        with self._condition:
+            if self._pid != os.getpid():
+                return
+            self._stop = True
+            self._pid = None
+            thread = self._thread
+            self._condition.notify_all()
+        thread.join(timeout)
+
+    def run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._requested > self._done or self._stop)
+                if self._requested == self._done:
+                    return
+                requested = self._requested
+            try:
+                self.function()
+            except Exception:
+                # run again later, the request is still pending
+                self.errors += 1
+                sleep(self.retry_interval)
+                continue
+            finally:
+                if not self.database.is_closed():
+                    self.database.close()
+            with self._condition:
+                self.runs += 1
+                self._done = requested
+                self._condition.notify_all()
+
+    def stats(self) -> dict:
+        """Task counters, by process.
+
+        Returns:
+            dict: Successful runs, failed runs and pending requests.
+        """
+        return {
+            'runs': self.runs,
+            'errors': self.errors,
+            'pending': self._requested - self._done,
+        }
@@ -0,0 +1,118 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """Thread safe in-process LRU cache, bounded in size,
+    with an optional time to live for every entry.
+    """
+
+    def __init__(self, maxsize: int = 1024,
+                 ttl: Optional[float] = None) -> None:
+        """
+        Args:
+            maxsize (int): Max number of entries, 0 disables the cache.
+                           Defaults to 1024.
+            ttl (float, None): Default time to live in seconds.
+                               Defaults to None (no expiration).
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get an entry and mark it as the most recently used.
+
+        Args:
+            key (Hashable): Entry key.
+            default (Any): Returned when the entry doesn't exist
+                           or is expired. Defaults to None.
+
+        Returns:
+            Any: Entry value.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any,
+            ttl: Optional[float] = None) -> None:
+        """Add or replace an entry, evicting the least recently used.
+
+        Args:
+            key (Hashable): Entry key.
+            value (Any): Entry value.
+            ttl (float, None): Time to live in seconds.
+                               Defaults to None (cache TTL).
+        """
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """Remove an entry, if this is.
+
+        Args:
+            key (Hashable): Entry key.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_if(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Remove the entries matching the predicate.
+
+        Args:
+            predicate (Callable[[Hashable, Any], bool]): Called with
+                                                         key and value.
+
+        Returns:
+            int: Number of removed entries.
+        """
+        with self._lock:
+            keys = [key for key, (value, _) in self._entries.items()
+                    if predicate(key, value)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Cache counters.
+
+        Returns:
+            dict: Hits, misses, current size and max size.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
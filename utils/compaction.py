@@ -0,0 +1,266 @@
+"""Compaction of the soft-deleted rows.
+
+The rows with "available" False, deleted longer than the retention,
+are moved to "<table>_archive" in small transactions, so the hot tables
+and their indexes keep only live rows. The free pages are then returned
+to the file system with an incremental vacuum.
+
+Run with "python manage.py compact".
+"""
+from datetime import datetime, timedelta
+from threading import Event
+from time import monotonic, sleep
+from typing import (Callable, Dict, Iterator, List, NamedTuple, Optional,
+                    Tuple)
+
+from peewee import Column, Database, Field, ModelSelect, Table, Value
+
+from database import get_databases
+from settings import COMPACTION
+from utils.sharding import ShardRouter
+
+
+class CompactionReport(NamedTuple):
+    # table name -> rows moved to its archive table
+    moved_rows: Dict[str, int]
+    reclaimed_pages: int
+    reclaimed_bytes: int
+    # pages still free, no incremental vacuum without "auto_vacuum"
+    free_pages: int
+    seconds: float
+
+
+class Compactor:
+    """Archive the soft-deleted rows of the registered models,
+    in registration order.
+    """
+
+    def __init__(self, databases: List[Database],
+                 compaction_settings: dict) -> None:
+        """
+        Args:
+            databases (List[Database]): Databases to vacuum, the directory
+                                        and the shards.
+            compaction_settings (dict): COMPACTION settings.
+        """
+        self.databases = databases
+        self.retention = compaction_settings.get('RETENTION')
+        self.batch_size = compaction_settings.get('BATCH_SIZE')
+        self.vacuum_pages = compaction_settings.get('VACUUM_PAGES')
+        self.pause = compaction_settings.get('PAUSE')
+        self.models: List[Tuple[type, Tuple[Field, ...]]] = list()
+
+    def register(self, model: type, dependents: Tuple[Field, ...] = ()
+                 ) -> None:
+        """Archive the deleted rows of a model.
+
+        Args:
+            model (type): BaseModel subclass, with a "<table>_archive"
+                          table of the same columns plus "archive_date".
+            dependents (Tuple[Field, ...]): Foreign keys of the rows
+                                            archived with it, deleted
+                                            or not. Defaults to ().
+        """
+        self.models.append((model, tuple(dependents)))
+
+    def move_rows(self, model: type, where, archive_date: datetime) -> int:
+        """Copy the rows to the archive table and delete them.
+
+        Args:
+            model (type): Model.
+            where (Expression): Rows to move.
+            archive_date (datetime): Archive date of the rows.
+
+        Returns:
+            int: Number of moved rows.
+
+        Raises:
+            IntegrityError: If a row is already archived, the caller's
+                            transaction is rolled back.
+        """
+        fields = model._meta.sorted_fields
+        archive_table = Table(f'{model._meta.table_name}_archive')
+        columns = [Column(archive_table, name) for name in
+                   [field.column_name for field in fields] + ['archive_date']]
+        query = model.select(*fields, Value(archive_date)).where(where)
+        # the IDs are never reused, a conflict is an error,
+        # the archived row is not overwritten
+        insert = archive_table.insert(query, columns=columns)
+        database = model._meta.database
+        database.execute(insert)
+        return database.execute(model.delete().where(where)).rowcount
+
+    def get_shards(self, model: type) -> Iterator[Database]:
+        """Bind in turn every shard of a sharded model.
+
+        Args:
+            model (type): Model.
+
+        Yields:
+            Iterator[Database]: Model database, bound if it's a shard.
+        """
+        database = model._meta.database
+        if isinstance(database, ShardRouter):
+            yield from database
+        else:
+            yield database
+
+    def select_candidates(self, model: type, cutoff: datetime
+                          ) -> ModelSelect:
+        """Select the IDs of the next batch of rows to archive.
+
+        Args:
+            model (type): BaseModel subclass.
+            cutoff (datetime): Max deletion date.
+
+        Returns:
+            ModelSelect: Row IDs, the oldest deletions first.
+        """
+        # "deletion_date IS NOT NULL" so the partial index is used
+        return (model.select(model.id)
+                .where(model.deletion_date.is_null(False),
+                       model.deletion_date < cutoff,
+                       model.available == False)
+                .order_by(model.deletion_date)
+                .limit(self.batch_size))
+
+    def archive_model(self, model: type, dependents: Tuple[Field, ...],
+                      cutoff: datetime) -> Dict[str, int]:
+        """Move the rows deleted before the cutoff, by batches,
+        each one in its own transaction, by database: the dependent
+        rows are moved first, so a batch interrupted between them
+        is finished on the next run.
+
+        Args:
+            model (type): BaseModel subclass.
+            dependents (Tuple[Field, ...]): Foreign keys of the rows
+                                            archived with it.
+            cutoff (datetime): Max deletion date.
+
+        Returns:
+            Dict[str, int]: Moved rows by table.
+        """
+        moved_rows = {model._meta.table_name: 0}
+        for field in dependents:
+            moved_rows.setdefault(field.model._meta.table_name, 0)
+
+        candidates = self.select_candidates(model, cutoff)
+        while True:
+            archive_date = datetime.now()
+            ids = [pk for pk, in candidates.tuples()]
+            if not ids:
+                break
+            for field in dependents:
+                for database in self.get_shards(field.model):
+                    with database.atomic('IMMEDIATE'):
+                        moved_rows[field.model._meta.table_name] += (
+                            self.move_rows(field.model, field.in_(ids),
+                                           archive_date))
+            with model._meta.database.atomic('IMMEDIATE'):
+                moved_rows[model._meta.table_name] += self.move_rows(
+                    model, model.id.in_(ids), archive_date)
+            if len(ids) < self.batch_size:
+                break
+            sleep(self.pause)
+        return moved_rows
+
+    def get_pragma(self, database: Database, name: str) -> int:
+        return database.execute_sql(f'PRAGMA {name}').fetchone()[0]
+
+    def vacuum(self, database: Database) -> int:
+        """Release the free pages with incremental vacuum steps.
+
+        Args:
+            database (Database): Database instance.
+
+        Returns:
+            int: Released pages, 0 if "auto_vacuum" is not incremental.
+        """
+        # 2: incremental
+        if self.get_pragma(database, 'auto_vacuum') != 2:
+            return 0
+        released_pages = 0
+        while True:
+            free_pages = self.get_pragma(database, 'freelist_count')
+            if not free_pages:
+                break
+            # "execute" steps the pragma once, releasing a single page
+            database.connection().executescript(
+                f'PRAGMA incremental_vacuum({self.vacuum_pages});')
+            released_pages += (free_pages
+                               - self.get_pragma(database, 'freelist_count'))
+            if free_pages <= self.vacuum_pages:
+                break
+            sleep(self.pause)
+        return released_pages
+
+    def full_vacuum(self) -> None:
+        """Rebuild the databases with incremental "auto_vacuum",
+        needed once by the databases created without it.
+        Each one is locked until it ends.
+        """
+        for database in self.databases:
+            database.execute_sql('PRAGMA auto_vacuum = INCREMENTAL')
+            database.execute_sql('VACUUM')
+
+    def compact(self, retention: Optional[timedelta] = None
+                ) -> CompactionReport:
+        """Archive the deleted rows and release the free pages.
+
+        Args:
+            retention (timedelta, None): Age of the deleted rows to archive.
+                                         Defaults to None (settings).
+
+        Returns:
+            CompactionReport: Moved rows and reclaimed space.
+        """
+        start = monotonic()
+        if retention is None:
+            retention = self.retention
+        cutoff = datetime.now() - retention
+
+        moved_rows = dict()
+        for model, dependents in self.models:
+            for _ in self.get_shards(model):
+                for table, count in self.archive_model(model, dependents,
+                                                       cutoff).items():
+                    moved_rows[table] = moved_rows.get(table, 0) + count
+
+        reclaimed_pages = reclaimed_bytes = free_pages = 0
+        for database in self.databases:
+            pages = self.vacuum(database)
+            reclaimed_pages += pages
+            reclaimed_bytes += pages * self.get_pragma(database, 'page_size')
+            free_pages += self.get_pragma(database, 'freelist_count')
+        return CompactionReport(
+            moved_rows=moved_rows,
+            reclaimed_pages=reclaimed_pages,
+            reclaimed_bytes=reclaimed_bytes,
+            free_pages=free_pages,
+            seconds=monotonic() - start,
+        )
+
+    def run_periodically(self, interval: timedelta, stop: Event,
+                         callback: Callable[[CompactionReport], None],
+                         retention: Optional[timedelta] = None) -> None:
+        """Compact on every interval until stopped.
+
+        Args:
+            interval (timedelta): Time between compactions.
+            stop (Event): Set it to stop, e.g. on SIGTERM.
+            callback (Callable[[CompactionReport], None]): Called with
+                                                           each report.
+            retention (timedelta, None): Age of the deleted rows to archive.
+                                         Defaults to None (settings).
+        """
+        while not stop.is_set():
+            try:
+                callback(self.compact(retention=retention))
+            finally:
+                for database in self.databases:
+                    if not database.is_closed():
+                        database.close()
+            stop.wait(interval.total_seconds())
+
+
+compactor = Compactor(get_databases(), COMPACTION)
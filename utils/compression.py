@@ -0,0 +1,360 @@
+"""Compression of the responses, as a WSGI middleware of the whole app.
+
+The encoding is negotiated from "Accept-Encoding": brotli (only with the
+"brotli" package), gzip or deflate. The bodies known to be smaller than
+the threshold are sent as they are, the streamed ones are compressed
+incrementally and flushed by chunk, so the client still receives bytes
+before the body ends.
+
+The compressed responses have their own ETag, "<etag>-<encoding>",
+the suffix is removed from "If-None-Match" before the app checks it.
+"""
+import zlib
+from itertools import chain
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class ZlibCompressor:
+    """gzip or deflate stream."""
+
+    def __init__(self, wbits: int, level: int) -> None:
+        """
+        Args:
+            wbits (int): zlib window bits, with the format offset.
+            level (int): Compression level, 1 to 9.
+        """
+        self._compressobj = zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressobj.compress(data)
+
+    def flush(self) -> bytes:
+        """Get the pending output, the stream can continue."""
+        return self._compressobj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressobj.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    """brotli stream."""
+
+    def __init__(self, quality: int) -> None:
+        """
+        Args:
+            quality (int): Compression quality, 0 to 11.
+        """
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        """Get the pending output, the stream can continue."""
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Parse the "Accept-Encoding" header.
+
+    Args:
+        header (str): Header value, e.g. "gzip, br;q=0.9".
+
+    Returns:
+        Dict[str, float]: Quality ("q") by encoding, lowercase.
+    """
+    qualities = dict()
+    for item in header.split(','):
+        name, *params = item.split(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name] = quality
+    return qualities
+
+
+def choose_encoding(header: str, encodings: Tuple[str, ...]) -> Optional[str]:
+    """Choose the encoding of the response.
+
+    Args:
+        header (str): "Accept-Encoding" header value.
+        encodings (Tuple[str, ...]): Available encodings, by preference.
+
+    Returns:
+        str: Best encoding accepted by the client, None if there isn't one.
+    """
+    qualities = parse_accept_encoding(header)
+    default_quality = qualities.get('*', 0.0)
+    best_encoding, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = qualities.get(encoding, default_quality)
+        if quality > best_quality:
+            best_encoding, best_quality = encoding, quality
+    return best_encoding
+
+
+class ClosingIterator:
+    """Iterate the body, and close the one of the app when done."""
+
+    def __init__(self, iterable: Iterable[bytes], body: Iterable[bytes]
+                 ) -> None:
+        self.iterable = iterable
+        self.body = body
+
+    def __iter__(self) -> Iterator[bytes]:
+        return iter(self.iterable)
+
+    def close(self) -> None:
+        if hasattr(self.body, 'close'):
+            self.body.close()
+
+
+class CompressionMiddleware:
+    """Compress the responses of the app. The other attributes are the
+    app ones, e.g. "config".
+    """
+
+    def __init__(self, app: Callable, compression_settings: dict) -> None:
+        """
+        Args:
+            app (Callable): WSGI app.
+            compression_settings (dict): COMPRESSION settings.
+        """
+        self.app = app
+        self.min_size = compression_settings.get('MIN_SIZE')
+        self.content_types = tuple(compression_settings.get('CONTENT_TYPES'))
+        level = compression_settings.get('LEVEL')
+        quality = compression_settings.get('BROTLI_QUALITY')
+        self.compressors: Dict[str, Callable] = {
+            'gzip': lambda: ZlibCompressor(16 + zlib.MAX_WBITS, level),
+            'deflate': lambda: ZlibCompressor(zlib.MAX_WBITS, level),
+        }
+        if brotli:
+            self.compressors['br'] = lambda: BrotliCompressor(quality)
+        self.encodings = tuple(
+            encoding for encoding in compression_settings.get('ENCODINGS')
+            if encoding in self.compressors
+        )
+        self.responses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def __getattr__(self, attr: str):
+        return getattr(self.app, attr)
+
+    def strip_etags(self, header: str) -> str:
+        """Remove the encoding suffixes of the ETags,
+        so the app compares its own ones.
+
+        Args:
+            header (str): "If-None-Match" header value.
+
+        Returns:
+            str: Header value without suffixes.
+        """
+        for encoding in self.encodings:
+            header = header.replace(f'-{encoding}"', '"')
+        return header
+
+    def is_compressible(self, headers: Dict[str, str]) -> bool:
+        """Check the response content type, the representation
+        varies by "Accept-Encoding" only if it's compressible.
+
+        Args:
+            headers (Dict[str, str]): Response headers, lowercase names.
+
+        Returns:
+            bool: If the body can be compressed.
+        """
+        content_type = headers.get('content-type', '').lower()
+        return content_type.startswith(self.content_types)
+
+    def __call__(self, environ: dict, start_response: Callable
+                 ) -> Iterable[bytes]:
+        encoding = None
+        if environ.get('REQUEST_METHOD') != 'HEAD':
+            encoding = choose_encoding(
+                environ.get('HTTP_ACCEPT_ENCODING', ''), self.encodings)
+        if 'HTTP_IF_NONE_MATCH' in environ:
+            environ['HTTP_IF_NONE_MATCH'] = self.strip_etags(
+                environ['HTTP_IF_NONE_MATCH'])
+
+        response = dict()
+        written: List[bytes] = list()
+
+        def capture_start_response(status: str, headers: list,
+                                   exc_info=None) -> Callable:
+            response.update(status=status, headers=headers,
+                            exc_info=exc_info)
+            return written.append
+
+        body = self.app(environ, capture_start_response)
+        if written:
+            body = ClosingIterator(chain(written, body), body)
+        status, headers = response['status'], response['headers']
+        header_values = {name.lower(): value for name, value in headers}
+        status_code = int(status[:3])
+
+        def send(body: Iterable[bytes], headers: list) -> Iterable[bytes]:
+            start_response(status, headers, response['exc_info'])
+            return body
+
+        if status_code == 304:
+            # the "Vary" of the 200, its content type is usually omitted
+            if ('content-type' not in header_values
+                    or self.is_compressible(header_values)):
+                headers = self.add_vary(headers, header_values)
+            if encoding:
+                headers = self.set_etag(headers, encoding)
+            return send(body, headers)
+        if not self.is_compressible(header_values):
+            return send(body, headers)
+        headers = self.add_vary(headers, header_values)
+        if (encoding is None or status_code < 200 or status_code == 204
+                or 'content-encoding' in header_values
+                or 'no-transform' in header_values.get('cache-control', '')):
+            return send(body, headers)
+        content_length = header_values.get('content-length')
+        if content_length is not None and int(content_length) < self.min_size:
+            return send(body, headers)
+
+        # a body of known length is already in memory, else it's read
+        # up to the threshold, to know if it's reached
+        iterator = iter(body)
+        chunks = list()
+        size = 0
+        ended = True
+        for chunk in iterator:
+            chunks.append(chunk)
+            size += len(chunk)
+            if content_length is None and size >= self.min_size:
+                ended = False
+                break
+        if ended and size < self.min_size:
+            return send(ClosingIterator(chunks, body), headers)
+
+        headers = self.set_etag(headers, encoding)
+        headers = [(name, value) for name, value in headers
+                   if name.lower() != 'content-length']
+        headers.append(('Content-Encoding', encoding))
+        compressor = self.compressors[encoding]()
+        if ended:
+            data = self.compress_body(compressor, chunks)
+            if hasattr(body, 'close'):
+                body.close()
+            headers.append(('Content-Length', str(len(data))))
+            return send([data], headers)
+        data = self.compress_stream(compressor, chain(chunks, iterator))
+        return send(ClosingIterator(data, body), headers)
+
+    def compress_body(self, compressor, chunks: List[bytes]) -> bytes:
+        """Compress the whole body at once.
+
+        Args:
+            compressor (ZlibCompressor, BrotliCompressor): New compressor.
+            chunks (List[bytes]): Body chunks.
+
+        Returns:
+            bytes: Compressed body.
+        """
+        data = b''.join(chunks)
+        compressed_data = compressor.compress(data) + compressor.finish()
+        self.responses += 1
+        self.bytes_in += len(data)
+        self.bytes_out += len(compressed_data)
+        return compressed_data
+
+    def compress_stream(self, compressor, chunks: Iterable[bytes]
+                        ) -> Iterator[bytes]:
+        """Compress the body chunk by chunk, each one is flushed,
+        so it's sent without waiting for the next one.
+
+        Args:
+            compressor (ZlibCompressor, BrotliCompressor): New compressor.
+            chunks (Iterable[bytes]): Body chunks.
+
+        Yields:
+            Iterator[bytes]: Compressed chunks.
+        """
+        self.responses += 1
+        for chunk in chunks:
+            if not chunk:
+                continue
+            data = compressor.compress(chunk) + compressor.flush()
+            self.bytes_in += len(chunk)
+            self.bytes_out += len(data)
+            yield data
+        data = compressor.finish()
+        self.bytes_out += len(data)
+        yield data
+
+    def set_etag(self, headers: list, encoding: str) -> list:
+        """Add the encoding suffix to the ETag of the response,
+        the compressed representation is a different one.
+
+        Args:
+            headers (list): Response headers.
+            encoding (str): Content encoding.
+
+        Returns:
+            list: Response headers.
+        """
+        return [
+            (name, value[:-1] + f'-{encoding}"')
+            if name.lower() == 'etag' and value.endswith('"')
+            else (name, value)
+            for name, value in headers
+        ]
+
+    def add_vary(self, headers: list, header_values: Dict[str, str]
+                 ) -> list:
+        """Add "Accept-Encoding" to the "Vary" header of the response,
+        so the shared caches keep a representation by encoding.
+
+        Args:
+            headers (list): Response headers.
+            header_values (Dict[str, str]): Response headers,
+                                            lowercase names.
+
+        Returns:
+            list: Response headers.
+        """
+        vary = header_values.get('vary')
+        if vary is None:
+            return headers + [('Vary', 'Accept-Encoding')]
+        vary_names = {name.strip().lower() for name in vary.split(',')}
+        if vary_names & {'*', 'accept-encoding'}:
+            return headers
+        return [
+            (name, f'{value}, Accept-Encoding')
+            if name.lower() == 'vary' else (name, value)
+            for name, value in headers
+        ]
+
+    def stats(self) -> dict:
+        """Compression counters, by process.
+
+        Returns:
+            dict: Compressed responses, and their bytes before and after.
+        """
+        return {
+            'responses': self.responses,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+        }
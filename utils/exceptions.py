@@ -1,8 +1,8 @@
-from json import dumps as json_dumps
 
 from bottle import HTTPError
 
 from settings import DEBUG
+from utils.json_codec import dumps as json_dumps
 from utils.response import JSONResponse
 
 
@@ -34,6 +34,36 @@ class JSONResponseBadRequest(JSONResponseError):
     default_status = 400
 
 
+class JSONResponseRequestTooLarge(JSONResponseError):
+    default_status = 413
+
+
+class JSONResponseServiceUnavailable(JSONResponseError):
+    default_status = 503
+
+
+class JSONResponseServerBusy(JSONResponseServiceUnavailable):
+    retry_after = 1
+
+    def __init__(self, exception=None, traceback=None, **options):
+        message = "Server busy, try again later."
+        data = {'detail': [message, ]}
+        data = json_dumps(data)
+        options['Retry-After'] = str(self.retry_after)
+        super().__init__(body=data, exception=exception,
+                         traceback=traceback, **options)
+
+
+class JSONResponseSchemaOutdated(JSONResponseServiceUnavailable):
+
+    def __init__(self, exception=None, traceback=None, **options):
+        message = "Service unavailable, try again later."
+        data = {'detail': [message, ]}
+        data = json_dumps(data)
+        super().__init__(body=data, exception=exception,
+                         traceback=traceback, **options)
+
+
 class JSONResponseJWTError(JSONResponseNotAuthenticated):
     default_status = 401
 
@@ -46,6 +76,16 @@ class JSONResponseJWTError(JSONResponseNotAuthenticated):
                          traceback=traceback, **options)
 
 
+class HTTPErrorTooManyRequests(HTTPError):
+    default_status = 429
+
+    def __init__(self, retry_after: int, **options):
+        message = "Too many requests, try again later."
+        options['Retry-After'] = str(retry_after)
+        super().__init__(status=self.default_status, body=message,
+                         **options)
+
+
 def handle_http_errors(error: HTTPError) -> JSONResponse:
     """Handle http errors for Bottle App.
 
@@ -61,6 +101,10 @@ def handle_http_errors(error: HTTPError) -> JSONResponse:
             data['exception'] = error.exception
         if error.traceback:
             data['traceback'] = error.traceback
-    data = json_dumps(data)
+    data = json_dumps(data, default=str)
     status_code = error.status_code
-    return JSONResponse(body=data, status=status_code)
+
+    # keep the headers of the error, e.g. "Retry-After" or "Allow"
+    headers = {name: value for name, value in error.headerlist
+               if name not in ('Content-Type', 'Content-Length')}
+    return JSONResponse(body=data, status=status_code, headers=headers)
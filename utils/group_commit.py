@@ -0,0 +1,221 @@
+"""Group commit of the writes of concurrent requests.
+
+Each request queues its row and waits. A writer thread takes the rows
+queued within a short window, writes them in one transaction, and replies
+to every request only after the commit, so a reply still means the row
+is on disk: one write lock and one sync for the whole batch.
+"""
+import os
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+from time import monotonic
+from typing import Any, Callable, List, Optional, Tuple
+
+from peewee import Database
+
+from utils.metrics import phase_timer
+
+
+class GroupCommitBusy(Exception):
+    """The writer queue is full, the request must be shed."""
+
+
+class GroupCommitWriter:
+    """Write the queued items by batches, in a dedicated thread."""
+
+    def __init__(self, database: Database,
+                 write_batch: Callable[[List[Any]], List[Any]],
+                 window: float = 0.002, max_batch: int = 100,
+                 queue_size: int = 1000,
+                 timeout: Optional[float] = None) -> None:
+        """
+        Args:
+            database (Database): Database instance.
+            write_batch (Callable[[List[Any]], List[Any]]): Writes the items,
+                                                           runs in the
+                                                           transaction and
+                                                           returns their
+                                                           results in order.
+            window (float): Max seconds collecting items after the first
+                            one, the added latency. Defaults to 0.002.
+            max_batch (int): Max items by transaction. Defaults to 100.
+            queue_size (int): Max waiting items. Defaults to 1000.
+            timeout (float, None): Max seconds waiting for the commit,
+                                   the items not written yet are dropped.
+                                   Defaults to None.
+        """
+        self.database = database
+        self.write_batch = write_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.batches = 0
+        self.items = 0
+        self._queue: Optional[Queue] = None
+        self._thread: Optional[Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = Lock()
+
+    def get_queue(self) -> Queue:
+        """Start the writer thread on first use, and again in a forked
+        worker, the threads aren't inherited.
+
+        Returns:
+            Queue: Items waiting for the writer.
+        """
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = Queue(maxsize=self.queue_size)
+                    self._thread = Thread(target=self.run,
+                                          args=(self._queue, ),
+                                          name='group-commit', daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+        return self._queue
+
+    def submit(self, item: Any) -> Any:
+        """Queue the item and wait until it's committed.
+
+        Args:
+            item (Any): Item to write.
+
+        Returns:
+            Any: Item result, e.g. the saved row.
+
+        Raises:
+            GroupCommitBusy: If the queue is full or the item
+                             wasn't written in time.
+        """
+        future = Future()
+        try:
+            self.get_queue().put_nowait((item, future))
+        except Full as error:
+            raise GroupCommitBusy from error
+        with phase_timer('group_commit'):
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeoutError as error:
+                # not taken by the writer yet, it won't be written
+                if future.cancel():
+                    raise GroupCommitBusy from error
+            # already in a transaction, the reply waits for the commit
+            return future.result()
+
+    def collect(self, queue: Queue) -> List[Tuple[Any, Future]]:
+        """Wait for an item, then take the ones queued within the window.
+
+        Args:
+            queue (Queue): Waiting items.
+
+        Returns:
+            List[Tuple[Any, Future]]: Items and their futures, the last
+                                      one is None when the writer must
+                                      stop.
+        """
+        batch = [queue.get()]
+        deadline = monotonic() + self.window
+        while batch[-1] is not None and len(batch) < self.max_batch:
+            remaining = deadline - monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(queue.get(timeout=remaining))
+                else:
+                    batch.append(queue.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def write(self, batch: List[Tuple[Any, Future]]) -> None:
+        """Write the batch in one transaction, and reply after the commit.
+        If it fails, e.g. by a constraint error, each item is written
+        again on its own, so only the wrong ones fail.
+
+        Args:
+            batch (List[Tuple[Any, Future]]): Items and their futures.
+        """
+        batch = [(item, future) for item, future in batch
+                 if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            with self.database.atomic('IMMEDIATE'):
+                results = self.write_batch([item for item, _ in batch])
+        except Exception:
+            results = None
+        if results is not None:
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+            self.batches += 1
+            self.items += len(batch)
+            return
+
+        for item, future in batch:
+            try:
+                with self.database.atomic('IMMEDIATE'):
+                    result, = self.write_batch([item])
+            except Exception as error:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+                self.batches += 1
+                self.items += 1
+
+    def run(self, queue: Queue) -> None:
+        while True:
+            batch = self.collect(queue)
+            stop = batch[-1] is None
+            if stop:
+                batch.pop()
+            try:
+                self.write(batch)
+            except BaseException as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+            finally:
+                if not self.database.is_closed():
+                    self.database.close()
+            if stop:
+                return
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Write the queued items and stop the writer thread,
+        e.g. before exiting. The next item starts it again.
+        The items queued meanwhile fail with GroupCommitBusy.
+
+        Args:
+            timeout (float, None): Max seconds waiting for the writer.
+                                   Defaults to None.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            queue, thread = self._queue, self._thread
+            self._pid = None
+        # after the items already queued
+        queue.put(None)
+        thread.join(timeout)
+        if thread.is_alive():
+            return
+        while True:
+            try:
+                _, future = queue.get_nowait()
+            except Empty:
+                break
+            if future.set_running_or_notify_cancel():
+                future.set_exception(GroupCommitBusy())
+
+    def stats(self) -> dict:
+        """Writer counters, by process.
+
+        Returns:
+            dict: Committed batches and items, and waiting items.
+        """
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'queued': self._queue.qsize() if self._queue else 0,
+        }
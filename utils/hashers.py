@@ -0,0 +1,171 @@
+from concurrent.futures import (Executor, Future, ProcessPoolExecutor,
+                                ThreadPoolExecutor,
+                                TimeoutError as FutureTimeoutError)
+from threading import BoundedSemaphore, Lock
+from typing import Callable, Optional
+
+from bcrypt import checkpw, gensalt, hashpw
+
+from settings import PASSWORD_HASHER as HASHER_SETTINGS
+from utils.metrics import phase_timer
+
+
+class PasswordHasherBusy(Exception):
+    """The hasher queue is full, the request must be shed."""
+
+
+def bcrypt_hash(raw_password: bytes, rounds: int) -> bytes:
+    """Hash the password, runs in a worker.
+
+    Args:
+        raw_password (bytes): User password.
+        rounds (int): bcrypt cost factor.
+
+    Returns:
+        bytes: Hashed password.
+    """
+    return hashpw(raw_password, gensalt(rounds=rounds))
+
+
+def bcrypt_check(raw_password: bytes, hashed_password: bytes) -> bool:
+    """Check the password with the hash, runs in a worker.
+
+    Args:
+        raw_password (bytes): User password.
+        hashed_password (bytes): Hashed password.
+
+    Returns:
+        bool: If is successful.
+    """
+    try:
+        is_correct = checkpw(raw_password, hashed_password)
+    except ValueError as error:
+        is_correct = False
+    return is_correct
+
+
+class PasswordHasher:
+    """bcrypt hasher backed by a dedicated and bounded worker pool.
+
+    The serving thread waits for the result, but at most "workers" hashes
+    run at the same time, so a burst of logins can't take every CPU,
+    and at most "queue_size" more wait for a worker, the rest is shed.
+    """
+    executor_classes = {
+        'thread': ThreadPoolExecutor,
+        'process': ProcessPoolExecutor,
+    }
+
+    def __init__(self, rounds: int = 12, executor: str = 'thread',
+                 workers: int = 4, queue_size: int = 32,
+                 timeout: Optional[float] = None) -> None:
+        """
+        Args:
+            rounds (int): bcrypt cost factor. Defaults to 12.
+            executor (str): "thread" or "process". Defaults to "thread".
+            workers (int): Pool size. Defaults to 4.
+            queue_size (int): Max number of waiting hashes. Defaults to 32.
+            timeout (float, None): Max seconds waiting for a result.
+                                   Defaults to None.
+        """
+        self.rounds = rounds
+        self.executor_class = self.executor_classes[executor]
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = BoundedSemaphore(workers + queue_size)
+        self._executor = None
+        self._executor_lock = Lock()
+
+    def get_executor(self) -> Executor:
+        """Create the pool on first use,
+        so it's never inherited by a forked worker.
+
+        Returns:
+            Executor: Worker pool.
+        """
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = self.executor_class(
+                        max_workers=self.workers)
+        return self._executor
+
+    def run(self, func: Callable, *args):
+        """Run the function in the pool and wait for the result.
+
+        Raises:
+            PasswordHasherBusy: If the queue is full or
+                                the result took too long.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy
+        try:
+            future = self.get_executor().submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._release_slot)
+        try:
+            with phase_timer('password_hash'):
+                return future.result(timeout=self.timeout)
+        except FutureTimeoutError as error:
+            raise PasswordHasherBusy from error
+
+    def _release_slot(self, future: Future) -> None:
+        self._slots.release()
+
+    def hash(self, raw_password: str) -> str:
+        """Hash the password with the configured rounds.
+
+        Args:
+            raw_password (str): User password.
+
+        Returns:
+            str: Hashed password.
+        """
+        hashed_password = self.run(bcrypt_hash, raw_password.encode('utf-8'),
+                                   self.rounds)
+        return hashed_password.decode('utf-8')
+
+    def check(self, raw_password: str, hashed_password: str) -> bool:
+        """Check the password with the hash.
+
+        Args:
+            raw_password (str): User password.
+            hashed_password (str): Hashed password.
+
+        Returns:
+            bool: If is successful.
+        """
+        return self.run(bcrypt_check, raw_password.encode('utf-8'),
+                        hashed_password.encode('utf-8'))
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """Check if the hash was made with other rounds.
+
+        Args:
+            hashed_password (str): Hashed password, "$2b$<rounds>$...".
+
+        Returns:
+            bool: If the password must be hashed again.
+        """
+        try:
+            rounds = int(hashed_password.split('$')[2])
+        except (IndexError, ValueError) as error:
+            return True
+        return rounds != self.rounds
+
+    def shutdown(self) -> None:
+        """Stop the worker pool."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    rounds=HASHER_SETTINGS.get('ROUNDS'),
+    executor=HASHER_SETTINGS.get('EXECUTOR'),
+    workers=HASHER_SETTINGS.get('WORKERS'),
+    queue_size=HASHER_SETTINGS.get('QUEUE_SIZE'),
+    timeout=HASHER_SETTINGS.get('TIMEOUT'),
+)
@@ -0,0 +1,56 @@
+"""JSON codec of the API: orjson when it's installed, else the standard
+library. The documents are always encoded as UTF-8 bytes, so the WSGI
+layer sends them as they are.
+
+It's also the "render_module" of the serializers. The encoding options
+of the backends differ, so the other arguments, e.g. "indent", are
+rejected instead of ignored.
+"""
+from json import dumps as std_dumps, loads as std_loads
+from typing import Any, Callable, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+JSON_BACKEND = 'orjson' if orjson else 'json'
+
+# separators of the encoded documents, to build them by fragments
+ITEM_SEPARATOR = b',' if orjson else b', '
+KEY_SEPARATOR = b':' if orjson else b': '
+
+
+def dumps(obj: Any, *, default: Optional[Callable] = None) -> bytes:
+    """Encode the object as a JSON document.
+
+    Args:
+        obj (Any): Object to encode.
+        default (Callable, None): Called for the objects that can't be
+                                  encoded. Defaults to None.
+
+    Returns:
+        bytes: UTF-8 JSON document.
+    """
+    if orjson:
+        return orjson.dumps(obj, default=default,
+                            option=orjson.OPT_NON_STR_KEYS)
+    return std_dumps(obj, default=default).encode('utf-8')
+
+
+def loads(data: Any) -> Any:
+    """Decode a JSON document.
+
+    Args:
+        data (Any): JSON document, as bytes or str.
+
+    Raises:
+        ValueError: If the document is malformed.
+
+    Returns:
+        Any: Decoded object.
+    """
+    if orjson:
+        return orjson.loads(data)
+    return std_loads(data)
@@ -1,17 +1,28 @@
 from datetime import datetime, timedelta
 from re import compile as re_compile
+from time import time
 from typing import Callable
 
 from bottle import request
 from jwt import (DecodeError, decode as jwt_decode, InvalidTokenError,
                  encode as jwt_encode)
+from playhouse.signals import post_delete, post_save
 
-from api.models import User
+from api.models import User, user_cache
 from settings import JSON_WEB_TOKEN as JWT_SETTINGS, SECRET_KEY
+from utils.cache import LRUCache
 from utils.exceptions import JSONResponseBadRequest, JSONResponseJWTError
+from utils.metrics import phase_timer
 from utils.response import JSONResponse
 
 
+# Verified tokens: HTTP AUTHORIZATION header value -> (claims, user)
+token_cache = LRUCache(
+    maxsize=JWT_SETTINGS.get('CACHE_SIZE'),
+    ttl=JWT_SETTINGS.get('CACHE_TTL').total_seconds(),
+)
+
+
 def jwt_auth_required(
         func: Callable[[], JSONResponse],
         inject_user: bool = True) -> Callable[[], JSONResponse]:
@@ -26,11 +37,28 @@ def jwt_auth_required(
         Callable[[], JSONResponse]: Resource function wrapped.
     """
     def wrapper(*args, **kwargs):
-        http_auth_header = get_http_auth_header()
-        check_http_auth_header(http_auth_header)
-        jwtoken = get_jwtoken_from_http_auth(http_auth_header)
-        jwtoken_claims = decode_jwtoken(jwtoken)
-        check_jwt_claims(jwtoken_claims, inject_user=inject_user)
+        # nested phases, "auth" keeps the token cache time
+        with phase_timer('auth'):
+            with phase_timer('auth_header'):
+                http_auth_header = get_http_auth_header()
+
+            # check first in cache, else verify the token
+            verified_jwtoken = token_cache.get(http_auth_header)
+            if verified_jwtoken:
+                jwtoken_claims, user = verified_jwtoken
+                if inject_user:
+                    inject_user_on_request(user)
+            else:
+                with phase_timer('auth_header'):
+                    check_http_auth_header(http_auth_header)
+                    jwtoken = get_jwtoken_from_http_auth(http_auth_header)
+                with phase_timer('auth_decode'):
+                    jwtoken_claims = decode_jwtoken(jwtoken)
+                with phase_timer('auth_user'):
+                    user = check_jwt_claims(jwtoken_claims,
+                                            inject_user=inject_user)
+                cache_verified_jwtoken(http_auth_header, jwtoken_claims,
+                                       user)
         return func(*args, **kwargs)
     return wrapper
 
@@ -143,7 +171,7 @@ def create_user_jwt_claim(user: User) -> dict:
     return payload
 
 
-def check_jwt_claims(jwtoken_claims: dict, inject_user: bool = True) -> None:
+def check_jwt_claims(jwtoken_claims: dict, inject_user: bool = True) -> User:
     """Check JWToken claims: jwoken expiration date and time
     and if the user is available.
 
@@ -154,6 +182,9 @@ def check_jwt_claims(jwtoken_claims: dict, inject_user: bool = True) -> None:
     Raises:
         JSONResponseJWTError: Expired JWToken
         JSONResponseJWTError: User not available.
+
+    Returns:
+        User: Authenticated user.
     """
     payload = jwtoken_claims
     exp_unix_timestamp = int(payload.get('exp'))
@@ -162,12 +193,55 @@ def check_jwt_claims(jwtoken_claims: dict, inject_user: bool = True) -> None:
     if jwtoken_exp_datetime < now_datetime:
         raise JSONResponseJWTError()
     user = User.get_user(payload.get('username'))
-    if not user.available:
+    if not user or not user.available:
         raise JSONResponseJWTError()
 
     # add user to request
     if inject_user:
         inject_user_on_request(user)
+    return user
+
+
+def cache_verified_jwtoken(http_auth_header: str, jwtoken_claims: dict,
+                           user: User) -> None:
+    """Cache the verified JWToken, the entry never outlives
+    the JWToken expiration nor the identity map entries of the user.
+
+    Args:
+        http_auth_header (str): Header HTTP AUTHORIZATION value.
+        jwtoken_claims (dict): JWToken claims (payload).
+        user (User): Authenticated user.
+    """
+    jwtoken_lifetime = int(jwtoken_claims.get('exp')) - time()
+    ttl = min(token_cache.ttl, user_cache.ttl, jwtoken_lifetime)
+    if ttl > 0:
+        token_cache.set(http_auth_header, (jwtoken_claims, user), ttl=ttl)
+
+
+def discard_user_jwtokens(user: User) -> None:
+    """Remove the cached JWTokens of the user.
+
+    Args:
+        user (User): User instance.
+    """
+    token_cache.discard_if(lambda key, value: value[1].id == user.id)
+
+
+@post_save(sender=User)
+def invalidate_saved_user_jwtokens(sender: type, instance: User,
+                                   created: bool) -> None:
+    """Remove the cached JWTokens when the user is saved, e.g. disabled
+    or with a new password, their user instance is stale. The tokens of
+    an available user are verified again on the next request.
+    """
+    if not created:
+        discard_user_jwtokens(instance)
+
+
+@post_delete(sender=User)
+def invalidate_deleted_user_jwtokens(sender: type, instance: User) -> None:
+    """Remove the cached JWTokens when the user is deleted."""
+    discard_user_jwtokens(instance)
 
 
 def inject_user_on_request(user: User) -> None:
@@ -0,0 +1,298 @@
+"""Request metrics, exposed in the Prometheus text format.
+
+The metrics are kept by worker process. Each histogram has its own lock,
+the additions of an observation aren't atomic and the threaded and
+gevent workers observe concurrently.
+
+Phases are timed with "phase_timer", they can be nested, each phase
+records only its own time (exclusive), e.g. the DB time of the user
+lookup isn't counted again in "auth".
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock, local
+from time import perf_counter
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from bottle import HTTPResponse, Route, response
+
+
+# seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# timings of the request being handled by this thread (or greenlet)
+_state = local()
+
+
+class Histogram:
+    """Cumulative histogram of one labels set."""
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        # the last one is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        """Get the counts, sum and count of the same observations.
+
+        Returns:
+            Tuple[List[int], float, int]: Counts by bucket, sum and count.
+        """
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class HistogramFamily:
+    """Histograms of a metric, one by labels set."""
+
+    def __init__(self, name: str, documentation: str,
+                 label_names: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        """
+        Args:
+            name (str): Metric name.
+            documentation (str): Metric help.
+            label_names (Tuple[str, ...]): Label names.
+            buckets (Tuple[float, ...]): Bucket upper bounds, sorted.
+                                         Defaults to DEFAULT_BUCKETS.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self.histograms: Dict[tuple, Histogram] = dict()
+
+    def labels(self, *label_values: str) -> Histogram:
+        """Get the histogram of the labels set, created on first use.
+
+        Returns:
+            Histogram: Histogram instance.
+        """
+        histogram = self.histograms.get(label_values)
+        if histogram is None:
+            histogram = self.histograms.setdefault(label_values,
+                                                   Histogram(self.buckets))
+        return histogram
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} histogram']
+        for label_values, histogram in list(self.histograms.items()):
+            labels = format_labels(zip(self.label_names, label_values))
+            counts, total, total_count = histogram.snapshot()
+            cumulative_count = 0
+            bounds = [*map(repr, histogram.buckets), '+Inf']
+            for bound, count in zip(bounds, counts):
+                cumulative_count += count
+                bucket_labels = format_labels(
+                    [*zip(self.label_names, label_values), ('le', bound)])
+                lines.append(f'{self.name}_bucket{bucket_labels} '
+                             f'{cumulative_count}')
+            lines.append(f'{self.name}_sum{labels} {total!r}')
+            lines.append(f'{self.name}_count{labels} {total_count}')
+        return lines
+
+
+def format_labels(labels) -> str:
+    """Format the labels, e.g. '{route="/notes",status="200"}'.
+
+    Args:
+        labels (Iterable[Tuple[str, str]]): Label names and values.
+
+    Returns:
+        str: Prometheus labels.
+    """
+    pairs = list()
+    for name, value in labels:
+        value = (str(value).replace('\\', r'\\').replace('"', r'\"')
+                 .replace('\n', r'\n'))
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class MetricsRegistry:
+    """Request histograms and gauges collected on scrape."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        """
+        Args:
+            buckets (Tuple[float, ...]): Bucket upper bounds in seconds.
+                                         Defaults to DEFAULT_BUCKETS.
+        """
+        self.request_duration = HistogramFamily(
+            'http_request_duration_seconds',
+            'Time handling the request.',
+            ('method', 'route', 'status'), buckets,
+        )
+        self.phase_duration = HistogramFamily(
+            'http_request_phase_duration_seconds',
+            'Time by phase of the request, the "other" phase is the rest.',
+            ('method', 'route', 'status', 'phase'), buckets,
+        )
+        # name -> (help, collect function)
+        self.gauges: Dict[str, Tuple[str, Callable[[], dict]]] = dict()
+
+    def add_gauges(self, prefix: str, documentation: str,
+                   collect: Callable[[], dict]) -> None:
+        """Add gauges read on scrape, one by numeric value of the dict.
+
+        Args:
+            prefix (str): Metric names prefix, e.g. "response_cache".
+            documentation (str): Metrics help.
+            collect (Callable[[], dict]): Returns the values by name,
+                                          e.g. a "stats" method.
+        """
+        self.gauges[prefix] = (documentation, collect)
+
+    def observe_request(self, method: str, route: str, status: int,
+                        duration: float, timings: Dict[str, float]) -> None:
+        """Record the request duration and its phases.
+
+        Args:
+            method (str): HTTP method.
+            route (str): Route rule.
+            status (int): Response status code.
+            duration (float): Seconds.
+            timings (Dict[str, float]): Exclusive seconds by phase.
+        """
+        status = str(status)
+        self.request_duration.labels(method, route, status).observe(duration)
+        other = duration
+        for phase, seconds in timings.items():
+            self.phase_duration.labels(method, route, status,
+                                       phase).observe(seconds)
+            other -= seconds
+        self.phase_duration.labels(method, route, status,
+                                   'other').observe(max(other, 0.0))
+
+    def render(self) -> str:
+        """Render all the metrics.
+
+        Returns:
+            str: Prometheus text format.
+        """
+        lines = self.request_duration.render()
+        lines += self.phase_duration.render()
+        for prefix, (documentation, collect) in self.gauges.items():
+            for name, value in collect().items():
+                if isinstance(value, bool) or not isinstance(
+                        value, (int, float)):
+                    continue
+                metric_name = f'{prefix}_{name}'
+                lines.append(f'# HELP {metric_name} {documentation}')
+                lines.append(f'# TYPE {metric_name} gauge')
+                lines.append(f'{metric_name} {value!r}')
+        return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def phase_timer(phase: str) -> Iterator[None]:
+    """Time a phase of the current request, a no-op out of a request.
+
+    Args:
+        phase (str): Phase name, e.g. "auth".
+    """
+    stack = getattr(_state, 'stack', None)
+    if stack is None:
+        yield
+        return
+    # [phase, time of the nested phases]
+    frame = [phase, 0.0]
+    stack.append(frame)
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = perf_counter() - start
+        stack.pop()
+        timings = _state.timings
+        timings[phase] = timings.get(phase, 0.0) + elapsed - frame[1]
+        if stack:
+            stack[-1][1] += elapsed
+
+
+def start_request_timings() -> None:
+    _state.stack = list()
+    _state.timings = dict()
+
+
+def stop_request_timings() -> Dict[str, float]:
+    timings = getattr(_state, 'timings', None) or dict()
+    _state.stack = None
+    _state.timings = None
+    return timings
+
+
+class MetricsPlugin:
+    """Bottle plugin recording the duration of the requests,
+    by method, route and status, and of their phases.
+
+    A streamed body is sent after the callback returns,
+    only the time until the first byte is recorded.
+    """
+    name = 'metrics'
+    api = 2
+
+    def __init__(self, registry: MetricsRegistry) -> None:
+        self.registry = registry
+
+    def apply(self, callback: Callable, route: Route) -> Callable:
+        observe_request = self.registry.observe_request
+        method, rule = route.method, route.rule
+
+        def wrapper(*args, **kwargs):
+            start_request_timings()
+            start = perf_counter()
+            status = 500
+            try:
+                result = callback(*args, **kwargs)
+                status = (result.status_code
+                          if isinstance(result, HTTPResponse)
+                          else response.status_code)
+                return result
+            except HTTPResponse as error:
+                status = error.status_code
+                raise
+            finally:
+                duration = perf_counter() - start
+                observe_request(method, rule, status, duration,
+                                stop_request_timings())
+        return wrapper
+
+
+def get_metrics_resource() -> HTTPResponse:
+    """Get the metrics of this worker process for endpoint.
+
+    Returns:
+        HTTPResponse: Metrics in Prometheus text format.
+    """
+    return HTTPResponse(body=metrics_registry.render(),
+                        headers={'Content-Type': PROMETHEUS_CONTENT_TYPE})
+
+
+class TimedDatabaseMixin:
+    """Time the queries as the "db" phase of the current request.
+    Only the execution until the first row is timed, the rows fetched
+    while they are iterated count in the phase iterating them.
+    """
+
+    def execute_sql(self, sql: str, *args, **kwargs):
+        with phase_timer('db'):
+            return super().execute_sql(sql, *args, **kwargs)
+
+
+metrics_registry = MetricsRegistry()
@@ -1,6 +1,9 @@
 from datetime import datetime
+from typing import Iterable, List, Optional
 
-from peewee import AutoField, BooleanField, DateTimeField, Model, ModelSelect
+from peewee import (AutoField, BooleanField, Database, DateTimeField,
+                    ModelSelect)
+from playhouse.signals import Model
 
 from database import db_instance
 
@@ -9,6 +12,23 @@ class BaseModel(Model):
     id = AutoField()
     available = BooleanField(default=True)
     creation_date = DateTimeField(default=datetime.now)
+    # set by a trigger when "available" changes to False
+    deletion_date = DateTimeField(null=True)
+
+    def save(self, force_insert: bool = False,
+             only: Optional[List[str]] = None) -> int:
+        """Save without "deletion_date" on update, it's set by the
+        trigger: an instance loaded before the deletion would write
+        the previous value back.
+        """
+        if self._pk is not None and not force_insert:
+            if only is None:
+                only = [field.name for field in self._meta.sorted_fields
+                        if field.name != 'deletion_date']
+        elif not self.available and self.deletion_date is None:
+            # the trigger runs only on update
+            self.deletion_date = datetime.now()
+        return super().save(force_insert=force_insert, only=only)
 
     @classmethod
     def select_available(cls) -> ModelSelect:
@@ -19,5 +39,34 @@ class BaseModel(Model):
         """
         return cls.select().where(cls.available == True)
 
+    @classmethod
+    def insert_rows(cls, database: Database, rows: Iterable[dict]) -> None:
+        """Insert the rows with a single prepared statement
+        ("executemany"), the SQL isn't built again by row,
+        in the caller's transaction.
+
+        Args:
+            database (Database): Database of the rows.
+            rows (Iterable[dict]): Field values by field name,
+                                   the missing ones are the defaults.
+        """
+        fields = cls._meta.sorted_fields
+        columns = ', '.join(f'"{field.column_name}"' for field in fields)
+        params = ', '.join('?' for _ in fields)
+        sql = (f'INSERT INTO "{cls._meta.table_name}" '
+               f'({columns}) VALUES ({params})')
+
+        converters = [(field.name, field.default, callable(field.default),
+                       field.db_value) for field in fields]
+
+        def get_params(row: dict) -> tuple:
+            return tuple([
+                db_value(row[name] if name in row
+                         else default() if is_callable else default)
+                for name, default, is_callable, db_value in converters
+            ])
+
+        database.cursor().executemany(sql, map(get_params, rows))
+
     class Meta:
         database = db_instance
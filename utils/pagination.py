@@ -0,0 +1,47 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from datetime import datetime
+from typing import Tuple
+
+
+CURSOR_SEPARATOR = '|'
+
+
+def encode_cursor(creation_date: datetime, pk: int) -> str:
+    """Encode the keyset (creation_date, id) as an opaque cursor.
+
+    Args:
+        creation_date (datetime): Creation date of the last item of the page.
+        pk (int): Primary key of the last item of the page.
+
+    Returns:
+        str: URL safe cursor.
+    """
+    raw_cursor = f'{creation_date.isoformat()}{CURSOR_SEPARATOR}{pk}'
+    cursor = urlsafe_b64encode(raw_cursor.encode('utf-8'))
+    return cursor.decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode an opaque cursor as keyset (creation_date, id).
+
+    Args:
+        cursor (str): URL safe cursor.
+
+    Raises:
+        ValueError: If cursor is malformed.
+
+    Returns:
+        Tuple[datetime, int]: Creation date and primary key.
+    """
+    padding = '=' * (-len(cursor) % 4)
+    try:
+        raw_cursor = urlsafe_b64decode(cursor + padding).decode('utf-8')
+    except (BinasciiError, UnicodeError) as error:
+        raise ValueError('Invalid cursor.') from error
+    raw_date, separator, raw_pk = raw_cursor.partition(CURSOR_SEPARATOR)
+    if not separator:
+        raise ValueError('Invalid cursor.')
+    creation_date = datetime.fromisoformat(raw_date)
+    pk = int(raw_pk)
+    return creation_date, pk
@@ -0,0 +1,202 @@
+"""In-memory rate limiting of the routes, by client IP and by username.
+
+The buckets are kept by worker process, so the effective limit of a key
+is up to the configured one times the number of workers.
+"""
+from collections import OrderedDict
+from math import ceil
+from threading import Lock
+from time import monotonic
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from bottle import Route, request
+
+from utils.exceptions import HTTPErrorTooManyRequests
+from utils.request import get_json_from_request
+
+
+class TokenBuckets:
+    """Token buckets by key, sharded by key hash so the requests of
+    different keys rarely wait for the same lock.
+
+    A bucket idle long enough to be full again is the same as a new one,
+    so it's dropped. The buckets are kept from the least to the most
+    recently used, the idle ones are at the beginning of each shard.
+    """
+
+    def __init__(self, rate: float, burst: int, shards: int = 16,
+                 max_keys: int = 100000) -> None:
+        """
+        Args:
+            rate (float): Tokens added by second.
+            burst (int): Bucket size.
+            shards (int): Number of shards. Defaults to 16.
+            max_keys (int): Max number of buckets, the least recently used
+                            are dropped beyond it. Defaults to 100000.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.idle_time = burst / rate
+        self.max_shard_keys = max(max_keys // shards, 1)
+        self._shards: List[Tuple[Lock, OrderedDict]] = [
+            (Lock(), OrderedDict()) for _ in range(shards)
+        ]
+
+    def consume(self, key: Hashable, tokens: float = 1) -> float:
+        """Take tokens from the key bucket, if there are enough.
+
+        Args:
+            key (Hashable): Bucket key.
+            tokens (float): Tokens to take. Defaults to 1.
+
+        Returns:
+            float: 0 if they were taken, else seconds to wait for them.
+        """
+        lock, buckets = self._shards[hash(key) % len(self._shards)]
+        now = monotonic()
+        with lock:
+            bucket = buckets.pop(key, None)
+            if bucket is None:
+                available = self.burst
+            else:
+                available, updated = bucket
+                available = min(self.burst,
+                                available + (now - updated) * self.rate)
+            wait = 0.0
+            if available >= tokens:
+                available -= tokens
+            else:
+                wait = (tokens - available) / self.rate
+            buckets[key] = (available, now)
+
+            # the least recently used first
+            while buckets:
+                oldest_key, (_, updated) = next(iter(buckets.items()))
+                if (now - updated < self.idle_time
+                        and len(buckets) <= self.max_shard_keys):
+                    break
+                del buckets[oldest_key]
+        return wait
+
+    def __len__(self) -> int:
+        return sum(len(buckets) for _, buckets in self._shards)
+
+
+def get_client_ip(forwarded_for: bool = False,
+                  proxies: int = 1) -> Optional[str]:
+    """Get the client IP of the request.
+
+    The client sets any "X-Forwarded-For" entries it wants, only the ones
+    appended by the trusted proxies, from the right, can be trusted.
+
+    Args:
+        forwarded_for (bool): Use the "X-Forwarded-For" header, only
+                              behind a trusted reverse proxy.
+                              Defaults to False.
+        proxies (int): Trusted proxies in front of the app, the client IP
+                       is the entry added by the farthest one.
+                       Defaults to 1.
+
+    Returns:
+        Optional[str]: Client IP.
+    """
+    remote_addr = request.environ.get('REMOTE_ADDR')
+    if not forwarded_for:
+        return remote_addr
+    header = request.environ.get('HTTP_X_FORWARDED_FOR', '')
+    entries = [entry.strip() for entry in header.split(',') if entry.strip()]
+    # not through all the proxies, e.g. a direct request
+    if len(entries) < proxies:
+        return remote_addr
+    return entries[-proxies]
+
+
+def get_username() -> Optional[str]:
+    """Get the username of the JSON body, e.g. on login.
+
+    Returns:
+        Optional[str]: Username.
+    """
+    data = get_json_from_request()
+    if isinstance(data, dict):
+        username = data.get('username')
+        if isinstance(username, str):
+            return username
+    return None
+
+
+class RateLimitPlugin:
+    """Bottle plugin limiting the requests of the configured routes,
+    with a 429 and "Retry-After" when a bucket is empty.
+    """
+    name = 'rate_limit'
+    api = 2
+
+    def __init__(self, rate_limit_settings: dict) -> None:
+        """
+        Args:
+            rate_limit_settings (dict): RATE_LIMIT settings.
+        """
+        self.routes = rate_limit_settings.get('ROUTES')
+        self.shards = rate_limit_settings.get('SHARDS')
+        self.max_keys = rate_limit_settings.get('MAX_KEYS')
+        self.forwarded_for = rate_limit_settings.get('FORWARDED_FOR')
+        self.proxies = rate_limit_settings.get('PROXIES')
+        self.key_functions: Dict[str, Callable[[], Optional[str]]] = {
+            'IP': lambda: get_client_ip(self.forwarded_for, self.proxies),
+            'USERNAME': get_username,
+        }
+        # "<METHOD> <route>" -> [(key function, buckets)]
+        self.limiters: Dict[str, List[Tuple[Callable, TokenBuckets]]] = dict()
+        self.rejected = 0
+
+    def get_checks(self, route_key: str
+                   ) -> List[Tuple[Callable, TokenBuckets]]:
+        """Get the limits of a route, created once, so they are kept
+        when Bottle applies the plugins again, e.g. after "app.reset()".
+
+        Args:
+            route_key (str): "<METHOD> <route>".
+
+        Returns:
+            List[Tuple[Callable, TokenBuckets]]: Key function and buckets
+                                                 of each limit.
+        """
+        if route_key not in self.limiters:
+            self.limiters[route_key] = [
+                (self.key_functions[key_type],
+                 TokenBuckets(limit.get('RATE'), limit.get('BURST'),
+                              shards=self.shards, max_keys=self.max_keys))
+                for key_type, limit in self.routes.get(route_key).items()
+            ]
+        return self.limiters[route_key]
+
+    def apply(self, callback: Callable, route: Route) -> Callable:
+        route_key = f'{route.method} {route.rule}'
+        if not self.routes.get(route_key):
+            return callback
+        checks = self.get_checks(route_key)
+
+        def wrapper(*args, **kwargs):
+            for get_key, buckets in checks:
+                key = get_key()
+                if key is None:
+                    continue
+                wait = buckets.consume(key)
+                if wait:
+                    self.rejected += 1
+                    raise HTTPErrorTooManyRequests(retry_after=ceil(wait))
+            return callback(*args, **kwargs)
+        return wrapper
+
+    def stats(self) -> dict:
+        """Limiter counters.
+
+        Returns:
+            dict: Number of buckets and rejected requests.
+        """
+        return {
+            'keys': sum(len(buckets) for checks in self.limiters.values()
+                        for _, buckets in checks),
+            'rejected': self.rejected,
+        }
@@ -1,8 +1,16 @@
-from typing import Optional
+from functools import lru_cache
+from typing import Any, Optional, Type
 
-from bottle import request
+from bottle import BaseRequest, HTTPError, request
 
 from api.models import User
+from utils.exceptions import (JSONResponseBadRequest,
+                              JSONResponseRequestTooLarge)
+from utils.json_codec import dumps as json_dumps, loads as json_loads
+from utils.response import etag_matches
+
+
+JSON_ENVIRON_KEY = 'aimo.json'
 
 
 def get_user_from_request() -> Optional[User]:
@@ -15,3 +23,72 @@ def get_user_from_request() -> Optional[User]:
     if hasattr(request, 'user'):
         user = request.user
     return user
+
+
+@lru_cache(maxsize=None)
+def get_request_class(max_size: int) -> Type[BaseRequest]:
+    """Get a request class with another max body size, bottle reads
+    "MEMFILE_MAX" from the class, the instance attributes are stored
+    in the environ.
+
+    Args:
+        max_size (int): Max body bytes.
+
+    Returns:
+        Type[BaseRequest]: Request class.
+    """
+    return type('BodyRequest', (BaseRequest, ), {'MEMFILE_MAX': max_size})
+
+
+def get_json_from_request(max_size: Optional[int] = None) -> Any:
+    """Get the JSON body from request, decoded with the API JSON codec.
+    Based on bottle "request.json", it's decoded once by request.
+
+    Args:
+        max_size (int, None): Max body bytes. Defaults to None
+                              (bottle "MEMFILE_MAX", 100 KiB).
+
+    Raises:
+        JSONResponseBadRequest: If the body is malformed.
+        JSONResponseRequestTooLarge: If the body is bigger than allowed.
+
+    Returns:
+        Any: JSON body, None if it isn't a JSON request.
+    """
+    if JSON_ENVIRON_KEY in request.environ:
+        return request.environ[JSON_ENVIRON_KEY]
+    data = None
+    content_type = request.environ.get('CONTENT_TYPE', '')
+    if content_type.lower().split(';')[0] == 'application/json':
+        # a request of the same environ, the global one is shared
+        request_class = get_request_class(max_size or BaseRequest.MEMFILE_MAX)
+        body_request = request_class(request.environ)
+        try:
+            body = body_request._get_body_string()
+        except HTTPError as error:
+            if error.status_code != 413:
+                raise
+            message = f'Max body size is {body_request.MEMFILE_MAX} bytes.'
+            data = json_dumps({'detail': [message, ]})
+            raise JSONResponseRequestTooLarge(body=data)
+        if body:
+            try:
+                data = json_loads(body)
+            except ValueError as error:
+                data = json_dumps({'detail': ['Malformed JSON body.', ]})
+                raise JSONResponseBadRequest(body=data)
+    request.environ[JSON_ENVIRON_KEY] = data
+    return data
+
+
+def request_etag_matches(etag: str) -> bool:
+    """Check the "If-None-Match" header of the request,
+    with the weak comparison required for it.
+
+    Args:
+        etag (str): Quoted ETag of the current representation.
+
+    Returns:
+        bool: If the client already has the representation.
+    """
+    return etag_matches(request.get_header('If-None-Match'), etag)
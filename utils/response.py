@@ -1,13 +1,59 @@
+from hashlib import blake2b
+from typing import Optional
+
 from bottle import HTTPResponse
 
+from utils.json_codec import dumps as json_dumps
+
 
 class JSONResponse(HTTPResponse):
     default_status = 200
 
     def __init__(self, body='', status=None, headers=None, **more_headers):
+        if isinstance(body, (dict, list)):
+            body = json_dumps(body)
         more_headers['Content-Type'] = 'application/json'
         super().__init__(body, status, headers, **more_headers)
 
 
 class JSONResponseCreated(JSONResponse):
     default_status = 201
+
+
+class ResponseNotModified(HTTPResponse):
+    default_status = 304
+
+
+def make_etag(*parts) -> str:
+    """Build a strong ETag from the parts identifying the representation.
+
+    Returns:
+        str: Quoted ETag.
+    """
+    digest = blake2b(digest_size=16)
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Check an "If-None-Match" header,
+    with the weak comparison required for it.
+
+    Args:
+        header (str, None): Header value.
+        etag (str): Quoted ETag of the current representation.
+
+    Returns:
+        bool: If the client already has the representation.
+    """
+    if not header:
+        return False
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag in ('*', etag):
+            return True
+    return False
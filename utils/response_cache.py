@@ -0,0 +1,335 @@
+"""Cache of serialized responses, scoped by user.
+
+Every entry belongs to a scope (e.g. the user ID), so all the entries of
+a user are invalidated at once when their data changes.
+
+Backends:
+    memory: in-process, each worker has its own entries.
+    sqlite: a SQLite file shared by the workers of the host.
+    none: disabled.
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic, time
+from typing import Dict, Hashable, Optional, Set
+
+from peewee import DatabaseError, SqliteDatabase
+
+from settings import RESPONSE_CACHE as CACHE_SETTINGS
+
+
+class ResponseCache(ABC):
+    """Response cache interface, bounded in bytes,
+    with a time to live for every entry.
+    """
+    backend = None
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024,
+                 max_entry_bytes: int = 1024 * 1024,
+                 ttl: float = 60) -> None:
+        """
+        Args:
+            max_bytes (int): Memory budget of the values.
+                             Defaults to 64 MiB.
+            max_entry_bytes (int): Bigger values aren't cached.
+                                   Defaults to 1 MiB.
+            ttl (float): Time to live in seconds. Defaults to 60.
+        """
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    def get(self, scope: Hashable, key: str) -> Optional[bytes]:
+        """Get a response and mark it as the most recently used.
+
+        Args:
+            scope (Hashable): Entry scope, e.g. the user ID.
+            key (str): Entry key in the scope.
+
+        Returns:
+            Optional[bytes]: Response body, None if it isn't cached.
+        """
+
+    @abstractmethod
+    def set(self, scope: Hashable, key: str, value: bytes) -> None:
+        """Add or replace a response, evicting the least recently used.
+
+        Args:
+            scope (Hashable): Entry scope, e.g. the user ID.
+            key (str): Entry key in the scope.
+            value (bytes): Response body.
+        """
+
+    @abstractmethod
+    def invalidate(self, scope: Hashable) -> None:
+        """Remove all the responses of the scope.
+
+        Args:
+            scope (Hashable): Entry scope, e.g. the user ID.
+        """
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove all the responses."""
+
+    @abstractmethod
+    def get_usage(self) -> Dict[str, int]:
+        """Get the number of entries and their bytes.
+
+        Returns:
+            Dict[str, int]: Entries and bytes.
+        """
+
+    def close(self) -> None:
+        """Release the backend resources, e.g. before forking."""
+
+    def stats(self) -> dict:
+        """Cache counters, hits and misses are by process.
+
+        Returns:
+            dict: Backend, hits, misses, hit ratio, entries,
+                  bytes and max bytes.
+        """
+        requests = self.hits + self.misses
+        return {
+            'backend': self.backend,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / requests if requests else 0.0,
+            **self.get_usage(),
+            'max_bytes': self.max_bytes,
+        }
+
+
+class NullResponseCache(ResponseCache):
+    """Disabled cache, nothing is stored."""
+    backend = 'none'
+
+    def get(self, scope: Hashable, key: str) -> Optional[bytes]:
+        self.misses += 1
+        return None
+
+    def set(self, scope: Hashable, key: str, value: bytes) -> None:
+        pass
+
+    def invalidate(self, scope: Hashable) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def get_usage(self) -> Dict[str, int]:
+        return {'entries': 0, 'bytes': 0}
+
+
+class MemoryResponseCache(ResponseCache):
+    """Thread safe in-process cache."""
+    backend = 'memory'
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.size = 0
+        # (scope, key) -> (value, expires_at)
+        self._entries = OrderedDict()
+        self._scopes: Dict[Hashable, Set[str]] = dict()
+        self._lock = Lock()
+
+    def get(self, scope: Hashable, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get((scope, key))
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= monotonic():
+                self._remove(scope, key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end((scope, key))
+            self.hits += 1
+            return value
+
+    def set(self, scope: Hashable, key: str, value: bytes) -> None:
+        if len(value) > self.max_entry_bytes:
+            return
+        expires_at = monotonic() + self.ttl
+        with self._lock:
+            self._remove(scope, key)
+            self._entries[(scope, key)] = (value, expires_at)
+            self._scopes.setdefault(scope, set()).add(key)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                (old_scope, old_key), _ = next(iter(self._entries.items()))
+                self._remove(old_scope, old_key)
+
+    def _remove(self, scope: Hashable, key: str) -> None:
+        # the lock must be held
+        entry = self._entries.pop((scope, key), None)
+        if entry is None:
+            return
+        self.size -= len(entry[0])
+        keys = self._scopes[scope]
+        keys.discard(key)
+        if not keys:
+            del self._scopes[scope]
+
+    def invalidate(self, scope: Hashable) -> None:
+        with self._lock:
+            for key in list(self._scopes.get(scope, ())):
+                self._remove(scope, key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+            self.size = 0
+
+    def get_usage(self) -> Dict[str, int]:
+        return {'entries': len(self._entries), 'bytes': self.size}
+
+
+class SQLiteResponseCache(ResponseCache):
+    """Cache shared by the processes of the host, in a SQLite file.
+
+    The cache never fails a request, a backend error is a miss.
+    """
+    backend = 'sqlite'
+    # seconds between two updates of the last access of an entry
+    touch_interval = 1.0
+
+    def __init__(self, *args, path: str = 'cache.sqlite3',
+                 **kwargs) -> None:
+        """
+        Args:
+            path (str): SQLite file. Defaults to "cache.sqlite3".
+        """
+        super().__init__(*args, **kwargs)
+        self.path = path
+        self.database = SqliteDatabase(
+            path,
+            pragmas={'journal_mode': 'wal', 'synchronous': 'off'},
+            timeout=5,
+            check_same_thread=False,
+        )
+        self._ready = False
+
+    def execute_sql(self, sql: str, params: tuple = ()):
+        if not self._ready:
+            self.database.execute_sql(
+                'CREATE TABLE IF NOT EXISTS "response_cache" ('
+                '"scope" TEXT NOT NULL, '
+                '"key" TEXT NOT NULL, '
+                '"value" BLOB NOT NULL, '
+                '"size" INTEGER NOT NULL, '
+                '"expires_at" REAL NOT NULL, '
+                '"accessed_at" REAL NOT NULL, '
+                'PRIMARY KEY ("scope", "key"))'
+            )
+            self._ready = True
+        return self.database.execute_sql(sql, params)
+
+    def get(self, scope: Hashable, key: str) -> Optional[bytes]:
+        now = time()
+        try:
+            row = self.execute_sql(
+                'SELECT "value", "accessed_at" FROM "response_cache" '
+                'WHERE "scope" = ? AND "key" = ? AND "expires_at" > ?',
+                (str(scope), key, now),
+            ).fetchone()
+            if row and now - row[1] > self.touch_interval:
+                self.execute_sql(
+                    'UPDATE "response_cache" SET "accessed_at" = ? '
+                    'WHERE "scope" = ? AND "key" = ?',
+                    (now, str(scope), key),
+                )
+        except DatabaseError:
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return bytes(row[0])
+
+    def set(self, scope: Hashable, key: str, value: bytes) -> None:
+        if len(value) > self.max_entry_bytes:
+            return
+        now = time()
+        try:
+            with self.database.atomic():
+                self.execute_sql(
+                    'INSERT OR REPLACE INTO "response_cache" '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (str(scope), key, value, len(value), now + self.ttl,
+                     now),
+                )
+                self.execute_sql(
+                    'DELETE FROM "response_cache" WHERE "expires_at" <= ?',
+                    (now, ),
+                )
+                # the least recently used beyond the budget
+                self.execute_sql(
+                    'DELETE FROM "response_cache" '
+                    'WHERE ("scope", "key") IN ('
+                    'SELECT "scope", "key" FROM ('
+                    'SELECT "scope", "key", SUM("size") OVER ('
+                    'ORDER BY "accessed_at" DESC, "rowid" DESC) AS "total" '
+                    'FROM "response_cache") WHERE "total" > ?)',
+                    (self.max_bytes, ),
+                )
+        except DatabaseError:
+            pass
+
+    def invalidate(self, scope: Hashable) -> None:
+        try:
+            self.execute_sql('DELETE FROM "response_cache" WHERE "scope" = ?',
+                             (str(scope), ))
+        except DatabaseError:
+            pass
+
+    def clear(self) -> None:
+        try:
+            self.execute_sql('DELETE FROM "response_cache"')
+        except DatabaseError:
+            pass
+
+    def get_usage(self) -> Dict[str, int]:
+        try:
+            entries, size = self.execute_sql(
+                'SELECT COUNT(*), TOTAL("size") FROM "response_cache"'
+            ).fetchone()
+        except DatabaseError:
+            entries, size = 0, 0
+        return {'entries': entries, 'bytes': int(size)}
+
+    def close(self) -> None:
+        if not self.database.is_closed():
+            self.database.close()
+
+
+def create_response_cache(cache_settings: dict) -> ResponseCache:
+    """Create the response cache of the configured backend.
+
+    Args:
+        cache_settings (dict): RESPONSE_CACHE settings.
+
+    Returns:
+        ResponseCache: Response cache instance.
+    """
+    backend = cache_settings.get('BACKEND')
+    options = {
+        'max_bytes': cache_settings.get('MAX_BYTES'),
+        'max_entry_bytes': cache_settings.get('MAX_ENTRY_BYTES'),
+        'ttl': cache_settings.get('TTL').total_seconds(),
+    }
+    if backend == 'sqlite':
+        return SQLiteResponseCache(path=cache_settings.get('PATH'), **options)
+    if backend == 'memory':
+        return MemoryResponseCache(**options)
+    return NullResponseCache(**options)
+
+
+response_cache = create_response_cache(CACHE_SETTINGS)
@@ -0,0 +1,224 @@
+from typing import Callable, Iterable, List, Optional, Tuple, Type
+
+from marshmallow import EXCLUDE, Schema
+from marshmallow.decorators import (POST_DUMP, POST_LOAD, PRE_DUMP, PRE_LOAD,
+                                    VALIDATES, VALIDATES_SCHEMA)
+from marshmallow.fields import DateTime, Field, Int, Str
+from peewee import Model
+
+from utils.json_codec import dumps as json_dumps
+
+
+class RowDumper:
+    """Dump query rows (tuples) as the schema dumps the model instances,
+    without building the model instances nor introspecting the schema.
+
+    The dump function is generated once from the schema's dump fields,
+    with inline conversions for the common fields, e.g.:
+
+        def dump_row(row):
+            v0, v1 = row
+            return {
+                'id': None if v0 is None else int(v0),
+                'name': None if v1 is None else str(v1),
+            }
+    """
+
+    def __init__(self, schema: Schema, model: Type[Model],
+                 extra_fields: Tuple[str, ...] = ()) -> None:
+        """
+        Args:
+            schema (Schema): Schema instance, "only" is honored.
+            model (Type[Model]): Model of the rows.
+            extra_fields (Tuple[str, ...]): Model fields also selected,
+                                            after the schema ones, but not
+                                            dumped, e.g. the pagination
+                                            keys. Defaults to ().
+
+        Raises:
+            ValueError: If the schema has dump processors.
+        """
+        if schema._has_processors(PRE_DUMP) or schema._has_processors(
+                POST_DUMP):
+            raise ValueError(f'{schema} has dump processors.')
+        columns = {
+            name: getattr(model, field.attribute or name)
+            for name, field in schema.dump_fields.items()
+        }
+        for name in extra_fields:
+            columns.setdefault(name, getattr(model, name))
+        self.field_names = tuple(columns)
+        self.columns = tuple(columns.values())
+        self.dump_row = self.compile(schema)
+
+    def compile(self, schema: Schema) -> Callable[[tuple], dict]:
+        """Generate the dump function.
+
+        Args:
+            schema (Schema): Schema instance.
+
+        Returns:
+            Callable[[tuple], dict]: Dump function.
+        """
+        namespace = dict()
+        values = list()
+        items = list()
+        for index, (name, field) in enumerate(schema.dump_fields.items()):
+            value = f'v{index}'
+            conversion = self.get_conversion(field, value)
+            if conversion is None:
+                serialize = f'serialize_{index}'
+                namespace[serialize] = field._serialize
+                conversion = f'{serialize}({value}, {name!r}, None)'
+            key = field.data_key or name
+            values.append(value)
+            items.append(f'        {key!r}: None if {value} is None '
+                         f'else {conversion},')
+        # the extra columns are at the end
+        unpack = ', *_' if len(values) < len(self.field_names) else ','
+        source = '\n'.join([
+            'def dump_row(row):',
+            f'    {", ".join(values)}{unpack} = row',
+            '    return {',
+            *items,
+            '    }',
+        ])
+        exec(compile(source, f'<{type(schema).__name__} dumper>', 'exec'),
+             namespace)
+        return namespace['dump_row']
+
+    @staticmethod
+    def get_conversion(field: Field, value: str) -> str:
+        """Get the inline conversion, the same as the field serialization.
+
+        Args:
+            field (Field): Schema field.
+            value (str): Variable name.
+
+        Returns:
+            str: Python expression, None if there isn't one.
+        """
+        field_class = type(field)
+        if field_class is Int and not field.as_string:
+            return f'int({value})'
+        if field_class is Str:
+            return f'str({value})'
+        if field_class is DateTime and field.format in (None, 'iso'):
+            return f'{value}.isoformat()'
+        return None
+
+    def index(self, field_name: str) -> int:
+        """Get the position of the field in the rows.
+
+        Args:
+            field_name (str): Schema or extra field name.
+
+        Returns:
+            int: Row position.
+        """
+        return self.field_names.index(field_name)
+
+    def __call__(self, row: tuple) -> dict:
+        return self.dump_row(row)
+
+
+class StrLoader:
+    """Load a list of items as the schema loads them, without introspecting
+    the schema for each item, when every field is a string.
+
+    Only for schemas whose load fields are "Str" without validators.
+    An item with another value, or a missing field, makes the whole list
+    be loaded by the schema, so the errors are its own ones.
+    """
+
+    def __init__(self, schema: Schema) -> None:
+        """
+        Args:
+            schema (Schema): Schema instance, "many" is ignored.
+
+        Raises:
+            ValueError: If the schema can't be loaded this way.
+        """
+        if any(schema._has_processors(tag) for tag in (
+                PRE_LOAD, POST_LOAD, VALIDATES, VALIDATES_SCHEMA)):
+            raise ValueError(f'{schema} has load processors.')
+        if schema.unknown != EXCLUDE:
+            raise ValueError(f'{schema} does not exclude the unknown fields.')
+        for name, field in schema.load_fields.items():
+            if type(field) is not Str or field.validators:
+                raise ValueError(f'{schema} field "{name}" is not a plain '
+                                 f'string.')
+        self.schema = schema
+        # (data key, attribute)
+        self.keys = tuple((field.data_key or name, field.attribute or name)
+                          for name, field in schema.load_fields.items())
+
+    def load_item(self, item: dict) -> Optional[dict]:
+        """Load an item.
+
+        Args:
+            item (dict): Decoded JSON item.
+
+        Returns:
+            dict: Loaded item, None if the schema must load it.
+        """
+        if type(item) is not dict:
+            return None
+        result = dict()
+        for key, attribute in self.keys:
+            value = item.get(key)
+            if type(value) is not str:
+                return None
+            result[attribute] = value
+        return result
+
+    def load(self, items: list) -> List[dict]:
+        """Load the items.
+
+        Args:
+            items (list): Decoded JSON items.
+
+        Raises:
+            ValidationError: As the schema, with the errors by item index.
+
+        Returns:
+            List[dict]: Loaded items.
+        """
+        if type(items) is list:
+            results = [self.load_item(item) for item in items]
+            if None not in results:
+                return results
+        return self.schema.load(items, many=True)
+
+    def __call__(self, items: list) -> List[dict]:
+        return self.load(items)
+
+
+def check_dumper_parity(schema: Schema, dumper: RowDumper,
+                        instances: Iterable[Model],
+                        rows: Optional[Iterable[tuple]] = None
+                        ) -> List[Tuple[str, str]]:
+    """Compare the JSON of the schema and the dumper.
+
+    Args:
+        schema (Schema): Schema instance.
+        dumper (RowDumper): Dumper of the schema.
+        instances (Iterable[Model]): Model instances.
+        rows (Iterable[tuple], None): Rows of the same instances,
+                                      built from them if None.
+
+    Returns:
+        List[Tuple[str, str]]: Mismatches (schema JSON, dumper JSON).
+    """
+    instances = list(instances)
+    if rows is None:
+        rows = [tuple(getattr(instance, column.name)
+                      for column in dumper.columns)
+                for instance in instances]
+    mismatches = list()
+    for instance, row in zip(instances, rows):
+        expected = schema.dumps(instance)
+        result = json_dumps(dumper(row))
+        if expected != result:
+            mismatches.append((expected, result))
+    return mismatches
@@ -0,0 +1,365 @@
+"""Production WSGI servers, without an external app server.
+
+A master process binds the socket, loads the app once and forks the
+workers, they accept the connections of the shared socket.
+The master replaces the workers that exit, e.g. after "max_requests".
+
+Signals (master):
+    SIGHUP: graceful reload, new workers replace the current ones.
+    SIGTERM, SIGINT: graceful shutdown.
+
+Worker modes:
+    prefork: one request at a time by worker.
+    threaded: a pool of threads by worker, peewee connections
+              are thread-local.
+    gevent: a pool of greenlets by worker, gevent must be installed and
+            monkey patching must be done before importing the app.
+"""
+import os
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from select import select
+from socket import SO_REUSEADDR, SOL_SOCKET, socket
+from sys import stderr
+from threading import BoundedSemaphore
+from time import monotonic
+from typing import Callable, Dict, List, Optional
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    """Request handler without access log."""
+
+    def log_request(self, *args, **kwargs) -> None:
+        pass
+
+
+class SharedSocketWSGIServer(WSGIServer):
+    """wsgiref server accepting on an already listening socket."""
+
+    def __init__(self, listener: socket, handler_class: type) -> None:
+        super().__init__(listener.getsockname(), handler_class,
+                         bind_and_activate=False)
+        self.socket.close()
+        self.socket = listener
+        self.server_address = listener.getsockname()
+        self.server_name, self.server_port = self.server_address[:2]
+        self.setup_environ()
+
+    def server_bind(self) -> None:
+        pass
+
+    def get_request(self) -> tuple:
+        # the shared socket is non blocking, the connections aren't
+        connection, address = self.socket.accept()
+        connection.setblocking(True)
+        return connection, address
+
+    def server_close(self) -> None:
+        # the socket belongs to the master
+        pass
+
+
+class Worker:
+    """Worker process serving the app until it's stopped
+    or it handles "max_requests" requests.
+    """
+    poll_interval = 1.0
+
+    def __init__(self, app: Callable, listener: socket, max_requests: int = 0,
+                 threads: int = 1, access_log: bool = False) -> None:
+        """
+        Args:
+            app (Callable): WSGI app.
+            listener (socket): Shared listening socket.
+            max_requests (int): Requests before exiting, 0 is unlimited.
+                                Defaults to 0.
+            threads (int): Concurrent requests. Defaults to 1.
+            access_log (bool): Log the requests. Defaults to False.
+        """
+        self.app = app
+        self.listener = listener
+        self.max_requests = max_requests
+        self.threads = threads
+        self.handler_class = (WSGIRequestHandler if access_log
+                              else QuietWSGIRequestHandler)
+        self.alive = True
+        self.handled_requests = 0
+
+    def handle_exit(self, signum: int, frame) -> None:
+        self.alive = False
+
+    def init_signals(self) -> None:
+        signal.signal(signal.SIGTERM, self.handle_exit)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    def should_run(self) -> bool:
+        if self.max_requests and self.handled_requests >= self.max_requests:
+            return False
+        return self.alive
+
+    def run(self) -> None:
+        self.init_signals()
+        server = SharedSocketWSGIServer(self.listener, self.handler_class)
+        server.set_app(self.app)
+        while self.should_run():
+            ready, _, _ = select([self.listener], [], [], self.poll_interval)
+            if ready:
+                server._handle_request_noblock()
+                self.handled_requests += 1
+
+
+class ThreadedWorker(Worker):
+    """Worker handling the requests in a pool of threads."""
+
+    def run(self) -> None:
+        self.init_signals()
+        server = SharedSocketWSGIServer(self.listener, self.handler_class)
+        server.set_app(self.app)
+        executor = ThreadPoolExecutor(max_workers=self.threads)
+        free_threads = BoundedSemaphore(self.threads)
+
+        def handle_request(request: socket, client_address: tuple) -> None:
+            try:
+                server.finish_request(request, client_address)
+            except Exception:
+                server.handle_error(request, client_address)
+            finally:
+                server.shutdown_request(request)
+                free_threads.release()
+
+        try:
+            while self.should_run():
+                # accept only when a thread is free,
+                # otherwise other workers take the connections
+                if not free_threads.acquire(timeout=self.poll_interval):
+                    continue
+                ready, _, _ = select([self.listener], [], [],
+                                     self.poll_interval)
+                try:
+                    if not ready:
+                        raise BlockingIOError
+                    request, client_address = server.get_request()
+                except OSError:
+                    free_threads.release()
+                    continue
+                executor.submit(handle_request, request, client_address)
+                self.handled_requests += 1
+        finally:
+            executor.shutdown(wait=True)
+
+
+class GeventWorker(Worker):
+    """Worker handling the requests in a pool of greenlets."""
+
+    def run(self) -> None:
+        from gevent import signal_handler, spawn
+        from gevent.pool import Pool
+        from gevent.pywsgi import WSGIServer as GeventWSGIServer
+
+        def app(environ: dict, start_response: Callable):
+            self.handled_requests += 1
+            if not self.should_run():
+                spawn(server.stop, timeout=self.poll_interval)
+            return self.app(environ, start_response)
+
+        def stop() -> None:
+            self.alive = False
+            spawn(server.stop, timeout=self.poll_interval)
+
+        signal_handler(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        log = 'default' if self.handler_class is WSGIRequestHandler else None
+        server = GeventWSGIServer(self.listener, app,
+                                  spawn=Pool(self.threads), log=log)
+        server.serve_forever()
+
+
+class Master:
+    """Pre-forking master process."""
+    worker_classes = {
+        'prefork': Worker,
+        'threaded': ThreadedWorker,
+        'gevent': GeventWorker,
+    }
+
+    def __init__(self, app: Callable, host: str = '127.0.0.1',
+                 port: int = 8000, mode: str = 'prefork', workers: int = 1,
+                 threads: int = 1, max_requests: int = 0, backlog: int = 2048,
+                 graceful_timeout: float = 30,
+                 before_fork: Optional[Callable[[], None]] = None,
+                 access_log: bool = False) -> None:
+        """
+        Args:
+            app (Callable): WSGI app, already loaded.
+            host (str): Defaults to "127.0.0.1".
+            port (int): Defaults to 8000.
+            mode (str): "prefork", "threaded" or "gevent".
+                        Defaults to "prefork".
+            workers (int): Number of worker processes. Defaults to 1.
+            threads (int): Threads or greenlets by worker. Defaults to 1.
+            max_requests (int): Requests before replacing a worker,
+                                0 is unlimited. Defaults to 0.
+            backlog (int): Listen queue size. Defaults to 2048.
+            graceful_timeout (float): Seconds to wait for the workers
+                                      before killing them. Defaults to 30.
+            before_fork (Callable, None): Called once before forking,
+                                          e.g. to close the DB connections.
+            access_log (bool): Log the requests. Defaults to False.
+        """
+        self.app = app
+        self.address = (host, port)
+        self.worker_class = self.worker_classes[mode]
+        self.workers = workers
+        self.threads = threads if mode != 'prefork' else 1
+        self.max_requests = max_requests
+        self.backlog = backlog
+        self.graceful_timeout = graceful_timeout
+        self.before_fork = before_fork
+        self.access_log = access_log
+        self.listener = None
+        self.worker_pids: Dict[int, float] = dict()
+        self.signals: List[int] = list()
+        self.running = False
+
+    def log(self, message: str) -> None:
+        print(f'[{os.getpid()}] {message}', file=stderr, flush=True)
+
+    def create_listener(self) -> socket:
+        listener = socket()
+        listener.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        listener.bind(self.address)
+        listener.listen(self.backlog)
+        listener.setblocking(False)
+        return listener
+
+    def spawn_worker(self) -> None:
+        pid = os.fork()
+        if pid:
+            self.worker_pids[pid] = monotonic()
+            return
+
+        # worker process
+        exit_code = 0
+        try:
+            signal.set_wakeup_fd(-1)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            worker = self.worker_class(
+                self.app, self.listener, max_requests=self.max_requests,
+                threads=self.threads, access_log=self.access_log,
+            )
+            worker.run()
+        except BaseException as error:
+            self.log(f'Worker failed: {error!r}')
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def spawn_workers(self) -> None:
+        while len(self.worker_pids) < self.workers:
+            self.spawn_worker()
+
+    def stop_workers(self, pids: List[int], timeout: float) -> None:
+        """Ask the workers to finish their requests, kill them on timeout.
+
+        Args:
+            pids (List[int]): Worker process IDs.
+            timeout (float): Seconds to wait for them.
+        """
+        for pid in pids:
+            self.kill_worker(pid, signal.SIGTERM)
+        deadline = monotonic() + timeout
+        while monotonic() < deadline:
+            self.reap_workers()
+            if not any(pid in self.worker_pids for pid in pids):
+                return
+            select([], [], [], 0.1)
+        for pid in pids:
+            self.kill_worker(pid, signal.SIGKILL)
+        self.reap_workers()
+
+    def kill_worker(self, pid: int, signum: int) -> None:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            self.worker_pids.pop(pid, None)
+
+    def reap_workers(self) -> List[float]:
+        """Forget the exited workers.
+
+        Returns:
+            List[float]: Lifetime in seconds of the failed workers.
+        """
+        lifetimes = list()
+        while self.worker_pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.worker_pids.clear()
+                break
+            if not pid:
+                break
+            started = self.worker_pids.pop(pid, None)
+            succeeded = (os.WIFEXITED(status)
+                         and os.WEXITSTATUS(status) == 0)
+            if started is not None and not succeeded:
+                lifetimes.append(monotonic() - started)
+        return lifetimes
+
+    def reload(self) -> None:
+        """Replace the workers, the new ones are spawned first."""
+        self.log('Reloading workers')
+        old_pids = list(self.worker_pids)
+        for _ in range(self.workers):
+            self.spawn_worker()
+        self.stop_workers(old_pids, self.graceful_timeout)
+
+    def handle_signal(self, signum: int, frame) -> None:
+        self.signals.append(signum)
+
+    def init_signals(self, wakeup_fd: int) -> None:
+        signal.set_wakeup_fd(wakeup_fd)
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT,
+                       signal.SIGCHLD):
+            signal.signal(signum, self.handle_signal)
+
+    def run(self) -> None:
+        self.listener = self.create_listener()
+        if self.before_fork:
+            self.before_fork()
+        wakeup_read_fd, wakeup_write_fd = os.pipe()
+        os.set_blocking(wakeup_read_fd, False)
+        os.set_blocking(wakeup_write_fd, False)
+        self.init_signals(wakeup_write_fd)
+
+        self.running = True
+        self.log(f'Listening at http://{self.address[0]}:{self.address[1]}'
+                 f' ({self.worker_class.__name__} x {self.workers},'
+                 f' {self.threads} threads)')
+        self.spawn_workers()
+        try:
+            while self.running:
+                select([wakeup_read_fd], [], [], 1.0)
+                try:
+                    os.read(wakeup_read_fd, 1024)
+                except BlockingIOError:
+                    pass
+                while self.signals:
+                    signum = self.signals.pop(0)
+                    if signum == signal.SIGHUP:
+                        self.reload()
+                    elif signum in (signal.SIGTERM, signal.SIGINT):
+                        self.running = False
+                lifetimes = self.reap_workers()
+                if self.running and lifetimes and min(lifetimes) < 1:
+                    # don't spawn in a loop workers failing on startup
+                    self.log('Workers failed on startup')
+                    select([], [], [], 1.0)
+                if self.running:
+                    self.spawn_workers()
+        finally:
+            self.log('Shutting down')
+            self.stop_workers(list(self.worker_pids), self.graceful_timeout)
+            self.listener.close()
@@ -1,17 +1,26 @@
+from functools import lru_cache
+
 from bottle import load
 
 
+@lru_cache(maxsize=None)
+def _load_settings(path: str) -> dict:
+    config_obj = load(path)
+    return {key: getattr(config_obj, key) for key in dir(config_obj)
+            if key.isupper()}
+
+
 def load_module_as_dict(path: str) -> dict:
     """Load values from a Python module as dict.
     Based on bootle source code.
 
+    The module is read once by process, e.g. "settings" is shared
+    by server.py, client.py and database.py.
+
     Args:
         path (str): Python module name.
 
     Returns:
-        dict: Settings.
+        dict: Settings, a copy that can be updated.
     """
-    config_obj = load(path)
-    obj = {key: getattr(config_obj, key) for key in dir(config_obj)
-           if key.isupper()}
-    return obj
+    return dict(_load_settings(path))
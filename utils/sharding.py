@@ -0,0 +1,313 @@
+"""Sharding of the models by user, across several SQLite databases.
+
+Each shard is a database file with its own writer lock. The models
+bound to a ShardRouter have their rows in the shard of their user:
+the queries are bound to it with "query.bind(router.get_database(user_id))"
+and the model instances are saved within "with router.bind(user_id)".
+"""
+import os
+import sqlite3
+from contextlib import closing, contextmanager
+from hashlib import blake2b
+from threading import Lock, local
+from typing import Dict, Iterator, List
+
+from peewee import Database
+
+
+class ShardNotBound(Exception):
+    """A sharded model was used outside of a shard binding."""
+
+
+def get_shard_index(user_id: int, shards: int) -> int:
+    """Get the shard of a user, stable between processes and restarts,
+    unlike the "hash" of the strings.
+
+    Args:
+        user_id (int): User ID.
+        shards (int): Number of shards.
+
+    Returns:
+        int: Shard index.
+    """
+    if shards == 1:
+        return 0
+    digest = blake2b(str(user_id).encode('ascii'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shards
+
+
+class ShardRouter:
+    """Database of the sharded models, it runs the queries on the shard
+    bound to the current thread. With a single shard it's always used.
+    """
+
+    def __init__(self, databases: List[Database]) -> None:
+        """
+        Args:
+            databases (List[Database]): Shard databases, in order,
+                                        changing it needs a rebalance.
+        """
+        self.databases = databases
+        self._local = local()
+
+    def get_index(self, user_id: int) -> int:
+        """Get the shard index of a user.
+
+        Args:
+            user_id (int): User ID.
+
+        Returns:
+            int: Shard index.
+        """
+        return get_shard_index(user_id, len(self.databases))
+
+    def get_database(self, user_id: int) -> Database:
+        """Get the shard of a user.
+
+        Args:
+            user_id (int): User ID.
+
+        Returns:
+            Database: Shard database.
+        """
+        return self.databases[self.get_index(user_id)]
+
+    @property
+    def obj(self) -> Database:
+        """Get the database bound to the current thread.
+
+        Raises:
+            ShardNotBound: If there are several shards and none is bound.
+
+        Returns:
+            Database: Shard database.
+        """
+        database = getattr(self._local, 'database', None)
+        if database is not None:
+            return database
+        if len(self.databases) == 1:
+            return self.databases[0]
+        raise ShardNotBound('Bind the shard first, e.g. '
+                            '"with note_shards.bind(user_id)".')
+
+    @contextmanager
+    def bind_database(self, database: Database) -> Iterator[Database]:
+        """Run the sharded models queries on a shard, in this thread.
+
+        Args:
+            database (Database): Shard database.
+
+        Yields:
+            Iterator[Database]: Shard database.
+        """
+        previous = getattr(self._local, 'database', None)
+        self._local.database = database
+        try:
+            yield database
+        finally:
+            self._local.database = previous
+
+    def bind(self, user_id: int):
+        """Run the sharded models queries on the user's shard,
+        in this thread.
+
+        Args:
+            user_id (int): User ID.
+
+        Returns:
+            ContextManager[Database]: Shard database.
+        """
+        return self.bind_database(self.get_database(user_id))
+
+    def __iter__(self) -> Iterator[Database]:
+        """Bind every shard in turn, e.g. to run maintenance on all of them.
+
+        Yields:
+            Iterator[Database]: Bound shard database.
+        """
+        for database in self.databases:
+            with self.bind_database(database):
+                yield database
+
+    def __getattr__(self, attr: str):
+        return getattr(self.obj, attr)
+
+
+class IdAllocator:
+    """Unique IDs across the shards, allocated by blocks ("hi/lo")
+    from a sequence of the directory database, so a block costs one
+    write and the shards never reuse an ID, e.g. when rebalanced.
+    """
+
+    def __init__(self, database: Database, model: type, block_size: int,
+                 shards: ShardRouter) -> None:
+        """
+        Args:
+            database (Database): Directory database, with "id_sequence".
+            model (type): Sharded model, the sequence is named after
+                          its table.
+            block_size (int): IDs by block, unused ones are lost
+                              when the process ends.
+            shards (ShardRouter): Model shards, the sequence starts after
+                                  their max ID.
+        """
+        self.database = database
+        self.model = model
+        self.block_size = block_size
+        self.shards = shards
+        self._next_id = 0
+        self._last_id = -1
+        self._pid = None
+        self._lock = Lock()
+
+    def get_max_id(self) -> int:
+        """Get the max ID of the model in the shards,
+        archived rows included.
+
+        Returns:
+            int: Max ID, 0 if there are no rows.
+        """
+        table = self.model._meta.table_name
+        max_id = 0
+        # read-only connections, without the pragmas of the pool ones:
+        # it runs in a shard transaction, and those would wait for the
+        # write lock of the other shards, held by their own writers
+        for database in self.shards.databases:
+            uri = f'file:{os.path.abspath(database.database)}?mode=ro'
+            with closing(sqlite3.connect(uri, uri=True)) as connection:
+                for table_name in (table, f'{table}_archive'):
+                    cursor = connection.execute(
+                        f'SELECT max("id") FROM "{table_name}"')
+                    max_id = max(max_id, cursor.fetchone()[0] or 0)
+        return max_id
+
+    def allocate_block(self) -> None:
+        """Take the next block of the sequence."""
+        name = self.model._meta.table_name
+        with self.database.atomic('IMMEDIATE'):
+            cursor = self.database.execute_sql(
+                'SELECT "next_id" FROM "id_sequence" WHERE "name" = ?',
+                (name, ))
+            row = cursor.fetchone()
+            if row is None:
+                next_id = self.get_max_id() + 1
+                self.database.execute_sql(
+                    'INSERT INTO "id_sequence" ("name", "next_id") '
+                    'VALUES (?, ?)', (name, next_id + self.block_size))
+            else:
+                next_id, = row
+                self.database.execute_sql(
+                    'UPDATE "id_sequence" SET "next_id" = ? '
+                    'WHERE "name" = ?', (next_id + self.block_size, name))
+        self._next_id = next_id
+        self._last_id = next_id + self.block_size - 1
+
+    def get_ids(self, count: int) -> List[int]:
+        """Get new IDs.
+
+        Args:
+            count (int): Number of IDs.
+
+        Returns:
+            List[int]: New IDs, ascending.
+        """
+        ids = list()
+        with self._lock:
+            # a forked worker must not reuse the block of its parent
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._last_id = self._next_id - 1
+            while len(ids) < count:
+                if self._next_id > self._last_id:
+                    self.allocate_block()
+                take = min(count - len(ids), self._last_id - self._next_id + 1)
+                ids.extend(range(self._next_id, self._next_id + take))
+                self._next_id += take
+        return ids
+
+
+def is_same_database(database: Database, other: Database) -> bool:
+    """Compare the database files, the same one can have two instances."""
+    return os.path.abspath(database.database) == \
+        os.path.abspath(other.database)
+
+
+def copy_user_rows(source: Database, target: Database, table: str,
+                   column: str, user_id: int) -> int:
+    """Copy the user's rows of a table to another database,
+    replacing the ones already copied by an interrupted rebalance.
+    They are deleted and inserted, so the triggers of the table,
+    e.g. the full-text index, run as usual.
+
+    Args:
+        source (Database): Current shard.
+        target (Database): New shard.
+        table (str): Table name.
+        column (str): User ID column.
+        user_id (int): User ID.
+
+    Returns:
+        int: Number of copied rows.
+    """
+    cursor = source.execute_sql(
+        f'SELECT * FROM "{table}" WHERE "{column}" = ?', (user_id, ))
+    columns = ', '.join(f'"{description[0]}"'
+                        for description in cursor.description)
+    rows = cursor.fetchall()
+    target.execute_sql(f'DELETE FROM "{table}" WHERE "{column}" = ?',
+                       (user_id, ))
+    if rows:
+        placeholders = ', '.join('?' for _ in rows[0])
+        target.connection().executemany(
+            f'INSERT INTO "{table}" ({columns}) VALUES ({placeholders})',
+            rows)
+    return len(rows)
+
+
+def rebalance_shards(old_databases: List[Database],
+                     new_databases: List[Database],
+                     tables: Dict[str, str]) -> Dict[str, int]:
+    """Move the rows of the users whose shard changed, e.g. after
+    changing the number of shards. The API must be stopped.
+
+    Each user is copied in a transaction of the new shard, then deleted
+    in a transaction of the old one, so it can run again if interrupted.
+
+    Args:
+        old_databases (List[Database]): Shards of the previous layout.
+        new_databases (List[Database]): Shards of the new layout.
+        tables (Dict[str, str]): User ID column by sharded table.
+
+    Returns:
+        Dict[str, int]: Moved rows by table, and moved "users".
+    """
+    moved_rows = dict.fromkeys(tables, 0)
+    moved_rows['users'] = 0
+    sources = list()
+    for database in old_databases:
+        if not any(is_same_database(database, source)
+                   for source in sources):
+            sources.append(database)
+
+    for source in sources:
+        user_ids = set()
+        for table, column in tables.items():
+            cursor = source.execute_sql(
+                f'SELECT DISTINCT "{column}" FROM "{table}"')
+            user_ids.update(user_id for user_id, in cursor.fetchall())
+        for user_id in sorted(user_ids):
+            index = get_shard_index(user_id, len(new_databases))
+            target = new_databases[index]
+            if is_same_database(source, target):
+                continue
+            with target.atomic('IMMEDIATE'):
+                for table, column in tables.items():
+                    moved_rows[table] += copy_user_rows(
+                        source, target, table, column, user_id)
+            with source.atomic('IMMEDIATE'):
+                for table, column in tables.items():
+                    source.execute_sql(
+                        f'DELETE FROM "{table}" WHERE "{column}" = ?',
+                        (user_id, ))
+            moved_rows['users'] += 1
+    return moved_rows
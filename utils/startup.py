@@ -0,0 +1,106 @@
+"""Import time of the app modules, measured with "python -X importtime"
+in a new interpreter, so the modules already imported don't hide it.
+
+Run with "python manage.py profile_startup" or
+"python manage.py check_startup".
+"""
+import subprocess
+import sys
+from pathlib import Path
+from re import compile as re_compile
+from typing import List, NamedTuple
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+IMPORT_TIME_REGEX = re_compile(
+    r'^import time:\s+(?P<self>\d+)\s+\|\s+(?P<cumulative>\d+)\s+\|'
+    r'(?P<indent>\s+)(?P<module>\S+)$')
+
+
+class ImportTime(NamedTuple):
+    module: str
+    # seconds
+    self_time: float
+    cumulative_time: float
+    # 0 for the imported module, 1 for its imports, ...
+    depth: int
+
+
+def parse_import_times(output: str) -> List[ImportTime]:
+    """Parse the "-X importtime" output, in import order.
+
+    Args:
+        output (str): Interpreter stderr.
+
+    Returns:
+        List[ImportTime]: Import time by module.
+    """
+    import_times = list()
+    for line in output.splitlines():
+        match = IMPORT_TIME_REGEX.match(line)
+        if not match:
+            continue
+        import_times.append(ImportTime(
+            module=match.group('module'),
+            self_time=int(match.group('self')) / 1e6,
+            cumulative_time=int(match.group('cumulative')) / 1e6,
+            depth=(len(match.group('indent')) - 1) // 2,
+        ))
+    return import_times
+
+
+def profile_imports(module: str) -> List[ImportTime]:
+    """Import a module in a new interpreter and measure its imports.
+
+    Args:
+        module (str): Module name, e.g. "server".
+
+    Returns:
+        List[ImportTime]: Import time by module.
+
+    Raises:
+        RuntimeError: If the import fails.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    if result.returncode:
+        errors = [line for line in result.stderr.splitlines()
+                  if not line.startswith('import time:')]
+        raise RuntimeError(f'Importing {module} failed:\n'
+                           + '\n'.join(errors))
+    return parse_import_times(result.stderr)
+
+
+def get_startup_time(module: str, repeat: int = 3) -> List[ImportTime]:
+    """Profile the imports of a module several times.
+
+    Args:
+        module (str): Module name, e.g. "server".
+        repeat (int): Number of runs. Defaults to 3.
+
+    Returns:
+        List[ImportTime]: Import times of the fastest run, the others
+                          are slowed down by the machine noise.
+    """
+    runs = [profile_imports(module) for _ in range(repeat)]
+    return min(runs, key=lambda import_times: get_module_time(
+        import_times, module))
+
+
+def get_module_time(import_times: List[ImportTime], module: str) -> float:
+    """Get the cumulative import time of a module.
+
+    Args:
+        import_times (List[ImportTime]): Profiled imports.
+        module (str): Module name.
+
+    Returns:
+        float: Seconds, 0 if it was not imported.
+    """
+    for import_time in import_times:
+        if import_time.module == module:
+            return import_time.cumulative_time
+    return 0.0
@@ -1,2 +1,22 @@
-from client import app as client_app
-from server import app as server_app
+# The apps are imported on first access, e.g. "wsgi:server_app"
+# imports only the API, not the client
+
+from importlib import import_module
+
+
+APPS = {
+    'client_app': 'client',
+    'server_app': 'server',
+}
+
+
+def __getattr__(name: str):
+    if name not in APPS:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    app = import_module(APPS[name]).app
+    globals()[name] = app
+    return app
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(APPS))